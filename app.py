@@ -1,12 +1,45 @@
 # haproxy_web_app/app.py
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, Response, stream_with_context, send_file
 import os
 import subprocess
 import logging
+import click
 import re # Import regex for easier text manipulation
 import ipaddress
 import socket
+import json
+import time
+import fcntl
+import tempfile
+import threading
+import queue
+import select
+import struct
+import sys
+import ctypes
+import ctypes.util
+import csv
+import io
+import contextlib
+import collections
+import hashlib
+import shlex
+import tarfile
+import urllib.request
+import http.client
+import ssl
+import mmap
+import math
+import bisect
+import itertools
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait as wait_for_futures
+
+try:
+    import yaml # Optional, only needed for YAML bulk imports
+except ImportError:
+    yaml = None
 
 # Get the directory of the current script (app.py)
 # This ensures that Flask finds the templates and static folders relative to app.py's location,
@@ -25,51 +58,724 @@ CONFIG_D_DIR = "/etc/haproxy/conf.d" # <--- CORRECTED
 HAPROXY_CFG_PATH = "/etc/haproxy/haproxy.cfg"
 FRONTEND_CFG_PATH = os.path.join(CONFIG_D_DIR, "00-frontend.cfg")
 
+# Backend health probing - probes run in parallel, so a topology build costs
+# roughly one probe timeout rather than the sum of all of them.
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', 2))
+HEALTH_PROBE_CONCURRENCY = int(os.environ.get('HEALTH_PROBE_CONCURRENCY', 32))
+# How long a request waits for first-time probes before answering 'unknown' (they keep running)
+HEALTH_INLINE_PROBE_WAIT = float(os.environ.get('HEALTH_INLINE_PROBE_WAIT', HEALTH_PROBE_TIMEOUT))
+# Layer-7 checks - servers with 'check' in a backend with 'option httpchk' get an HTTP(S)
+# request over a pooled keep-alive connection. Idle connections are closed after
+# HEALTH_PROBE_IDLE_TIMEOUT seconds, and at most HEALTH_PROBE_MAX_IDLE are kept per worker.
+HEALTH_PROBE_IDLE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_IDLE_TIMEOUT', 60))
+HEALTH_PROBE_MAX_IDLE = int(os.environ.get('HEALTH_PROBE_MAX_IDLE', 512))
+HEALTH_CHECK_MAX_BODY = 64 * 1024 # Larger responses close the connection instead of being drained
+# Server hostnames are resolved at most once per DNS_CACHE_TTL seconds (failed lookups once per DNS_NEGATIVE_TTL)
+DNS_CACHE_TTL = float(os.environ.get('DNS_CACHE_TTL', 30))
+DNS_NEGATIVE_TTL = float(os.environ.get('DNS_NEGATIVE_TTL', 5))
+
+# Shared state directory - small JSON documents shared between gunicorn workers
+STATE_DIR = os.environ.get('HAPROXY_WEB_STATE_DIR', '/tmp/haproxy_web_app')
+
+# Health status cache - results younger than HEALTH_CACHE_TTL are served as-is,
+# results up to HEALTH_CACHE_STALE seconds older than that are served while a
+# fresh probe runs in the background.
+HEALTH_CACHE_TTL = float(os.environ.get('HEALTH_CACHE_TTL', 10))
+HEALTH_CACHE_STALE = float(os.environ.get('HEALTH_CACHE_STALE', 60))
+HEALTH_REFRESH_INTERVAL = float(os.environ.get('HEALTH_REFRESH_INTERVAL', 5))
+
+# HAProxy service status - read from the pidfile and /proc instead of forking systemctl
+HAPROXY_PIDFILE = os.environ.get('HAPROXY_PIDFILE', '/run/haproxy.pid')
+HAPROXY_STATUS_TTL = float(os.environ.get('HAPROXY_STATUS_TTL', 2))
+
+# HAProxy Runtime API (stats socket with 'level admin')
+HAPROXY_RUNTIME_SOCKET = os.environ.get('HAPROXY_RUNTIME_SOCKET', '/run/haproxy/admin.sock')
+RUNTIME_API_TIMEOUT = float(os.environ.get('RUNTIME_API_TIMEOUT', 5))
+# Live traffic stats polled from 'show stat' on the runtime socket (0 disables polling)
+STATS_POLL_INTERVAL = float(os.environ.get('STATS_POLL_INTERVAL', 5))
+STATS_HISTORY = int(os.environ.get('STATS_HISTORY', 120)) # Samples kept per series
+# /metrics output is rendered at most once per METRICS_CACHE_TTL seconds per worker
+METRICS_CACHE_TTL = float(os.environ.get('METRICS_CACHE_TTL', 5))
+METRICS_PUBLISH_INTERVAL = 5 # How often each worker shares its internal counters with the others
+
+# Graceful reloads - validated first, then applied through the master CLI when
+# HAPROXY_MASTER_SOCKET is set, or 'systemctl reload' otherwise. Reload requests
+# arriving within RELOAD_COALESCE_WINDOW seconds of each other share one reload.
+HAPROXY_MASTER_SOCKET = os.environ.get('HAPROXY_MASTER_SOCKET', '')
+RELOAD_COALESCE_WINDOW = float(os.environ.get('RELOAD_COALESCE_WINDOW', 2))
+RELOAD_PID_WAIT = 5 # Seconds to wait for the new workers to show up after a reload
+
+# Config validation results are cached per config-set content hash
+VALIDATION_CACHE_SIZE = int(os.environ.get('VALIDATION_CACHE_SIZE', 32))
+VALIDATION_HISTORY = int(os.environ.get('VALIDATION_HISTORY', 50)) # Runs kept for the UI
+
+# Host routing - 'acl' adds an acl/use_backend pair per service to 00-frontend.cfg,
+# 'map' routes every host through one use_backend rule backed by HOSTS_MAP_PATH.
+FRONTEND_ROUTING_MODE = os.environ.get('FRONTEND_ROUTING_MODE', 'acl')
+HOSTS_MAP_PATH = os.environ.get('HAPROXY_HOSTS_MAP', '/etc/haproxy/hosts.map')
+
+# config.d listing - the scandir index is rebuilt when the directory changes, or after this many seconds
+CONFIG_INDEX_TTL = float(os.environ.get('CONFIG_INDEX_TTL', 2))
+CONFIG_LIST_MAX_LIMIT = 1000
+
+# Config watcher - inotify is used on Linux, stat polling everywhere else
+WATCHER_POLL_INTERVAL = float(os.environ.get('WATCHER_POLL_INTERVAL', 2))
+WATCHER_DEBOUNCE = 0.2 # Seconds to wait for a burst of file events to settle
+# Recent topology snapshots kept per worker so clients can ask for a delta since their version
+TOPOLOGY_SNAPSHOT_HISTORY = int(os.environ.get('TOPOLOGY_SNAPSHOT_HISTORY', 32))
+# Server-Sent Events streams send a comment this often when there is nothing else to
+# say, so proxies and the Gunicorn worker timeout don't treat them as hung
+SSE_HEARTBEAT_INTERVAL = float(os.environ.get('SSE_HEARTBEAT_INTERVAL', 15))
+
+# Map views - with more than TOPOLOGY_COLLAPSE_THRESHOLD servers, each backend's servers are
+# folded into its summary node until the map is zoomed in to TOPOLOGY_DETAIL_ZOOM or more
+TOPOLOGY_COLLAPSE_THRESHOLD = int(os.environ.get('TOPOLOGY_COLLAPSE_THRESHOLD', 200))
+TOPOLOGY_DETAIL_ZOOM = float(os.environ.get('TOPOLOGY_DETAIL_ZOOM', 1.5))
+
+# External commands - hard timeout per command, and how long an action waits for a running one
+COMMAND_TIMEOUT = float(os.environ.get('COMMAND_TIMEOUT', 60))
+ACTION_LOCK_TIMEOUT = float(os.environ.get('ACTION_LOCK_TIMEOUT', COMMAND_TIMEOUT))
+
+# Fleet mode - other HAProxy nodes listed in an inventory file (YAML or JSON) are managed
+# in parallel, at most FLEET_CONCURRENCY at a time and FLEET_NODE_TIMEOUT seconds per node
+FLEET_INVENTORY_PATH = os.environ.get('HAPROXY_FLEET_INVENTORY', '/etc/haproxy_web_app/fleet.yaml')
+FLEET_CONCURRENCY = int(os.environ.get('FLEET_CONCURRENCY', 8))
+FLEET_NODE_TIMEOUT = float(os.environ.get('FLEET_NODE_TIMEOUT', 30))
+
+# Access log analytics - HAProxy's HTTP log ('option httplog') is tailed every
+# ACCESS_LOG_POLL_INTERVAL seconds (0 disables it) and per-minute aggregates are kept for
+# ACCESS_LOG_HISTORY_MINUTES. A first read starts at most ACCESS_LOG_CATCHUP_BYTES from the end.
+HAPROXY_ACCESS_LOG = os.environ.get('HAPROXY_ACCESS_LOG', '/var/log/haproxy.log')
+ACCESS_LOG_POLL_INTERVAL = float(os.environ.get('ACCESS_LOG_POLL_INTERVAL', 5))
+ACCESS_LOG_HISTORY_MINUTES = int(os.environ.get('ACCESS_LOG_HISTORY_MINUTES', 15))
+ACCESS_LOG_CATCHUP_BYTES = int(os.environ.get('ACCESS_LOG_CATCHUP_BYTES', 64 * 1024 * 1024))
+# The leader publishes ready-made summaries for these windows (minutes) and saves the full
+# per-minute aggregates, which a new leader resumes from, every ACCESS_LOG_SAVE_INTERVAL seconds
+ACCESS_LOG_SUMMARY_WINDOWS = tuple(sorted({min(window, ACCESS_LOG_HISTORY_MINUTES) for window in (1, 5, 15)} |
+                                          {ACCESS_LOG_HISTORY_MINUTES}))
+ACCESS_LOG_SAVE_INTERVAL = float(os.environ.get('ACCESS_LOG_SAVE_INTERVAL', 60))
+
 # --- Utility Functions ---
 
-def run_command(command, check_output=True):
-    """Executes a shell command and returns its output or status."""
+def run_command(argv, timeout=None, on_output=None, input=None):
+    """Run a command (an argv list - never through a shell) and return (success, output).
+
+    stdout and stderr are merged and passed line by line to on_output as they
+    arrive. The command is terminated once it runs longer than `timeout`
+    (COMMAND_TIMEOUT by default). stdin receives `input` (bytes) if given and is
+    closed otherwise, so it can never sit waiting for a sudo password prompt.
+    """
+    timeout = COMMAND_TIMEOUT if timeout is None else timeout
+    started = time.monotonic()
+    success, output = _run_command(argv, timeout, on_output, input)
+    name = next((os.path.basename(word) for word in argv if word != 'sudo' and not word.startswith('-')), '')
+    inc_metric('subprocess_total', {'command': name, 'result': 'success' if success else 'failure'})
+    observe_metric('subprocess_seconds', time.monotonic() - started, {'command': name})
+    return success, output
+
+def _feed_stdin(pipe, data):
     try:
-        if check_output:
-            result = subprocess.run(command, capture_output=True, text=True, check=True, shell=True)
-            return True, result.stdout.strip()
-        else:
-            subprocess.run(command, check=True, shell=True)
-            return True, "Command executed successfully."
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Command failed: {command}\nStdout: {e.stdout}\nStderr: {e.stderr}")
-        return False, f"Command failed: {e.stderr.strip() or e.stdout.strip() or 'Unknown error'}"
+        with pipe:
+            pipe.write(data)
+    except (BrokenPipeError, ValueError):
+        pass # The command exited without reading everything; its exit status tells the story
+
+def _run_command(argv, timeout, on_output, input=None):
+    command = " ".join(argv)
+    try:
+        stdin = subprocess.DEVNULL if input is None else subprocess.PIPE
+        process = subprocess.Popen(argv, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
     except FileNotFoundError:
-        logging.error(f"Command not found: {command.split(' ')[0]}")
-        return False, f"Error: Command '{command.split(' ')[0]}' not found. Is it in your PATH?"
+        logging.error(f"Command not found: {argv[0]}")
+        return False, f"Error: Command '{argv[0]}' not found. Is it in your PATH?"
     except Exception as e:
         logging.error(f"An unexpected error occurred: {e}")
         return False, f"An unexpected error occurred: {str(e)}"
+    if input is not None:
+        # Written from a thread so a command that produces output before reading
+        # all of its input can't deadlock against us
+        threading.Thread(target=_feed_stdin, args=(process.stdin, input), daemon=True).start()
 
-def get_haproxy_status():
-    """Checks the HAProxy service status."""
-    success, output = run_command("sudo systemctl status haproxy", check_output=True)
-    if success:
-        if "active (running)" in output:
+    deadline = time.monotonic() + timeout
+    lines, pending = [], b""
+    try:
+        with process.stdout:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(argv, timeout)
+                readable, _, _ = select.select([process.stdout], [], [], remaining)
+                if not readable:
+                    continue
+                chunk = os.read(process.stdout.fileno(), 65536)
+                if not chunk:
+                    break
+                *complete, pending = (pending + chunk).split(b"\n")
+                for raw in complete:
+                    lines.append(raw.decode(errors='replace'))
+                    if on_output:
+                        on_output(lines[-1])
+        if pending:
+            lines.append(pending.decode(errors='replace'))
+            if on_output:
+                on_output(lines[-1])
+        returncode = process.wait(timeout=max(0.1, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired:
+        process.terminate() # sudo passes the signal on to the command it runs
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        logging.error(f"Command timed out after {timeout:g}s: {command}")
+        return False, f"Command timed out after {timeout:g}s: {command}"
+
+    output = "\n".join(lines).strip()
+    if returncode != 0:
+        logging.error(f"Command failed: {command}\nOutput: {output}")
+        return False, f"Command failed: {output or 'Unknown error'}"
+    return True, output
+
+@contextlib.contextmanager
+def action_lock(name, timeout=None):
+    """Cross-worker mutex for an operator action; yields False if it couldn't be taken in time.
+
+    Waiting is bounded by ACTION_LOCK_TIMEOUT, so a burst of clicks can't pile up
+    threads behind a long-running command.
+    """
+    timeout = ACTION_LOCK_TIMEOUT if timeout is None else timeout
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(os.path.join(STATE_DIR, f"{name}.lock"), 'a') as lock_file:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    yield False
+                    return
+                time.sleep(0.05)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def run_shared_command(name, argv, on_output=None):
+    """Run a read-only command, letting callers that overlap with a run share its result.
+
+    Callers queue on action_lock(name). A caller that asked while a run was in
+    progress gets that run's result (from shared state) instead of running the
+    command again; callers that arrive after it finished start a fresh run.
+    """
+    requested_at = time.time()
+    with action_lock(name) as acquired:
+        if not acquired:
+            return False, f"A previous '{name}' run is still in progress, try again shortly."
+        last = read_shared_state('command_results').get(name)
+        if last and last['finished_at'] >= requested_at:
+            if on_output:
+                for line in last['output'].splitlines():
+                    on_output(line)
+            return last['success'], last['output']
+        success, output = run_command(argv, on_output=on_output)
+        result = {'success': success, 'output': output, 'finished_at': time.time()}
+        update_shared_state('command_results', lambda doc: dict(doc, **{name: result}))
+        return success, output
+
+def _write_temp_file(path, content):
+    """Write content to a fsync'ed temp file next to path and return the temp file's path.
+
+    The temp file gets the current file's permissions (or 0644 for new files), since
+    mkstemp() creates 0600 files that HAProxy's own user might not be able to read.
+    """
+    directory = os.path.dirname(path) or '.'
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+    return tmp_path
+
+def _remove_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+def _fsync_directory(directory):
+    """Make renames/unlinks in a directory durable."""
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_file_atomic(path, content):
+    """Write content to path via a temp file + fsync + rename, so readers never see a partial file."""
+    tmp_path = _write_temp_file(path, content)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+
+# --- Config Transactions ---
+
+class ConfigTransactionError(Exception):
+    """Raised when a config transaction can't be committed (nothing is left half-applied)."""
+
+class ConfigTransaction:
+    """A set of config file writes/deletes applied all-or-nothing.
+
+        with ConfigTransaction() as txn:
+            content = txn.read(FRONTEND_CFG_PATH)
+            txn.write(FRONTEND_CFG_PATH, new_content)
+            txn.write(backend_path, backend_content)
+
+    Entering takes an exclusive flock shared by every worker, so read-modify-write
+    cycles can't lose each other's updates. On a clean exit every staged file is
+    written to a fsync'ed temp file first and only then renamed into place; if any
+    step fails (or validation is requested and fails) the files already replaced
+    are restored. Leaving the block with an exception discards the staged changes.
+
+    validate=True checks the local config set with validate_config_set; it can also
+    be a callable returning (valid, output) for files that belong to something else.
+    """
+
+    def __init__(self, validate=False):
+        self.validate = validate
+        self._changes = {} # path -> new content, or None to delete
+        self._lock_file = None
+
+    def __enter__(self):
+        os.makedirs(STATE_DIR, exist_ok=True)
+        self._lock_file = open(os.path.join(STATE_DIR, 'config.lock'), 'a')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self._changes = {}
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+        return False
+
+    @property
+    def paths(self):
+        return sorted(self._changes)
+
+    def read(self, path):
+        """Current content of path as seen by this transaction (None if it doesn't exist)."""
+        if path in self._changes:
+            return self._changes[path]
+        return self._read_disk(path)
+
+    def write(self, path, content):
+        self._changes[path] = content
+
+    def delete(self, path):
+        self._changes[path] = None
+
+    def abort(self):
+        """Drop everything staged so far; nothing will be written."""
+        self._changes = {}
+
+    def commit(self):
+        if not self._changes:
+            return
+        originals = {path: self._read_disk(path) for path in self._changes}
+        temp_files, applied = {}, []
+        try:
+            # 1. Stage every new file next to its target (fsync'ed)
+            for path, content in self._changes.items():
+                if content is not None:
+                    temp_files[path] = _write_temp_file(path, content)
+            # 2. Swap them in (rename is atomic per file)
+            for path, content in self._changes.items():
+                if content is None:
+                    if originals[path] is not None:
+                        os.unlink(path)
+                else:
+                    os.replace(temp_files.pop(path), path)
+                applied.append(path)
+            for directory in {os.path.dirname(path) for path in applied}:
+                _fsync_directory(directory)
+            # 3. Optionally check the result, and undo it if HAProxy rejects it
+            if self.validate:
+                if callable(self.validate):
+                    valid, output = self.validate()
+                else:
+                    valid, output, _ = validate_config_set(source='transaction')
+                if not valid:
+                    raise ConfigTransactionError(f"Configuration is invalid, changes rolled back. {output}")
+        except Exception as e:
+            self._rollback(applied, originals)
+            for tmp_path in temp_files.values():
+                _remove_quietly(tmp_path)
+            logging.error(f"Config transaction failed for {', '.join(self.paths)}: {e}")
+            if isinstance(e, ConfigTransactionError):
+                raise
+            raise ConfigTransactionError(f"Could not apply changes to {', '.join(os.path.basename(p) for p in self.paths)}: {e}") from e
+
+    @staticmethod
+    def _read_disk(path):
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _rollback(applied, originals):
+        for path in reversed(applied):
+            try:
+                if originals[path] is None:
+                    _remove_quietly(path)
+                else:
+                    write_file_atomic(path, originals[path])
+            except OSError as e:
+                logging.error(f"Rollback failed for {path}: {e}")
+
+@contextlib.contextmanager
+def settled_config():
+    """Hold the config lock shared while the config set must not change underneath.
+
+    Transactions swap files in (and roll them back after a failed validation)
+    under the exclusive lock, so a validate-then-reload inside this block never
+    sees a half-applied or about-to-be-rolled-back set.
+    """
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(os.path.join(STATE_DIR, 'config.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# --- Shared State (cross-worker) ---
+
+_shared_state_memo = {}
+_shared_state_lock = threading.Lock()
+
+def _state_file(name):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, f"{name}.json")
+
+def _load_json_file(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable state file {path}: {e}")
+        return {}
+
+def read_shared_state(name):
+    """Read a JSON document shared between all workers.
+
+    The parsed document is memoized per process on the file's (mtime, size, inode),
+    so repeated reads of an unchanged document only cost a stat(). The returned
+    value is shared - callers must not mutate it.
+    """
+    path = _state_file(name)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return {}
+    key = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _shared_state_lock:
+        memo = _shared_state_memo.get(name)
+        if memo and memo[0] == key:
+            return memo[1]
+    data = _load_json_file(path)
+    with _shared_state_lock:
+        _shared_state_memo[name] = (key, data)
+    return data
+
+def update_shared_state(name, update):
+    """Atomically read-modify-write a shared JSON document.
+
+    `update` receives a private copy of the current document and returns the new one.
+    An exclusive flock serializes writers across workers; readers are never blocked
+    because the document is replaced with a rename.
+    """
+    path = _state_file(name)
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            data = update(_load_json_file(path))
+            write_file_atomic(path, json.dumps(data))
+            return data
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def try_acquire_leadership(name):
+    """Try to become the single worker responsible for a background task.
+
+    Returns an open file holding a non-blocking exclusive flock, or None if another
+    worker already holds it. The lock is released automatically if the worker dies.
+    """
+    os.makedirs(STATE_DIR, exist_ok=True)
+    lock_file = open(os.path.join(STATE_DIR, f"{name}.leader"), 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        lock_file.close()
+        return None
+
+# --- Internal Metrics ---
+
+# Histogram bucket upper bounds (seconds) for each internal histogram
+METRIC_BUCKETS = {
+    'topology_build_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    'health_probe_seconds': (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    'subprocess_seconds': (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+}
+
+_metrics = {'counters': {}, 'histograms': {}}
+_metrics_lock = threading.Lock()
+_metrics_published_at = 0.0
+
+def _label_key(labels):
+    """Render labels as the Prometheus '{...}' body, which doubles as the series key."""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ",".join(f'{name}="{escape(value)}"' for name, value in sorted(labels.items()))
+
+def inc_metric(name, labels=None, value=1):
+    """Add value to this worker's counter name{labels}."""
+    key = _label_key(labels or {})
+    with _metrics_lock:
+        series = _metrics['counters'].setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+    _maybe_publish_metrics()
+
+def observe_metric(name, value, labels=None):
+    """Record one observation in this worker's histogram name{labels} (buckets from METRIC_BUCKETS)."""
+    buckets = METRIC_BUCKETS[name]
+    key = _label_key(labels or {})
+    with _metrics_lock:
+        series = _metrics['histograms'].setdefault(name, {})
+        entry = series.get(key)
+        if entry is None:
+            entry = series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                entry['buckets'][index] += 1 # Cumulative, as Prometheus expects
+        entry['sum'] += value
+        entry['count'] += 1
+    _maybe_publish_metrics()
+
+def _maybe_publish_metrics():
+    global _metrics_published_at
+    now = time.monotonic()
+    with _metrics_lock:
+        if now - _metrics_published_at < METRICS_PUBLISH_INTERVAL:
+            return
+        _metrics_published_at = now
+    try:
+        publish_worker_metrics()
+    except OSError as e:
+        logging.warning(f"Could not publish worker metrics: {e}")
+
+def publish_worker_metrics():
+    """Share this worker's internal metrics so any worker can serve the combined totals."""
+    with _metrics_lock:
+        snapshot = json.loads(json.dumps(_metrics))
+    pid = str(os.getpid())
+
+    def update(doc):
+        # Drop workers that have exited
+        doc = {worker: metrics for worker, metrics in doc.items() if os.path.exists(f"/proc/{worker}")}
+        doc[pid] = snapshot
+        return doc
+
+    return update_shared_state('worker_metrics', update)
+
+def merged_worker_metrics():
+    """Internal counters and histograms summed over every live worker."""
+    merged = {'counters': {}, 'histograms': {}}
+    for metrics in publish_worker_metrics().values():
+        for name, series in metrics['counters'].items():
+            target = merged['counters'].setdefault(name, {})
+            for key, value in series.items():
+                target[key] = target.get(key, 0) + value
+        for name, series in metrics['histograms'].items():
+            target = merged['histograms'].setdefault(name, {})
+            for key, entry in series.items():
+                total = target.setdefault(key, {'buckets': [0] * len(entry['buckets']), 'sum': 0.0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+                total['sum'] += entry['sum']
+                total['count'] += entry['count']
+    return merged
+
+def get_haproxy_processes():
+    """Return [{'pid', 'ppid'}] for every live haproxy process, read from /proc."""
+    processes = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                stat = f.read()
+        except OSError:
+            continue # Process exited while we were scanning
+        # Format: "pid (comm) state ppid ..." - comm may contain spaces, so split on the last ')'
+        comm = stat[stat.index('(') + 1:stat.rindex(')')]
+        fields = stat[stat.rindex(')') + 2:].split()
+        if comm == 'haproxy' and fields[0] not in ('Z', 'X'):
+            processes.append({'pid': int(entry), 'ppid': int(fields[1])})
+    return processes
+
+def _pidfile_process_alive():
+    try:
+        with open(HAPROXY_PIDFILE, 'r') as f:
+            pid = int(f.read().split()[0])
+        with open(f"/proc/{pid}/comm", 'r') as f:
+            return f.read().strip() == 'haproxy'
+    except (OSError, ValueError, IndexError):
+        return False
+
+def probe_haproxy_status():
+    """Work out the HAProxy service state without spawning any process."""
+    if not os.path.isdir('/proc'):
+        return "unknown"
+    try:
+        if _pidfile_process_alive() or get_haproxy_processes():
             return "running"
-        elif "inactive (dead)" in output:
-            return "stopped"
-        else:
-            return "unknown"
-    return "error"
+        return "stopped"
+    except Exception as e:
+        logging.error(f"Error reading HAProxy process state: {e}")
+        return "error"
+
+def get_haproxy_status():
+    """Checks the HAProxy service status (cached for HAPROXY_STATUS_TTL seconds across workers)."""
+    cached = read_shared_state('haproxy_status')
+    if cached and time.time() - cached['checked_at'] < HAPROXY_STATUS_TTL:
+        return cached['status']
+
+    status = probe_haproxy_status()
+    try:
+        update_shared_state('haproxy_status', lambda _: {'status': status, 'checked_at': time.time()})
+    except OSError as e:
+        logging.warning(f"Could not cache HAProxy status: {e}")
+    return status
+
+def invalidate_haproxy_status():
+    """Forget the cached service status, e.g. right after a start/stop/restart."""
+    try:
+        update_shared_state('haproxy_status', lambda _: {})
+    except OSError as e:
+        logging.warning(f"Could not reset cached HAProxy status: {e}")
 
 def get_config_files():
     """Lists .cfg files in config.d directory."""
     files = []
     try:
-        for filename in os.listdir(CONFIG_D_DIR):
-            if filename.endswith(".cfg") and os.path.isfile(os.path.join(CONFIG_D_DIR, filename)):
-                files.append(filename)
+        with os.scandir(CONFIG_D_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".cfg") and entry.is_file():
+                    files.append(entry.name)
         files.sort()
     except Exception as e:
         logging.error(f"Error listing config files: {e}")
     return files
 
+_config_index = {'key': None, 'expires_at': 0.0, 'entries': []}
+_config_index_lock = threading.Lock()
+
+def config_d_index():
+    """[{'name', 'size', 'mtime'}] for every .cfg file in CONFIG_D_DIR, sorted by name.
+
+    Built from one os.scandir() pass and reused until the directory's mtime
+    changes (a file was added, removed or atomically replaced) or CONFIG_INDEX_TTL
+    passes (to pick up in-place edits to sizes and times).
+    """
+    try:
+        key = (CONFIG_D_DIR, os.stat(CONFIG_D_DIR).st_mtime_ns)
+    except OSError as e:
+        logging.error(f"Error listing config files: {e}")
+        return []
+    now = time.monotonic()
+    with _config_index_lock:
+        if _config_index['key'] == key and now < _config_index['expires_at']:
+            return _config_index['entries']
+
+    entries = []
+    try:
+        with os.scandir(CONFIG_D_DIR) as scan:
+            for entry in scan:
+                if entry.name.endswith(".cfg") and entry.is_file():
+                    st = entry.stat()
+                    entries.append({'name': entry.name, 'size': st.st_size, 'mtime': st.st_mtime})
+    except OSError as e:
+        logging.error(f"Error listing config files: {e}")
+        return []
+    entries.sort(key=lambda entry: entry['name'])
+    with _config_index_lock:
+        _config_index.update(key=key, expires_at=now + CONFIG_INDEX_TTL, entries=entries)
+    return entries
+
+def list_config_d_files(offset=0, limit=100, sort='name', order='asc', prefix='', search=''):
+    """One page of the config.d index; returns (total matching, [entries])."""
+    if sort not in ('name', 'size', 'mtime'):
+        raise ValueError(f"Unknown sort field '{sort}'.")
+    if order not in ('asc', 'desc'):
+        raise ValueError(f"Unknown sort order '{order}'.")
+    entries = config_d_index()
+    if prefix:
+        entries = [entry for entry in entries if entry['name'].startswith(prefix)]
+    if search:
+        needle = search.lower()
+        entries = [entry for entry in entries if needle in entry['name'].lower()]
+    if sort != 'name' or order != 'asc': # The index is already sorted by name
+        entries = sorted(entries, key=lambda entry: (entry[sort], entry['name']), reverse=order == 'desc')
+    return len(entries), entries[offset:offset + limit]
+
+def config_d_file_path(filename):
+    """Path of a config.d file, or None if filename isn't a plain .cfg file name in the directory."""
+    if os.path.basename(filename) != filename or not filename.endswith('.cfg'):
+        return None
+    path = os.path.join(CONFIG_D_DIR, filename)
+    return path if os.path.isfile(path) else None
+
+def raw_file_path(filename):
+    """Path of a file the raw endpoint may serve: a config.d .cfg file, or a map/ACL file the
+    config references (see referenced_map_files) with that base name. None otherwise."""
+    path = config_d_file_path(filename)
+    if path or os.path.basename(filename) != filename:
+        return path
+    matches = [path for path in referenced_map_files() if os.path.basename(path) == filename]
+    if len(matches) != 1: # Unknown, or two referenced files share the name
+        return None
+    return matches[0] if os.path.isfile(matches[0]) else None
+
+def file_etag(path):
+    """A strong ETag built from the file's (mtime, size, inode) - no need to read it.
+
+    Returns None if the file no longer exists.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}-{st.st_ino:x}"
+
 def get_config_file_content(filename):
     """Reads the content of a specific config file."""
     file_path = os.path.join(CONFIG_D_DIR, filename)
@@ -83,13 +789,210 @@ def get_config_file_content(filename):
         logging.error(f"Error reading file {filename}: {e}")
         return False, f"Error reading file: {str(e)}"
 
-def update_frontend_cfg(service_name, service_url):
-    """Adds acl and use_backend entries to 00-frontend.cfg in appropriate sections."""
-    try:
-        # Create the file if it doesn't exist, or read existing content
-        if not os.path.exists(FRONTEND_CFG_PATH):
-            # Provide a basic initial structure for a new frontend.cfg
-            initial_content = """# --- Frontend for HTTP (port 80) - handles redirection ---
+# --- HAProxy Config Model ---
+
+# Keywords that start a new section; every other line belongs to the section above it
+SECTION_KEYWORDS = frozenset((
+    'global', 'defaults', 'frontend', 'backend', 'listen', 'userlist', 'resolvers', 'peers',
+    'mailers', 'program', 'http-errors', 'ring', 'cache', 'crt-store', 'log-forward', 'traces'
+))
+
+def tokenize_config_line(text):
+    """Split one config line into words the way HAProxy does (quotes, escapes, '#' comments)."""
+    if '"' not in text and "'" not in text and '\\' not in text:
+        return text.split('#', 1)[0].split()
+    words, word, quote, in_word = [], [], None, False
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if quote:
+            if char == quote:
+                quote = None
+            elif char == '\\' and quote == '"' and index + 1 < len(text):
+                index += 1
+                word.append(text[index])
+            else:
+                word.append(char)
+        elif char in ' \t\r\n':
+            if in_word:
+                words.append(''.join(word))
+                word, in_word = [], False
+        elif char == '#':
+            break
+        elif char == '\\' and index + 1 < len(text):
+            index += 1
+            word.append(text[index])
+            in_word = True
+        elif char in '"\'':
+            quote, in_word = char, True
+        else:
+            word.append(char)
+            in_word = True
+        index += 1
+    if in_word:
+        words.append(''.join(word))
+    return words
+
+class ConfigLine:
+    """One physical line: the exact original text plus its parsed words."""
+
+    __slots__ = ('raw', 'words', 'lineno')
+
+    def __init__(self, raw, lineno=None):
+        self.raw = raw # Including the line ending, so serialization is byte-identical
+        self.words = tokenize_config_line(raw)
+        self.lineno = lineno # 1-based position in the parsed text, None for inserted lines
+
+    @property
+    def keyword(self):
+        return self.words[0] if self.words else None
+
+    @property
+    def args(self):
+        return self.words[1:]
+
+    @property
+    def text(self):
+        return self.raw.rstrip('\r\n')
+
+    @property
+    def is_comment(self):
+        return not self.words and self.raw.lstrip().startswith('#')
+
+    def __repr__(self):
+        return f"ConfigLine({self.text!r})"
+
+class ConfigSection:
+    """A section header line and the lines that follow it, up to the next section."""
+
+    __slots__ = ('header', 'lines', '_config')
+
+    def __init__(self, header, config):
+        self.header = header
+        self.lines = []
+        self._config = config
+
+    @property
+    def kind(self):
+        return self.header.keyword
+
+    @property
+    def name(self):
+        return self.header.args[0] if self.header.args else None
+
+    def directives(self, keyword=None):
+        """Non-blank, non-comment lines, optionally only those starting with keyword."""
+        return [line for line in self.lines if line.words and (keyword is None or line.keyword == keyword)]
+
+    def find_comment(self, text):
+        """The first comment line whose text (stripped) equals text, or None."""
+        return next((line for line in self.lines if line.is_comment and line.raw.strip() == text), None)
+
+    def _position(self, line):
+        for index, candidate in enumerate(self.lines):
+            if candidate is line:
+                return index
+        raise ValueError(f"{line!r} is not in section {self.kind} {self.name}")
+
+    def insert(self, index, texts):
+        """Insert new lines (without line endings) at index; returns the new ConfigLine objects."""
+        newline = self._config.newline
+        previous = self.lines[index - 1] if index > 0 else self.header
+        if not previous.raw.endswith('\n'):
+            previous.raw += newline # Was the last line of the file
+        new_lines = [ConfigLine(text + newline) for text in texts]
+        self.lines[index:index] = new_lines
+        self._config.invalidate_index()
+        return new_lines
+
+    def insert_after(self, line, texts):
+        return self.insert(self._position(line) + 1, texts)
+
+    def insert_before(self, line, texts):
+        return self.insert(self._position(line), texts)
+
+    def append(self, texts):
+        """Add lines after the last non-blank line, keeping trailing blank separators in place."""
+        index = len(self.lines)
+        while index > 0 and not self.lines[index - 1].raw.strip():
+            index -= 1
+        return self.insert(index, texts)
+
+    def replace(self, line, text):
+        index = self._position(line)
+        ending = line.raw[len(line.text):]
+        self.lines[index] = ConfigLine(text + ending, line.lineno)
+        self._config.invalidate_index()
+        return self.lines[index]
+
+    def remove(self, line):
+        del self.lines[self._position(line)]
+        self._config.invalidate_index()
+
+class HAProxyConfig:
+    """Lossless model of an HAProxy config file.
+
+    Every physical line is kept verbatim, so serialize() returns the original text
+    byte-for-byte until something is edited, and edits only touch the lines they
+    change. Sections are indexed by (kind, name) and directives by keyword; the
+    indexes are rebuilt lazily after an edit.
+    """
+
+    def __init__(self, text=""):
+        self.newline = "\r\n" if "\r\n" in text[:4096] else "\n"
+        self.preamble = [] # Lines before the first section (comments, blanks)
+        self.sections = []
+        self._sections_by_key = None
+        self._directive_index = None
+        current = None
+        for lineno, raw in enumerate(text.splitlines(keepends=True), start=1):
+            line = ConfigLine(raw, lineno)
+            if line.keyword in SECTION_KEYWORDS:
+                current = ConfigSection(line, self)
+                self.sections.append(current)
+            elif current is None:
+                self.preamble.append(line)
+            else:
+                current.lines.append(line)
+
+    @classmethod
+    def parse(cls, text):
+        return cls(text)
+
+    def serialize(self):
+        parts = [line.raw for line in self.preamble]
+        for section in self.sections:
+            parts.append(section.header.raw)
+            parts.extend(line.raw for line in section.lines)
+        return "".join(parts)
+
+    def invalidate_index(self):
+        self._sections_by_key = None
+        self._directive_index = None
+
+    def section(self, kind, name):
+        if self._sections_by_key is None:
+            self._sections_by_key = {}
+            for section in self.sections:
+                self._sections_by_key.setdefault((section.kind, section.name), section)
+        return self._sections_by_key.get((kind, name))
+
+    def sections_of(self, *kinds):
+        return [section for section in self.sections if section.kind in kinds]
+
+    def directives(self, keyword):
+        """[(section, line)] for every directive with this keyword, in file order."""
+        if self._directive_index is None:
+            self._directive_index = {}
+            for section in self.sections:
+                for line in section.lines:
+                    if line.words:
+                        self._directive_index.setdefault(line.keyword, []).append((section, line))
+        return self._directive_index.get(keyword, [])
+
+# --- Frontend Routing ---
+
+FRONTEND_CFG_TEMPLATE = """# --- Frontend for HTTP (port 80) - handles redirection ---
 frontend http_redirect_frontend
     bind *:80
     mode http
@@ -106,64 +1009,433 @@ frontend https_frontend
     # Default backend if no match
     default_backend default_backend
 """
-            with open(FRONTEND_CFG_PATH, 'w') as f:
-                f.write(initial_content)
-            content = initial_content
-        else:
-            with open(FRONTEND_CFG_PATH, 'r') as f:
-                content = f.read()
 
-        acl_line = f"    acl host_{service_name} hdr(host) -i {service_url}"
-        use_backend_line = f"    use_backend {service_name}_backend if host_{service_name}"
-
-        # --- Insert ACL line ---
-        # Regex to find the "ACLs to match hostnames" comment and the following lines
-        acl_pattern = re.compile(r"(\s*# ACLs to match hostnames\s*\n)((\s*acl host_\S+ hdr\(host\).*?\n)*)", re.MULTILINE)
-
-        # Check if ACL line already exists
-        if acl_line.strip() not in [line.strip() for line in content.splitlines()]:
-            match = acl_pattern.search(content)
-            if match:
-                # Insert after the existing ACLs (or directly after the comment if none)
-                # Group 1 is the comment, Group 2 is existing ACLs
-                insertion_point = match.end()
-                content = content[:insertion_point] + acl_line + "\n" + content[insertion_point:]
-            else:
-                # Fallback: if marker not found, append to end of https_frontend block
-                logging.warning("ACL insertion marker not found, appending ACL to end of file.")
-                content += "\n" + acl_line + "\n" # Adding newline for clean append
-
-        # --- Insert use_backend line ---
-        # Regex to find the "Use backends based on hostname" comment and the following lines
-        use_backend_pattern = re.compile(r"(\s*# Use backends based on hostname\s*\n)((\s*use_backend\s+.*?if\s+host_.*?\n)*)", re.MULTILINE)
-
-        # Check if use_backend line already exists
-        if use_backend_line.strip() not in [line.strip() for line in content.splitlines()]:
-            match = use_backend_pattern.search(content)
-            if match:
-                # Insert after the existing use_backends (or directly after the comment if none)
-                insertion_point = match.end()
-                content = content[:insertion_point] + use_backend_line + "\n" + content[insertion_point:]
+def map_use_backend_line():
+    """The single use_backend rule that routes every host listed in HOSTS_MAP_PATH."""
+    return f"    use_backend %[req.hdr(host),lower,map({HOSTS_MAP_PATH})]"
+
+def _is_host_acl(line):
+    return line.keyword == 'acl' and len(line.args) >= 2 and line.args[1] in ('hdr(host)', 'req.hdr(host)')
+
+def _is_host_rule(line):
+    return line.keyword == 'use_backend' and 'if' in line.args
+
+def routing_frontend(config):
+    """The frontend section that holds the hostname routing rules, or None."""
+    frontends = config.sections_of('frontend')
+    for section in frontends:
+        if section.find_comment("# ACLs to match hostnames") or section.find_comment("# Use backends based on hostname"):
+            return section
+    for section in frontends:
+        if section.directives('default_backend') or any(_is_host_acl(line) for line in section.lines):
+            return section
+    return frontends[-1] if frontends else None
+
+def _insert_acl_lines(frontend, acl_lines):
+    """Insert already de-duplicated acl lines after the existing host ACLs."""
+    host_acls = [line for line in frontend.lines if _is_host_acl(line)]
+    if host_acls:
+        return frontend.insert_after(host_acls[-1], acl_lines)
+    marker = frontend.find_comment("# ACLs to match hostnames")
+    if marker:
+        return frontend.insert_after(marker, acl_lines)
+    # ACLs have to be declared before the rules that use them
+    use_backends = frontend.directives('use_backend')
+    if use_backends:
+        return frontend.insert_before(use_backends[0], acl_lines)
+    logging.warning(f"ACL insertion marker not found, appending ACL to end of frontend {frontend.name}.")
+    return frontend.append(acl_lines)
+
+def _insert_use_backend_lines(frontend, use_backend_lines):
+    """Insert already de-duplicated use_backend lines after the existing host rules."""
+    host_rules = [line for line in frontend.lines if _is_host_rule(line)]
+    if host_rules:
+        return frontend.insert_after(host_rules[-1], use_backend_lines)
+    marker = frontend.find_comment("# Use backends based on hostname")
+    if marker:
+        return frontend.insert_after(marker, use_backend_lines)
+    default_backends = frontend.directives('default_backend')
+    if default_backends:
+        return frontend.insert_before(default_backends[0], use_backend_lines)
+    logging.warning(f"Use_backend insertion marker and default_backend not found, appending to end of frontend {frontend.name}.")
+    return frontend.append(use_backend_lines)
+
+def add_frontend_routes(content, services, routing_mode, txn, stale_routes=None):
+    """Route every (service_name, service_url) in services in one pass over the frontend content.
+
+    The content is parsed into an HAProxyConfig and the rules are inserted into the
+    routing frontend's section, so only the added lines change. Existing lines are
+    collected into a set once, so duplicates are skipped in O(1) per service. The
+    {host: backend} routes in stale_routes are dropped first (see drop_host_routes).
+    Returns the new content; map file updates are staged in txn.
+    """
+    config = HAProxyConfig.parse(content)
+    frontend = routing_frontend(config)
+    if frontend is None:
+        raise ValueError("No frontend section found to add host routing to.")
+    if stale_routes:
+        drop_host_routes(config, stale_routes, txn)
+    existing = {line.raw.strip() for line in frontend.lines}
+    if routing_mode == 'map':
+        update_map_file(HOSTS_MAP_PATH, {url.lower(): f"{name}_backend" for name, url in services}, txn)
+        if map_use_backend_line().strip() not in existing:
+            _insert_use_backend_lines(frontend, [map_use_backend_line()])
+        return config.serialize()
+
+    acl_lines, use_backend_lines = [], []
+    for name, url in services:
+        acl_line = f"    acl host_{name} hdr(host) -i {url}"
+        use_backend_line = f"    use_backend {name}_backend if host_{name}"
+        if acl_line.strip() not in existing:
+            existing.add(acl_line.strip())
+            acl_lines.append(acl_line)
+        if use_backend_line.strip() not in existing:
+            existing.add(use_backend_line.strip())
+            use_backend_lines.append(use_backend_line)
+    if acl_lines:
+        _insert_acl_lines(frontend, acl_lines)
+    if use_backend_lines:
+        _insert_use_backend_lines(frontend, use_backend_lines)
+    return config.serialize()
+
+def drop_host_routes(config, stale_routes, txn):
+    """Stop routing each {host: backend} in stale_routes, in a parsed frontend config and the hosts map.
+
+    A host ACL used by 'use_backend <backend> if <acl>' loses the stale host;
+    an ACL left with no hosts is removed along with those use_backend rules.
+    Map entries are removed (staged in txn) only if they still point at that backend.
+    """
+    for section in config.sections_of('frontend', 'listen'):
+        acl_backends = {}
+        for line in section.directives('use_backend'):
+            if len(line.args) == 3 and line.args[1] == 'if':
+                acl_backends.setdefault(line.args[2], set()).add(line.args[0])
+        emptied = set()
+        for line in section.directives('acl'):
+            if not (_is_host_acl(line) and len(line.args) >= 4 and line.args[2] == '-i'):
+                continue
+            backends = acl_backends.get(line.args[0], set())
+            hosts = [host for host in line.args[3:] if stale_routes.get(host.lower()) not in backends]
+            if len(hosts) == len(line.args) - 3:
+                continue
+            if hosts:
+                section.replace(line, re.match(r'\s*', line.raw).group() + " ".join(line.words[:4] + hosts))
             else:
-                # Fallback: if marker not found, try to insert before default_backend
-                default_backend_pattern = re.compile(r"(\s*default_backend\s+\S+)", re.MULTILINE)
-                match = default_backend_pattern.search(content)
-                if match:
-                    insertion_point = match.start() # Insert just before default_backend
-                    content = content[:insertion_point] + use_backend_line + "\n\n" + content[insertion_point:]
-                else:
-                    logging.warning("Use_backend insertion marker and default_backend not found, appending to end of file.")
-                    content += "\n" + use_backend_line + "\n" # Adding newline for clean append
+                section.remove(line)
+                emptied.add(line.args[0])
+        for line in section.directives('use_backend'):
+            if len(line.args) == 3 and line.args[1] == 'if' and line.args[2] in emptied:
+                section.remove(line)
+    removals = {host: None for host, backend in load_map_file(HOSTS_MAP_PATH) if stale_routes.get(host.lower()) == backend}
+    if removals:
+        update_map_file(HOSTS_MAP_PATH, removals, txn)
 
-        # Write the modified content back to the file
-        with open(FRONTEND_CFG_PATH, 'w') as f:
-            f.write(content)
+def existing_host_routes(content):
+    """Map each hostname already routed by the frontend content or hosts map to its backend."""
+    acl_hosts, routes = {}, {}
+    for section in HAProxyConfig.parse(content).sections_of('frontend', 'listen'):
+        for line in section.lines:
+            if _is_host_acl(line) and len(line.args) >= 4 and line.args[2] == '-i':
+                acl_hosts.setdefault(line.args[0], []).extend(h.lower() for h in line.args[3:])
+            elif line.keyword == 'use_backend' and len(line.args) == 3 and line.args[1] == 'if':
+                for host in acl_hosts.get(line.args[2], []):
+                    routes.setdefault(host, line.args[0])
+    for host, backend in load_map_file(HOSTS_MAP_PATH):
+        routes.setdefault(host.lower(), backend)
+    return routes
+
+def update_frontend_cfg(service_name, service_url, routing_mode=None, txn=None):
+    """Routes service_url to the service's backend in 00-frontend.cfg.
+
+    In 'acl' mode this adds an acl + use_backend pair. In 'map' mode it makes sure the
+    single map-based use_backend rule exists and adds the host to HOSTS_MAP_PATH.
+    Changes are staged in txn when given, otherwise committed in a transaction of their own.
+    """
+    routing_mode = routing_mode or FRONTEND_ROUTING_MODE
+    try:
+        if txn is None:
+            with ConfigTransaction() as txn:
+                return update_frontend_cfg(service_name, service_url, routing_mode, txn)
+
+        # Start from a basic initial structure if the file doesn't exist yet
+        content = txn.read(FRONTEND_CFG_PATH)
+        if content is None:
+            content = FRONTEND_CFG_TEMPLATE
 
+        content = add_frontend_routes(content, [(service_name, service_url)], routing_mode, txn)
+        txn.write(FRONTEND_CFG_PATH, content)
         return True, "00-frontend.cfg updated successfully."
     except Exception as e:
         logging.error(f"Error updating 00-frontend.cfg: {e}")
         return False, f"Error updating 00-frontend.cfg: {str(e)}"
 
+# --- Service Onboarding ---
+
+SERVICE_FIELDS = ('service_name', 'service_ip', 'service_port', 'service_url')
+
+def sanitize_service_name(service_name):
+    """Make a service name safe for filenames and HAProxy identifiers."""
+    # Replace non-alphanumeric with underscore, ensure it starts with a letter or underscore
+    sanitized_service_name = re.sub(r'[^a-zA-Z0-9_]', '_', service_name)
+    if not sanitized_service_name or not sanitized_service_name[0].isalpha() and not sanitized_service_name[0] == '_':
+        sanitized_service_name = "service_" + sanitized_service_name.lstrip('_')
+    return sanitized_service_name
+
+def build_backend_config(service_name, service_ip, service_port, is_https):
+    """Return (filename, content, server_options) for a wizard-style backend file."""
+    backend_filename = f"10-{service_name}_backend.cfg"
+    server_options = "check inter 5s fall 3 rise 2"
+    if is_https:
+        server_options += " ssl verify none"
+
+    backend_content = f"""backend {service_name}_backend
+    mode http
+    balance roundrobin
+    option forwardfor
+    http-reuse safe
+    server {service_name}_server {service_ip}:{service_port} {server_options}"""
+    
+    backend_content += """
+    timeout connect 10s
+    timeout server 30s
+    retries 4
+"""
+    return backend_filename, backend_content, server_options
+
+def _truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+    return bool(value)
+
+def parse_services_file(filename, data):
+    """Parse an uploaded CSV or YAML service list into a list of dicts."""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    if filename.lower().endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ValueError("YAML import needs PyYAML (pip install PyYAML).")
+        try:
+            loaded = yaml.safe_load(text) or []
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML: {e}")
+        services = loaded.get('services', []) if isinstance(loaded, dict) else loaded
+    elif filename.lower().endswith('.csv'):
+        services = list(csv.DictReader(io.StringIO(text)))
+    else:
+        raise ValueError("Unsupported file type, expected .csv, .yaml or .yml.")
+    check_services_list(services)
+    return services
+
+def check_services_list(services):
+    """Raise ValueError unless services is a list of mappings, naming the first entry that isn't."""
+    if not isinstance(services, list):
+        raise ValueError("Expected a list of services.")
+    for index, item in enumerate(services):
+        if not isinstance(item, dict):
+            raise ValueError(f"Service entry {index} must be an object with service_name, service_ip, "
+                             f"service_port and service_url, got {type(item).__name__}.")
+
+def onboard_services(services, routing_mode=None, overwrite=False, validate=False, dry_run=False):
+    """Create backend files and frontend routes for many services in one transaction.
+
+    Duplicates (within the batch and against hosts that are already routed) are
+    detected with sets/dicts built once, and 00-frontend.cfg is rewritten once for
+    the whole batch. An overwritten service whose URL changed loses the routes of
+    its old host(s). Returns (success, results, message) where results has one
+    entry per input item.
+    """
+    routing_mode = routing_mode or FRONTEND_ROUTING_MODE
+    results, accepted, stale_routes = [], [], {}
+    seen_names, seen_hosts = set(), set()
+    try:
+        with ConfigTransaction(validate=validate) as txn:
+            frontend_content = txn.read(FRONTEND_CFG_PATH)
+            if frontend_content is None:
+                frontend_content = FRONTEND_CFG_TEMPLATE
+            routed_hosts = existing_host_routes(frontend_content)
+            backend_hosts = {}
+            for routed_host, routed_backend in routed_hosts.items():
+                backend_hosts.setdefault(routed_backend, []).append(routed_host)
+
+            for index, item in enumerate(services):
+                item = {key: str(value).strip() if value is not None else '' for key, value in item.items()}
+                result = {'index': index, 'service_name': item.get('service_name', '')}
+                results.append(result)
+
+                missing = [field for field in SERVICE_FIELDS if not item.get(field)]
+                if missing:
+                    result.update(status='error', message=f"Missing fields: {', '.join(missing)}")
+                    continue
+                name = sanitize_service_name(item['service_name'])
+                host = item['service_url'].lower()
+                backend_name = f"{name}_backend"
+                result['backend'] = backend_name
+                if name in seen_names:
+                    result.update(status='error', message=f"Duplicate service name '{name}' in this batch.")
+                    continue
+                if host in seen_hosts:
+                    result.update(status='error', message=f"Duplicate URL '{host}' in this batch.")
+                    continue
+                if routed_hosts.get(host, backend_name) != backend_name:
+                    result.update(status='error', message=f"'{host}' is already routed to {routed_hosts[host]}.")
+                    continue
+
+                filename, content, _ = build_backend_config(name, item['service_ip'], item['service_port'], _truthy(item.get('is_https')))
+                path = os.path.join(CONFIG_D_DIR, filename)
+                exists = txn.read(path) is not None
+                if exists and not overwrite:
+                    result.update(status='skipped', file=filename, message="Backend file already exists.")
+                    continue
+
+                seen_names.add(name)
+                seen_hosts.add(host)
+                txn.write(path, content)
+                accepted.append((name, item['service_url']))
+                result.update(status='updated' if exists else 'created', file=filename)
+                if exists:
+                    old_hosts = [old for old in backend_hosts.get(backend_name, []) if old != host]
+                    stale_routes.update((old, backend_name) for old in old_hosts)
+                    if old_hosts:
+                        result['replaced_hosts'] = old_hosts
+
+            if accepted:
+                txn.write(FRONTEND_CFG_PATH, add_frontend_routes(frontend_content, accepted, routing_mode, txn, stale_routes))
+            if dry_run:
+                txn.abort()
+    except (ConfigTransactionError, ValueError) as e:
+        return False, results, str(e)
+
+    errors = sum(1 for result in results if result['status'] == 'error')
+    verb = "would be onboarded" if dry_run else "onboarded"
+    return errors == 0, results, f"{len(accepted)} service(s) {verb}, {errors} error(s)."
+
+def plan_map_migration(content):
+    """Work out how to turn host ACL/use_backend pairs in a frontend file into map entries.
+
+    Only pairs that can be converted without changing behaviour are taken: an
+    'acl X hdr(host) -i host...' that is used by exactly one 'use_backend B if X'
+    rule and nothing else. HAProxy evaluates use_backend rules in order, so only
+    one unbroken run of convertible rules is folded into the map rule (the run
+    holding an existing map rule, otherwise the first one); convertible rules on
+    the far side of a rule that has to stay are listed under 'kept_for_order'.
+    Returns a dict with the new content, the map entries, and what was skipped,
+    kept or conflicting.
+    """
+    config = HAProxyConfig.parse(content)
+    host_acls = {} # acl name -> (section, line, [hosts])
+    acl_uses = {} # acl name -> number of lines referencing it (other than its definition)
+    use_backend_rules = [] # (section, line) in file order
+    map_rule = map_use_backend_line().strip()
+
+    for section in config.sections_of('frontend', 'listen'):
+        for line in section.directives():
+            if _is_host_acl(line) and len(line.args) >= 4 and line.args[2] == '-i':
+                if line.args[0] in host_acls:
+                    host_acls[line.args[0]] = None # ACL defined on several lines - leave it alone
+                else:
+                    host_acls[line.args[0]] = (section, line, line.args[3:])
+                continue
+            if line.keyword == 'use_backend':
+                use_backend_rules.append((section, line))
+            for word in re.findall(r'!?([A-Za-z0-9_.:-]+)', " ".join(line.words)):
+                acl_uses[word] = acl_uses.get(word, 0) + 1
+
+    def convertible(line):
+        """The ACL (section, line, hosts) behind a rule that can move into the map, or None."""
+        if len(line.args) != 3 or line.args[1] != 'if':
+            return None
+        acl = host_acls.get(line.args[2])
+        if not acl or acl_uses.get(line.args[2], 0) != 1:
+            return None
+        if any(host.startswith('-') for host in acl[2]):
+            return None # Extra match flags, not a plain exact match
+        return acl
+
+    # Split each section's rules into runs of convertible rules (and existing map
+    # rules) separated by rules that must stay where they are
+    runs, skipped, current = [], [], None
+    for section, line in use_backend_rules:
+        if line.raw.strip() == map_rule:
+            acl = 'map'
+        else:
+            acl = convertible(line)
+        if acl is None:
+            skipped.append(line.raw.strip())
+            current = None
+            continue
+        if current is None or current['section'] is not section:
+            current = {'section': section, 'rules': [], 'has_map_rule': False}
+            runs.append(current)
+        if acl == 'map':
+            current['has_map_rule'] = True
+        else:
+            current['rules'].append((line, acl))
+
+    chosen = next((run for run in runs if run['has_map_rule']), None)
+    if chosen is None:
+        chosen = next((run for run in runs if run['rules']), None)
+    kept_for_order = [line.raw.strip() for run in runs if run is not chosen for line, _ in run['rules']]
+
+    entries, conflicts, removed = {}, [], []
+    for line, (acl_section, acl_line, hosts) in (chosen['rules'] if chosen else []):
+        backend = line.args[0]
+        for host in hosts:
+            host = host.lower()
+            if host in entries and entries[host] != backend:
+                # The earlier rule wins in HAProxy, so keep it
+                conflicts.append({'host': host, 'kept': entries[host], 'dropped': backend})
+                continue
+            entries.setdefault(host, backend)
+        removed.extend(((acl_section, acl_line), (chosen['section'], line)))
+
+    if chosen and chosen['rules'] and not chosen['has_map_rule']:
+        chosen['section'].insert_before(chosen['rules'][0][0], [map_use_backend_line()])
+    removed.sort(key=lambda item: item[1].lineno)
+    for section, line in removed:
+        section.remove(line)
+
+    return {
+        'content': config.serialize(),
+        'entries': entries,
+        'conflicts': conflicts,
+        'skipped': skipped,
+        'kept_for_order': kept_for_order,
+        'removed_lines': [line.raw.strip() for _, line in removed]
+    }
+
+def migrate_frontend_to_map(dry_run=True):
+    """Convert the host ACL pairs in 00-frontend.cfg to HOSTS_MAP_PATH entries."""
+    try:
+        with ConfigTransaction() as txn:
+            plan = plan_map_migration(txn.read(FRONTEND_CFG_PATH) or "")
+            if not dry_run and plan['entries']:
+                update_map_file(HOSTS_MAP_PATH, plan['entries'], txn)
+                txn.write(FRONTEND_CFG_PATH, plan['content'])
+        return True, plan
+    except Exception as e:
+        logging.error(f"Error migrating 00-frontend.cfg to map routing: {e}")
+        return False, f"Error migrating 00-frontend.cfg: {str(e)}"
+
+_map_file_cache = {} # path -> ((mtime_ns, size, inode), [(key, value)])
+
+def load_map_file(map_path):
+    """Return the (key, value) entries of an HAProxy map file, cached while it's unchanged."""
+    try:
+        st = os.stat(map_path)
+    except OSError:
+        return []
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _map_file_cache.get(map_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    entries = []
+    with open(map_path, 'r') as f:
+        for line in f:
+            words = line.split(None, 1)
+            if len(words) == 2 and not words[0].startswith('#'):
+                entries.append((words[0], words[1].strip()))
+    _map_file_cache[map_path] = (signature, entries)
+    return entries
+
 # --- HAProxy Configuration Parser for Network Map ---
 
 def parse_haproxy_configs():
@@ -181,26 +1453,20 @@ def parse_haproxy_configs():
         'external_clients': []
     }
     
+    started = time.monotonic()
     try:
-        # Parse main haproxy.cfg
-        if os.path.exists(HAPROXY_CFG_PATH):
-            with open(HAPROXY_CFG_PATH, 'r') as f:
-                main_config = f.read()
-                parse_config_content(main_config, topology, 'haproxy.cfg')
-        
-        # Parse config.d files
-        config_files = get_config_files()
-        for filename in config_files:
-            success, content = get_config_file_content(filename)
-            if success:
-                parse_config_content(content, topology, filename)
-                
+        load_config_sections(topology)
+
+        # Fill in server health from the shared status cache
+        probe_backend_servers(topology['backends'])
+
         # Add external client nodes
         add_external_clients(topology)
         
         # Generate connections between components
         generate_connections(topology)
-        
+
+        observe_metric('topology_build_seconds', time.monotonic() - started)
         return topology
         
     except Exception as e:
@@ -214,78 +1480,197 @@ def parse_haproxy_configs():
             'external_clients': []
         }
 
-def parse_config_content(content, topology, filename):
-    """Parse individual config file content."""
-    lines = content.split('\n')
-    current_section = None
-    current_config = {}
-    
-    for line in lines:
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-            
-        # Frontend section
-        if line.startswith('frontend '):
-            if current_section and current_config:
-                finalize_section(current_section, current_config, topology, filename)
-            current_section = 'frontend'
-            current_config = {
-                'name': line.split()[1],
+_parse_cache = {} # path -> ((mtime_ns, size, inode), {'frontends': [...], 'backends': [...]})
+_parse_cache_lock = threading.Lock()
+
+def parse_config_file(path, filename):
+    """Parse a single config file, reusing the cached result while the file is unchanged.
+
+    The cache is keyed on (mtime_ns, size, inode), so an unchanged file costs one
+    stat(). The returned sections are shared between requests - don't mutate them.
+    """
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+    with _parse_cache_lock:
+        cached = _parse_cache.get(path)
+    if cached and cached[0] == signature:
+        inc_metric('parse_cache_requests_total', {'result': 'hit'})
+        return cached[1]
+    inc_metric('parse_cache_requests_total', {'result': 'miss'})
+
+    # stat() happens before the read, so a concurrent edit can only make the
+    # cached signature older than the content - which forces a re-parse next time.
+    with open(path, 'r') as f:
+        content = f.read()
+    sections = {'frontends': [], 'backends': [], 'defaults': None}
+    parse_config_content(content, sections, filename)
+    with _parse_cache_lock:
+        _parse_cache[path] = (signature, sections)
+    return sections
+
+def invalidate_parse_cache(paths=None):
+    """Drop cached parse results for the given paths (or for everything)."""
+    with _parse_cache_lock:
+        if paths is None:
+            _parse_cache.clear()
+        else:
+            for path in paths:
+                _parse_cache.pop(path, None)
+
+def config_source_paths():
+    """Return [(path, display filename)] for haproxy.cfg and every config.d file, in load order."""
+    sources = []
+    if os.path.exists(HAPROXY_CFG_PATH):
+        sources.append((HAPROXY_CFG_PATH, 'haproxy.cfg'))
+    for filename in get_config_files():
+        sources.append((os.path.join(CONFIG_D_DIR, filename), filename))
+    return sources
+
+def load_config_sections(topology):
+    """Assemble haproxy.cfg and every config.d file into topology's frontends/backends.
+
+    Only files that changed since the last call are re-parsed; everything else
+    comes from the per-file parse cache.
+    """
+    sources = config_source_paths()
+    # HAProxy reads the files in this order, so a defaults section carries over into later files
+    inherited = {'mode': 'http', 'balance': 'roundrobin', 'http_check': None}
+    for path, filename in sources:
+        try:
+            sections = parse_config_file(path, filename)
+        except OSError as e:
+            logging.error(f"Error reading file {filename}: {e}")
+            continue
+        # Copy the records we hand out; callers fill in server status and ids.
+        topology['frontends'].extend(dict(frontend) for frontend in sections['frontends'])
+        for backend in sections['backends']:
+            record = dict(backend, servers=[dict(server) for server in backend['servers']])
+            for key in ('mode', 'balance', 'http_check'):
+                if record[key] is None:
+                    record[key] = inherited[key]
+            topology['backends'].append(record)
+        if sections['defaults']:
+            inherited = sections['defaults']
+
+    # Forget files that were removed from config.d
+    current = {path for path, _ in sources}
+    with _parse_cache_lock:
+        for path in [path for path in _parse_cache if path not in current]:
+            del _parse_cache[path]
+    return topology
+
+def parse_config_content(content, topology, filename):
+    """Parse individual config file content.
+
+    frontend, backend and listen sections become topology records (a listen section
+    is both a frontend and the backend it routes to). mode/balance come from the
+    preceding defaults section, as does the HTTP health check unless the backend
+    sets its own; backends with no defaults section before them in this file keep
+    None so load_config_sections can fill in the inherited values.
+    The last defaults seen is stored in topology['defaults'].
+    """
+    defaults = None
+    for section in HAProxyConfig.parse(content).sections:
+        if section.kind == 'defaults':
+            defaults = {'mode': 'http', 'balance': 'roundrobin', 'http_check': parse_http_check(section)}
+            for line in section.directives():
+                if line.keyword in defaults and line.args:
+                    defaults[line.keyword] = line.args[0]
+            continue
+        if section.kind not in ('frontend', 'backend', 'listen') or not section.name:
+            continue
+
+        frontend = backend = None
+        if section.kind in ('frontend', 'listen'):
+            frontend = {
+                'name': section.name,
                 'binds': [],
                 'acls': [],
                 'use_backends': [],
-                'default_backend': None,
+                'default_backend': section.name if section.kind == 'listen' else None,
                 'filename': filename
             }
-            
-        # Backend section
-        elif line.startswith('backend '):
-            if current_section and current_config:
-                finalize_section(current_section, current_config, topology, filename)
-            current_section = 'backend'
-            current_config = {
-                'name': line.split()[1],
+        if section.kind in ('backend', 'listen'):
+            backend = {
+                'name': section.name,
                 'servers': [],
-                'mode': 'http',
-                'balance': 'roundrobin',
+                'mode': defaults['mode'] if defaults else None,
+                'balance': defaults['balance'] if defaults else None,
+                'http_check': parse_http_check(section) or (defaults['http_check'] if defaults else None),
                 'filename': filename
             }
-            
-        # Parse frontend/backend directives
-        elif current_section:
-            if line.startswith('bind '):
-                bind_info = parse_bind_directive(line)
+
+        for line in section.directives():
+            directive = " ".join(line.words)
+            keyword = line.keyword
+            if frontend is not None and keyword == 'bind':
+                bind_info = parse_bind_directive(directive)
                 if bind_info:
-                    current_config['binds'].append(bind_info)
-                    
-            elif line.startswith('acl '):
-                acl_info = parse_acl_directive(line)
+                    frontend['binds'].append(bind_info)
+            elif frontend is not None and keyword == 'acl':
+                acl_info = parse_acl_directive(directive)
                 if acl_info:
-                    current_config['acls'].append(acl_info)
-                    
-            elif line.startswith('use_backend '):
-                backend_info = parse_use_backend_directive(line)
+                    frontend['acls'].append(acl_info)
+            elif frontend is not None and keyword == 'use_backend':
+                backend_info = parse_use_backend_directive(directive)
                 if backend_info:
-                    current_config['use_backends'].append(backend_info)
-                    
-            elif line.startswith('default_backend '):
-                current_config['default_backend'] = line.split()[1]
-                
-            elif line.startswith('server '):
-                server_info = parse_server_directive(line)
+                    frontend['use_backends'].append(backend_info)
+            elif frontend is not None and keyword == 'default_backend' and line.args:
+                frontend['default_backend'] = line.args[0]
+            elif backend is not None and keyword == 'server':
+                server_info = parse_server_directive(directive)
                 if server_info:
-                    current_config['servers'].append(server_info)
-                    
-            elif line.startswith('mode '):
-                current_config['mode'] = line.split()[1]
-                
-            elif line.startswith('balance '):
-                current_config['balance'] = line.split()[1]
-    
-    # Don't forget the last section
-    if current_section and current_config:
-        finalize_section(current_section, current_config, topology, filename)
+                    backend['servers'].append(server_info)
+            elif keyword in ('mode', 'balance') and line.args:
+                for record in (frontend, backend):
+                    if record is not None:
+                        record[keyword] = line.args[0]
+
+        if frontend is not None:
+            finalize_section('frontend', frontend, topology, filename)
+        if backend is not None:
+            finalize_section('backend', backend, topology, filename)
+    if defaults is not None:
+        topology['defaults'] = defaults
+
+def _is_ip_address(text):
+    try:
+        ipaddress.ip_address(text)
+        return True
+    except ValueError:
+        return False
+
+def split_address(text):
+    """Split an HAProxy address into (host, port text or None).
+
+    Handles host:port, [ipv6]:port, bare IPv4/IPv6 addresses and hostnames, an
+    'ipv4@'/'ipv6@' prefix, and HAProxy's unbracketed IPv6 form where the last
+    colon starts the port (2001:db8::1:80). A missing host ('*:80', ':80') is '*'.
+    """
+    for prefix in ('ipv4@', 'ipv6@'):
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+    if text.startswith('['):
+        host, _, rest = text[1:].partition(']')
+        return host, (rest[1:] or None) if rest.startswith(':') else None
+    if text.count(':') > 1:
+        head, _, tail = text.rpartition(':')
+        if _is_ip_address(head) and re.fullmatch(r'[+-]?\d*(?:-\d+)?', tail):
+            return head, tail or None
+        return text, None # A bare IPv6 address
+    host, colon, port = text.partition(':')
+    if not colon:
+        return host, None
+    return host or '*', port or None
+
+def port_number(port, default):
+    """The first port of an address's port text ('8080', '8080-8089'), or default."""
+    match = re.match(r'\+?(\d+)', port or '')
+    return int(match.group(1)) if match else default
+
+def format_address(host, port):
+    """host:port, with IPv6 addresses in brackets."""
+    return f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
 
 def parse_bind_directive(line):
     """Parse bind directive to extract IP and port."""
@@ -293,206 +1678,3200 @@ def parse_bind_directive(line):
     if len(parts) < 2:
         return None
         
-    bind_addr = parts[1]
     ssl_enabled = 'ssl' in line
+    ip, port = split_address(parts[1])
+    if ip == '*':
+        ip = '0.0.0.0'
+    
+    return {
+        'ip': ip,
+        'port': port_number(port, 443 if ssl_enabled else 80),
+        'ssl': ssl_enabled,
+        'protocol': 'HTTPS' if ssl_enabled else 'HTTP'
+    }
+
+def parse_acl_directive(line):
+    """Parse ACL directive."""
+    parts = line.split()
+    if len(parts) < 4:
+        return None
+    
+    return {
+        'name': parts[1],
+        'matcher': ' '.join(parts[2:]),
+        'type': 'hostname' if 'hdr(host)' in line else 'other'
+    }
+
+def parse_use_backend_directive(line):
+    """Parse use_backend directive."""
+    parts = line.split()
+    if len(parts) < 2:
+        return None
+    
+    backend_name = parts[1]
+    condition = ' '.join(parts[3:]) if len(parts) > 3 else None
+
+    # Dynamic rule, e.g. use_backend %[req.hdr(host),lower,map(/etc/haproxy/hosts.map)]
+    map_match = re.search(r'map(?:_\w+)?\(([^,)]+)', backend_name) if backend_name.startswith('%[') else None
+    if map_match:
+        return {
+            'backend': None,
+            'map': map_match.group(1),
+            'condition': condition
+        }
+
+    return {
+        'backend': backend_name,
+        'condition': condition
+    }
+
+def parse_server_directive(line):
+    """Parse server directive to extract backend server info.
+
+    Options that change how the server is health checked are kept as well, but
+    only when set: 'check_port' and 'check_addr' (the 'port' and 'addr' options)
+    and 'check_ssl' when checks don't follow 'ssl' ('check-ssl', 'no-check-ssl').
+    """
+    parts = line.split()
+    if len(parts) < 3:
+        return None
     
-    # Parse address:port
-    if ':' in bind_addr:
-        if bind_addr.startswith('*:'):
-            ip = '0.0.0.0'
-            port = bind_addr.split(':')[1]
+    server_name = parts[1]
+    ip, port = split_address(parts[2])
+    options = parts[3:]
+
+    def option_value(name):
+        index = options.index(name) if name in options else len(options)
+        return options[index + 1] if index + 1 < len(options) else None
+
+    ssl_enabled = 'ssl' in options
+    server = {
+        'name': server_name,
+        'ip': ip,
+        'port': port_number(port, 80),
+        'ssl': ssl_enabled,
+        'health_check': 'check' in options,
+        'status': 'unknown' # Filled in later by probe_backend_servers()
+    }
+    if 'port' in options:
+        server['check_port'] = port_number(option_value('port'), None)
+    if 'addr' in options:
+        server['check_addr'] = option_value('addr')
+    check_ssl = 'check-ssl' in options or (ssl_enabled and 'no-check-ssl' not in options)
+    if check_ssl != ssl_enabled:
+        server['check_ssl'] = check_ssl
+    return server
+
+HTTP_CHECK_EXPECT_KINDS = ('status', 'rstatus', 'string', 'rstring')
+HTTP_CHECK_DEFAULT_EXPECT = ['rstatus', '^[23]', False] # [kind, pattern, negated]
+
+def parse_http_check(section):
+    """The HTTP check a backend, listen or defaults section configures, or None without 'option httpchk'.
+
+    Reads 'option httpchk [[<method>] <uri> [<version>]]' (an old-style version
+    may carry a 'Host:' header), 'http-check send meth/uri/hdr Host' and the first
+    'http-check expect [!] status|rstatus|string|rstring <pattern>'. Without a
+    supported expect rule any 2xx or 3xx response passes, as in HAProxy.
+    """
+    check, expect = None, None
+    for line in section.directives():
+        words = line.words
+        if words[:2] == ['option', 'httpchk']:
+            args = words[2:]
+            check = {'method': 'OPTIONS', 'path': '/', 'host': None}
+            if len(args) == 1:
+                check['path'] = args[0]
+            elif len(args) >= 2:
+                check['method'], check['path'] = args[0].upper(), args[1]
+            host = re.search(r'host:\s*(\S+)', ' '.join(args[2:]), re.IGNORECASE)
+            if host:
+                check['host'] = host.group(1)
+        elif words[:2] == ['http-check', 'send'] and check is not None:
+            options, index = words[2:], 0
+            while index + 1 < len(options):
+                name, value = options[index], options[index + 1]
+                if name == 'hdr':
+                    if value.lower() == 'host' and index + 2 < len(options):
+                        check['host'] = options[index + 2]
+                    index += 3
+                    continue
+                if name == 'meth':
+                    check['method'] = value.upper()
+                elif name == 'uri':
+                    check['path'] = value
+                index += 2
+        elif words[:2] == ['http-check', 'expect'] and expect is None:
+            args = words[2:]
+            for index, word in enumerate(args[:-1]):
+                if word in HTTP_CHECK_EXPECT_KINDS:
+                    expect = [word, args[index + 1], index > 0 and args[index - 1] == '!']
+                    break
+    if check is None:
+        return None
+    check['expect'] = expect or HTTP_CHECK_DEFAULT_EXPECT
+    return check
+
+# --- Health Probes ---
+
+# What a server is probed with: (ip, port) for a TCP connect, or (ip, port, HttpCheck)
+# for an HTTP(S) request to address:port (the server's own unless 'addr'/'port' override it)
+HttpCheck = collections.namedtuple('HttpCheck', 'method path host expect ssl address port')
+
+SERVER_STATUSES = ('healthy', 'unhealthy', 'unreachable', 'unknown') # 'unhealthy': answered, but failed the HTTP check
+UNKNOWN_HEALTH = {'status': 'unknown', 'latency_ms': None, 'detail': None}
+
+def probe_target(backend, server):
+    """The probe target for one server of a (load_config_sections) backend record."""
+    check = backend.get('http_check')
+    if not check or not server['health_check']:
+        return (server['ip'], server['port'])
+    return (server['ip'], server['port'], HttpCheck(
+        method=check['method'],
+        path=check['path'],
+        host=check['host'],
+        expect=tuple(check['expect']),
+        ssl=server.get('check_ssl', server['ssl']),
+        address=server.get('check_addr') or server['ip'],
+        port=server.get('check_port') or server['port']
+    ))
+
+def probe_targets(backends):
+    """Probe targets for every server of the given backends, in server order."""
+    return [probe_target(backend, server) for backend in backends for server in backend['servers']]
+
+def describe_check(target):
+    """Short description of how a target is probed, e.g. 'GET http://10.0.0.1:80/health expect status 200'."""
+    if len(target) == 2:
+        return f"TCP connect to {format_address(target[0], target[1])}"
+    check = target[2]
+    kind, pattern, negated = check.expect
+    scheme = 'https' if check.ssl else 'http'
+    return (f"{check.method} {scheme}://{format_address(check.address, check.port)}{check.path} "
+            f"expect {'! ' if negated else ''}{kind} {pattern}")
+
+_dns_cache = {} # (host, port) -> (expires, [(family, sockaddr)] or the socket.gaierror of a failed lookup)
+_dns_cache_lock = threading.Lock()
+DNS_CACHE_MAX_ENTRIES = 4096
+
+def resolve_address(host, port):
+    """[(family, sockaddr)] for host:port, IPv4 and IPv6 alike.
+
+    IP literals are converted without a lookup. Hostnames are resolved at most
+    once per DNS_CACHE_TTL seconds; a failed lookup raises the same
+    socket.gaierror again until DNS_NEGATIVE_TTL has passed, so an unresolvable
+    server doesn't cost a resolver round trip on every probe.
+    """
+    if _is_ip_address(host):
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM, flags=socket.AI_NUMERICHOST)
+        return [(family, sockaddr) for family, _, _, _, sockaddr in infos]
+    key = (host, port)
+    now = time.monotonic()
+    with _dns_cache_lock:
+        cached = _dns_cache.get(key)
+    if cached and cached[0] > now:
+        inc_metric('dns_cache_requests_total', {'result': 'hit'})
+        if isinstance(cached[1], socket.gaierror):
+            raise cached[1]
+        return cached[1]
+    inc_metric('dns_cache_requests_total', {'result': 'miss'})
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        result, ttl = [(family, sockaddr) for family, _, _, _, sockaddr in infos], DNS_CACHE_TTL
+    except socket.gaierror as e:
+        result, ttl = e, DNS_NEGATIVE_TTL
+    with _dns_cache_lock:
+        if len(_dns_cache) >= DNS_CACHE_MAX_ENTRIES:
+            for stale in [key for key, (expires, _) in _dns_cache.items() if expires <= now]:
+                del _dns_cache[stale]
+            if len(_dns_cache) >= DNS_CACHE_MAX_ENTRIES:
+                _dns_cache.clear()
+        _dns_cache[key] = (now + ttl, result)
+    if isinstance(result, socket.gaierror):
+        raise result
+    return result
+
+def open_probe_socket(host, port, timeout):
+    """A connected TCP socket to host:port, trying each resolved address in turn."""
+    error = None
+    for family, sockaddr in resolve_address(host, port):
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f"No addresses found for {host}")
+
+def check_server_status(ip, port, timeout=HEALTH_PROBE_TIMEOUT):
+    """Check if a server is reachable (a TCP connect to its address or hostname)."""
+    try:
+        sock = open_probe_socket(ip, port, timeout)
+    except socket.gaierror:
+        return 'unknown'
+    except OSError:
+        return 'unreachable'
+    sock.close()
+    return 'healthy'
+
+class ProbeConnection(http.client.HTTPConnection):
+    """HTTP(S) connection to a check endpoint, connected through the DNS cache."""
+
+    def __init__(self, host, port, timeout, ssl_context=None, server_hostname=None, tls_session=None):
+        super().__init__(host, port, timeout=timeout)
+        self.ssl_context = ssl_context
+        self.server_hostname = server_hostname
+        self.tls_session = tls_session
+
+    def connect(self):
+        sock = open_probe_socket(self.host, self.port, self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.ssl_context:
+            try:
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=self.server_hostname, session=self.tls_session)
+            except (OSError, ValueError):
+                sock.close()
+                raise
+        self.sock = sock
+
+class ProbeConnectionPool:
+    """Idle keep-alive connections to check endpoints, reused by later probes.
+
+    A connection is checked out for one request at a time. Connections idle for
+    longer than HEALTH_PROBE_IDLE_TIMEOUT are closed rather than reused. With
+    HEALTH_PROBE_MAX_IDLE connections idle, returned ones are closed instead of
+    evicting others: probes visit every server in turn, so evicting the least
+    recently used would leave nothing to reuse by the time its turn comes again.
+    The last TLS session per endpoint is kept too, so reconnecting to a server
+    that dropped an idle connection resumes it instead of a full handshake.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = collections.OrderedDict() # connection -> (endpoint, released at), oldest first
+        self.by_endpoint = {} # endpoint -> [idle connections]
+        self.tls_sessions = {} # endpoint -> ssl.SSLSession
+
+    def get(self, endpoint):
+        """An idle connection to endpoint, or None."""
+        now = time.monotonic()
+        found, expired = None, []
+        with self.lock:
+            connections = self.by_endpoint.get(endpoint, [])
+            while connections and found is None:
+                connection = connections.pop()
+                _, released = self.idle.pop(connection)
+                if now - released < HEALTH_PROBE_IDLE_TIMEOUT:
+                    found = connection
+                else:
+                    expired.append(connection)
+            if not connections:
+                self.by_endpoint.pop(endpoint, None)
+        for connection in expired:
+            connection.close()
+        return found
+
+    def put(self, endpoint, connection):
+        """Return a connection whose last response was read in full."""
+        now = time.monotonic()
+        closing = []
+        with self.lock:
+            if connection.sock is not None and hasattr(connection.sock, 'session'):
+                self.tls_sessions[endpoint] = connection.sock.session
+            while self.idle and len(self.idle) >= HEALTH_PROBE_MAX_IDLE:
+                oldest, (oldest_endpoint, released) = next(iter(self.idle.items()))
+                if now - released < HEALTH_PROBE_IDLE_TIMEOUT:
+                    break
+                del self.idle[oldest]
+                self.by_endpoint[oldest_endpoint].remove(oldest)
+                if not self.by_endpoint[oldest_endpoint]:
+                    del self.by_endpoint[oldest_endpoint]
+                closing.append(oldest)
+            if len(self.idle) < HEALTH_PROBE_MAX_IDLE:
+                self.idle[connection] = (endpoint, now)
+                self.by_endpoint.setdefault(endpoint, []).append(connection)
+            else:
+                closing.append(connection)
+        for idle in closing:
+            idle.close()
+
+    def tls_session(self, endpoint):
+        with self.lock:
+            return self.tls_sessions.get(endpoint)
+
+    def clear(self):
+        """Close every idle connection and forget the TLS sessions."""
+        with self.lock:
+            connections = list(self.idle)
+            self.idle.clear()
+            self.by_endpoint.clear()
+            self.tls_sessions.clear()
+        for connection in connections:
+            connection.close()
+
+probe_connections = ProbeConnectionPool()
+_probe_ssl_context = None
+
+def probe_ssl_context():
+    """TLS context for checks. Certificates aren't verified (like 'verify none'): the check is about health, not identity."""
+    global _probe_ssl_context
+    if _probe_ssl_context is None:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        _probe_ssl_context = context
+    return _probe_ssl_context
+
+def http_check_passes(expect, status_code, body):
+    """Whether a response satisfies an http-check expect rule [kind, pattern, negated]."""
+    kind, pattern, negated = expect
+    if kind == 'status':
+        matched = False
+        for codes in pattern.split(','):
+            low, _, high = codes.partition('-')
+            if low.isdigit() and int(low) <= status_code <= int(high if high.isdigit() else low):
+                matched = True
+    elif kind == 'rstatus':
+        matched = re.search(pattern, str(status_code)) is not None
+    elif kind == 'string':
+        matched = pattern.encode() in body
+    else:
+        matched = re.search(pattern.encode(), body) is not None
+    return matched != negated
+
+def http_check(check, timeout=HEALTH_PROBE_TIMEOUT):
+    """Run one HTTP(S) check over a pooled keep-alive connection and return (status, detail).
+
+    'healthy' when the response matches the expect rule, 'unhealthy' when it
+    doesn't, 'unreachable' when no response came back and 'unknown' when the
+    address doesn't resolve. Requests are HTTP/1.1 whatever version the check
+    names, with the configured Host header or else the check address. A pooled
+    connection the server has closed since is retried once on a new connection.
+    """
+    host = check.host or format_address(check.address, check.port)
+    server_hostname = None
+    if check.ssl:
+        sni = split_address(host)[0]
+        server_hostname = sni if not _is_ip_address(sni) else None
+    endpoint = (check.address, check.port, check.ssl, server_hostname)
+    connection = probe_connections.get(endpoint)
+    reused = connection is not None
+    while True:
+        if connection is None:
+            connection = ProbeConnection(check.address, check.port, timeout,
+                                         probe_ssl_context() if check.ssl else None, server_hostname,
+                                         probe_connections.tls_session(endpoint) if check.ssl else None)
         else:
-            ip, port = bind_addr.split(':', 1)
+            connection.sock.settimeout(timeout)
+        try:
+            connection.putrequest(check.method, check.path, skip_host=True, skip_accept_encoding=True)
+            connection.putheader('Host', host)
+            connection.putheader('User-Agent', 'haproxy-web-app-check')
+            connection.endheaders()
+            response = connection.getresponse()
+            body = response.read(HEALTH_CHECK_MAX_BODY)
+            break
+        except socket.gaierror as e:
+            connection.close()
+            return 'unknown', f"DNS lookup failed: {e}"
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            if reused and isinstance(e, (ConnectionError, http.client.BadStatusLine)):
+                connection, reused = None, False
+                continue
+            return 'unreachable', str(e) or type(e).__name__
+
+    inc_metric('health_probe_connections_total', {'result': 'reused' if reused else 'new'})
+    if response.isclosed() and not response.will_close:
+        probe_connections.put(endpoint, connection)
     else:
-        ip = bind_addr
-        port = '80' if not ssl_enabled else '443'
+        connection.close() # Server asked to close, or the body was too large to drain
+    status = 'healthy' if http_check_passes(check.expect, response.status, body) else 'unhealthy'
+    return status, f"HTTP {response.status} {response.reason}".strip()
+
+def probe_server(target, timeout=HEALTH_PROBE_TIMEOUT):
+    """Probe one target and return {'status', 'latency_ms', 'detail'}."""
+    started = time.monotonic()
+    detail = None
+    try:
+        if len(target) == 2:
+            status = check_server_status(target[0], target[1], timeout)
+        else:
+            status, detail = http_check(target[2], timeout)
+    except Exception as e:
+        status, detail = 'unknown', str(e)
+    elapsed = time.monotonic() - started
+    observe_metric('health_probe_seconds', elapsed, {'status': status})
+    return {'status': status, 'latency_ms': round(elapsed * 1000, 2), 'detail': detail}
+
+def probe_servers(targets, concurrency=HEALTH_PROBE_CONCURRENCY, timeout=HEALTH_PROBE_TIMEOUT):
+    """Probe a collection of targets (see probe_target()) in parallel.
+
+    Returns a dict mapping each target to its probe_server() result. Duplicate
+    targets are only probed once, and the total time is bounded by the slowest
+    single probe (as long as there are no more targets than worker threads).
+    """
+    unique = list(dict.fromkeys(targets))
+    if not unique:
+        return {}
+
+    workers = max(1, min(concurrency, len(unique)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='health-probe') as pool:
+        results = pool.map(lambda target: probe_server(target, timeout), unique)
+        return dict(zip(unique, results))
+
+# --- Health Status Cache ---
+
+_health_refresh_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='health-revalidate')
+_health_refresh_pending = set()
+_health_probe_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='health-probe')
+_inline_probes = {} # probe target -> Future of the probe batch covering it
+_health_refresh_lock = threading.Lock()
+_health_refresher_started = False
+
+@functools.lru_cache(maxsize=65536)
+def _health_key(ip, port, check=None):
+    if check is None:
+        return f"{ip}:{port}"
+    return f"{ip}:{port} {describe_check((ip, port, check))}"
+
+def store_server_statuses(statuses):
+    """Record probe results {target: probe_server() result} in the shared health cache."""
+    if not statuses:
+        return
+    now = time.time()
+
+    def update(cache):
+        for target, result in statuses.items():
+            cache[_health_key(*target)] = dict(result, checked_at=now)
+        return cache
+
+    update_shared_state('health_cache', update)
+
+def _revalidate(addresses):
+    try:
+        store_server_statuses(probe_servers(addresses))
+    except Exception as e:
+        logging.error(f"Background health revalidation failed: {e}")
+    finally:
+        with _health_refresh_lock:
+            _health_refresh_pending.difference_update(addresses)
+
+def schedule_revalidation(addresses):
+    """Queue a background re-probe of addresses, skipping ones already queued."""
+    with _health_refresh_lock:
+        fresh = [addr for addr in addresses if addr not in _health_refresh_pending]
+        _health_refresh_pending.update(fresh)
+    if fresh:
+        _health_refresh_pool.submit(_revalidate, fresh)
+
+def _probe_batch(addresses):
+    try:
+        statuses = probe_servers(addresses)
+        store_server_statuses(statuses)
+        return statuses
+    finally:
+        with _health_refresh_lock:
+            for addr in addresses:
+                _inline_probes.pop(addr, None)
+
+def probe_unseen_servers(addresses, wait=HEALTH_INLINE_PROBE_WAIT):
+    """Probe addresses that have no cache entry yet, off the request thread.
+
+    Requests asking for the same addresses at the same time share one in-flight
+    probe instead of each opening their own connections. Waits up to `wait`
+    seconds; anything not answered by then is 'unknown' for this request, and the
+    probe finishes in the background and fills the cache.
+    """
+    with _health_refresh_lock:
+        futures = {addr: _inline_probes[addr] for addr in addresses if addr in _inline_probes}
+        new = [addr for addr in addresses if addr not in futures]
+        if new:
+            future = _health_probe_pool.submit(_probe_batch, new)
+            for addr in new:
+                _inline_probes[addr] = future
+                futures[addr] = future
+    wait_for_futures(set(futures.values()), timeout=wait)
+    statuses = {}
+    for addr, future in futures.items():
+        if future.done() and future.exception() is None:
+            statuses[addr] = future.result().get(addr, UNKNOWN_HEALTH)
+        else:
+            statuses[addr] = UNKNOWN_HEALTH
+    return statuses
+
+def get_server_statuses(addresses):
+    """Return {target: {'status', 'latency_ms', 'detail', ...}} from the shared cache, with stale-while-revalidate.
+
+    Fresh entries are returned directly. Stale entries are returned too, but a
+    background re-probe is queued. Addresses never seen before (or too old to
+    serve) are probed through probe_unseen_servers(), which bounds the wait.
+    """
+    start_health_refresher()
+    cache = read_shared_state('health_cache')
+    now = time.time()
+    statuses, stale, missing = {}, [], []
+    for addr in dict.fromkeys(addresses):
+        entry = cache.get(_health_key(*addr))
+        age = now - entry['checked_at'] if entry else None
+        if age is None or age > HEALTH_CACHE_TTL + HEALTH_CACHE_STALE:
+            missing.append(addr)
+            continue
+        statuses[addr] = entry
+        if age > HEALTH_CACHE_TTL:
+            stale.append(addr)
+
+    if stale:
+        schedule_revalidation(stale)
+    if missing:
+        statuses.update(probe_unseen_servers(missing))
+    return statuses
+
+def get_server_status(ip, port):
+    """Cached result of a TCP probe, like check_server_status() plus 'latency_ms' and 'detail'."""
+    return get_server_statuses([(ip, port)]).get((ip, port), UNKNOWN_HEALTH)
+
+def refresh_configured_servers():
+    """Re-probe every configured server and drop cache entries nobody needs any more."""
+    topology = load_config_sections({'frontends': [], 'backends': []})
+    addresses = set(probe_targets(topology['backends']))
+    statuses = probe_servers(addresses)
+    keep_after = time.time() - HEALTH_CACHE_TTL - HEALTH_CACHE_STALE
+    wanted = {_health_key(*addr) for addr in addresses}
+
+    def update(cache):
+        cache = {key: entry for key, entry in cache.items()
+                 if key in wanted or entry['checked_at'] >= keep_after}
+        now = time.time()
+        for target, result in statuses.items():
+            cache[_health_key(*target)] = dict(result, checked_at=now)
+        return cache
+
+    update_shared_state('health_cache', update)
+
+def server_health_report():
+    """Last cached probe result per configured server, keyed by topology node id (nothing is probed)."""
+    topology = load_config_sections({'frontends': [], 'backends': []})
+    cache = read_shared_state('health_cache')
+    nodes = {}
+    for backend in topology['backends']:
+        for server in backend['servers']:
+            target = probe_target(backend, server)
+            entry = cache.get(_health_key(*target))
+            if entry:
+                nodes[f"server_{backend['name']}_{server['name']}"] = dict(entry, check=describe_check(target))
+    return nodes
+
+def _health_refresher_loop():
+    leader = None
+    while True:
+        try:
+            if leader is None:
+                leader = try_acquire_leadership('health_refresher')
+            if leader:
+                refresh_configured_servers()
+        except Exception as e:
+            logging.error(f"Health refresher error: {e}")
+        time.sleep(HEALTH_REFRESH_INTERVAL)
+
+def start_health_refresher():
+    """Start the background refresher thread in this worker (once).
+
+    Every worker runs the loop, but only the one holding the leader lock probes,
+    so the backends see a single set of probes however many workers there are.
+    """
+    global _health_refresher_started
+    with _health_refresh_lock:
+        if _health_refresher_started:
+            return
+        _health_refresher_started = True
+    threading.Thread(target=_health_refresher_loop, name='health-refresher', daemon=True).start()
+
+def probe_backend_servers(backends):
+    """Fill in the 'status' of every server in the given backends."""
+    targets = probe_targets(backends)
+    results = get_server_statuses(targets)
+    servers = (server for backend in backends for server in backend['servers'])
+    for server, target in zip(servers, targets):
+        server['status'] = results.get(target, UNKNOWN_HEALTH)['status']
+
+def finalize_section(section_type, config, topology, filename):
+    """Add completed section to topology."""
+    if section_type == 'frontend':
+        # Generate unique ID
+        config['id'] = f"frontend_{config['name']}"
+        config['type'] = 'frontend'
+        topology['frontends'].append(config)
+        
+    elif section_type == 'backend':
+        # Generate unique ID
+        config['id'] = f"backend_{config['name']}"
+        config['type'] = 'backend'
+        topology['backends'].append(config)
+
+WELL_KNOWN_CLIENTS = {
+    80: ('http_clients', 'HTTP Clients', 'HTTP'),
+    443: ('https_clients', 'HTTPS Clients', 'HTTPS')
+}
+
+def external_client(port):
+    """The external client node for traffic arriving on a bind port."""
+    client_id, name, protocol = WELL_KNOWN_CLIENTS.get(port, (f'port_{port}_clients', f'Port {port} Clients', 'TCP'))
+    return {
+        'id': client_id,
+        'type': 'external_client',
+        'name': name,
+        'port': port,
+        'protocol': protocol
+    }
+
+def add_external_clients(topology):
+    """Add one external client node per distinct frontend bind port, in first-seen order."""
+    clients = {}
+    for frontend in topology['frontends']:
+        for bind in frontend['binds']:
+            if bind['port'] not in clients:
+                clients[bind['port']] = external_client(bind['port'])
+    topology['external_clients'].extend(clients.values())
+
+class TopologyIndex:
+    """Name-keyed lookups over an assembled topology, built once per generate_connections call.
+
+    Backends are keyed by name (the first definition wins, as with HAProxy's
+    duplicate-name check) and clients by port, so resolving a use_backend,
+    default_backend or bind is a dict lookup rather than a list scan.
+    """
+
+    __slots__ = ('backends', 'clients')
+
+    def __init__(self, topology):
+        self.backends = {}
+        for backend in topology['backends']:
+            self.backends.setdefault(backend['name'], backend)
+        self.clients = {client['port']: client for client in topology['external_clients']}
+
+def map_routing_connections(frontend, use_backend, index):
+    """Expand a map-based use_backend rule into one routing connection per target backend."""
+    hosts_by_backend = {}
+    for host, backend_name in load_map_file(use_backend['map']):
+        hosts_by_backend.setdefault(backend_name, []).append(host)
+
+    connections = []
+    map_name = os.path.basename(use_backend['map'])
+    for backend_name, hosts in hosts_by_backend.items():
+        backend = index.backends.get(backend_name)
+        if backend:
+            connections.append({
+                'id': f"conn_{frontend['id']}_to_{backend['id']}",
+                'source': frontend['id'],
+                'target': backend['id'],
+                'type': 'routing',
+                'condition': f"host in {map_name}: {' '.join(hosts)}",
+                'protocol': 'HTTP/HTTPS'
+            })
+    return connections
+
+def generate_connections(topology):
+    """Generate connections between nodes in one pass over frontends and backends."""
+    index = TopologyIndex(topology)
+    connections = []
+    
+    for frontend in topology['frontends']:
+        # Connections from external clients, one per client port this frontend binds
+        linked_ports = set()
+        for bind in frontend['binds']:
+            client = index.clients.get(bind['port'])
+            if client is None or bind['port'] in linked_ports:
+                continue
+            linked_ports.add(bind['port'])
+            connections.append({
+                'id': f"conn_{client['id']}_to_{frontend['id']}",
+                'source': client['id'],
+                'target': frontend['id'],
+                'type': 'incoming',
+                'protocol': client['protocol'],
+                'port': client['port']
+            })
+
+        # Direct use_backend connections
+        for use_backend in frontend['use_backends']:
+            if use_backend.get('map'):
+                connections.extend(map_routing_connections(frontend, use_backend, index))
+                continue
+            backend = index.backends.get(use_backend['backend'])
+            if backend:
+                connections.append({
+                    'id': f"conn_{frontend['id']}_to_{backend['id']}",
+                    'source': frontend['id'],
+                    'target': backend['id'],
+                    'type': 'routing',
+                    'condition': use_backend.get('condition'),
+                    'protocol': 'HTTP/HTTPS'
+                })
+        
+        # Default backend connection
+        backend = index.backends.get(frontend['default_backend']) if frontend['default_backend'] else None
+        if backend:
+            connections.append({
+                'id': f"conn_{frontend['id']}_to_{backend['id']}_default",
+                'source': frontend['id'],
+                'target': backend['id'],
+                'type': 'default_routing',
+                'protocol': 'HTTP/HTTPS'
+            })
+    
+    # Connections from backends to servers
+    for backend in topology['backends']:
+        for server in backend['servers']:
+            server_id = f"server_{backend['name']}_{server['name']}"
+            connections.append({
+                'id': f"conn_{backend['id']}_to_{server_id}",
+                'source': backend['id'],
+                'target': server_id,
+                'type': 'backend_server',
+                'protocol': 'HTTPS' if server['ssl'] else 'HTTP',
+                'port': server['port'],
+                'server_status': server['status']
+            })
     
+    topology['connections'] = connections
+
+# --- Graceful Reload ---
+
+def validate_config_command():
+    """Validation command covering the full config set: haproxy.cfg plus every config.d file."""
+    return ['sudo', '-n', 'haproxy', '-c', '-f', HAPROXY_CFG_PATH, '-f', CONFIG_D_DIR]
+
+def haproxy_service_command(action):
+    """systemctl argv for start/stop/restart/reload of the haproxy unit."""
+    return ['sudo', '-n', 'systemctl', action, 'haproxy']
+
+def run_haproxy_action(action, on_output=None, force=False):
+    """Run a Service Control action ('start', 'stop', 'restart' or 'test'); returns (success, message).
+
+    Service changes hold the 'service' action lock, so only one start/stop/restart
+    or reload runs at a time across all workers. 'test' reuses the cached result
+    for an unchanged config set unless force is set (see validate_config_set).
+    """
+    if action == 'test':
+        success, output, record = validate_config_set('test', on_output, force)
+        if record['cached']:
+            validated_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['validated_at']))
+            output = f"{output} (config unchanged since it was validated at {validated_at})"
+        return success, output
+    with action_lock('service') as acquired:
+        if not acquired:
+            return False, "Another start/stop/restart/reload is still running, try again shortly."
+        try:
+            return run_command(haproxy_service_command(action), on_output=on_output)
+        finally:
+            invalidate_haproxy_status()
+
+def get_haproxy_worker_pids():
+    """PIDs of the HAProxy worker processes (in master-worker mode, the master's children)."""
+    processes = get_haproxy_processes()
+    pids = {process['pid'] for process in processes}
+    workers = {process['pid'] for process in processes if process['ppid'] in pids}
+    return sorted(workers or pids)
+
+def _master_cli_reload():
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(RUNTIME_API_TIMEOUT * 6) # The master answers once the new workers are up
+        sock.connect(HAPROXY_MASTER_SOCKET)
+        sock.sendall(b"reload\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    reply = b"".join(chunks).decode(errors='replace').strip()
+    # HAProxy >= 2.7 reports "Success=0/1"; older masters just close the connection.
+    if "Success=0" in reply:
+        return False, reply
+    return True, "Reloaded through the master CLI."
+
+def perform_reload():
+    """Validate the config set, then reload HAProxy seamlessly. Returns a result dict.
+
+    Runs under settled_config(), so no transaction can commit (or roll back)
+    between the check and HAProxy reading the files.
+    """
+    with settled_config():
+        return _perform_reload()
+
+def _perform_reload():
+    valid, validation_output, _ = validate_config_set(source='reload')
+    if not valid:
+        return {'success': False, 'message': f"Configuration is invalid, not reloading. {validation_output}"}
+
+    old_pids = get_haproxy_worker_pids()
+    started = time.monotonic()
+    if HAPROXY_MASTER_SOCKET:
+        try:
+            success, message = _master_cli_reload()
+        except OSError as e:
+            success, message = False, f"Master CLI unavailable ({HAPROXY_MASTER_SOCKET}): {e}"
+    else:
+        success, message = run_command(haproxy_service_command('reload'))
+        message = message or "Reload signal sent."
+
+    new_pids = old_pids
+    if success and old_pids:
+        # Old workers linger while they finish in-flight requests, so wait for new PIDs to appear.
+        deadline = time.monotonic() + RELOAD_PID_WAIT
+        while time.monotonic() < deadline:
+            new_pids = get_haproxy_worker_pids()
+            if set(new_pids) - set(old_pids):
+                break
+            time.sleep(0.1)
+    duration_ms = round((time.monotonic() - started) * 1000)
+    new_pids = [pid for pid in new_pids if pid not in old_pids]
+    invalidate_haproxy_status()
+    if success:
+        message = f"{message} Workers {old_pids or '-'} -> {new_pids or '-'} in {duration_ms} ms."
+    return {
+        'success': success,
+        'message': message,
+        'old_pids': old_pids,
+        'new_pids': new_pids,
+        'duration_ms': duration_ms
+    }
+
+def reload_haproxy(coalesce=True):
+    """Reload HAProxy, sharing one reload between requests that arrive close together.
+
+    A request with no other reload requested in the last RELOAD_COALESCE_WINDOW
+    seconds reloads straight away. Only a request that lands inside a burst waits
+    out the rest of the window, so the edits still arriving can land. Then, holding
+    a cross-worker lock, it checks whether a reload has *started* since it was
+    requested - if so, that reload already covers its changes and its result is
+    returned instead of reloading again.
+    """
+    requested_at = time.time()
+    if coalesce and RELOAD_COALESCE_WINDOW > 0:
+        previous = {}
+        def record_request(state):
+            previous.update(state)
+            return dict(state, requested_at=requested_at)
+        update_shared_state('reload', record_request)
+        remaining = previous.get('requested_at', 0) + RELOAD_COALESCE_WINDOW - requested_at
+        if remaining > 0:
+            time.sleep(min(remaining, RELOAD_COALESCE_WINDOW))
+
+    # Shares the 'service' lock with start/stop/restart, so they never overlap
+    with action_lock('service') as acquired:
+        if not acquired:
+            return {'success': False, 'coalesced': False,
+                    'message': "Another start/stop/restart/reload is still running, try again shortly."}
+        last = read_shared_state('reload')
+        if coalesce and last.get('started_at', 0) >= requested_at:
+            return dict(last['result'], coalesced=True)
+        started_at = time.time()
+        result = perform_reload()
+        update_shared_state('reload', lambda state: dict(state, started_at=started_at, result=result))
+        return dict(result, coalesced=False)
+
+# --- Config Validation Cache ---
+
+# Directives whose argument names a file (or directory) HAProxy reads at startup
+CRT_FILE_KEYWORDS = frozenset(('crt', 'crt-list', 'ssl-default-bind-crt', 'ssl-default-server-crt'))
+CA_FILE_KEYWORDS = frozenset(('ca-file', 'crl-file', 'ca-verify-file'))
+
+_file_digest_cache = {} # path -> ((mtime_ns, size, inode), digest)
+_referenced_files_cache = {} # config path -> ((mtime_ns, size, inode), [paths], [map and ACL pattern paths])
+
+def _file_signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def file_digest(path):
+    """sha256 of a file's content, cached while its (mtime, size, inode) is unchanged.
+
+    Files the app may not read (e.g. private keys) are identified by their
+    signature instead, which still changes whenever the file is replaced.
+    """
+    try:
+        signature = _file_signature(path)
+    except OSError:
+        return 'missing'
+    cached = _file_digest_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+    except OSError:
+        digest = f"stat:{signature}"
+    _file_digest_cache[path] = (signature, digest)
+    return digest
+
+def referenced_files(config_path):
+    """Certificate, CA, map, ACL pattern, error and Lua files referenced by one config file."""
+    return _referenced_file_sets(config_path)[0]
+
+def referenced_map_files():
+    """Map and ACL pattern files ('map(...)' converters, '-f <file>') the config set references, plus HOSTS_MAP_PATH."""
+    paths = {HOSTS_MAP_PATH}
+    for config_path, _ in config_source_paths():
+        paths.update(_referenced_file_sets(config_path)[1])
+    return paths
+
+def _referenced_file_sets(config_path):
+    """(every referenced file, the map and ACL pattern files among them) for one config file."""
+    try:
+        signature = _file_signature(config_path)
+        cached = _referenced_files_cache.get(config_path)
+        if cached and cached[0] == signature:
+            return cached[1], cached[2]
+        with open(config_path, 'r') as f:
+            config = HAProxyConfig.parse(f.read())
+    except OSError:
+        return [], []
+
+    paths = []
+    pattern_paths = []
+    bases = {}
+    for section in config.sections:
+        for line in section.directives():
+            words = line.words
+            if line.keyword in ('crt-base', 'ca-base') and line.args:
+                bases[line.keyword] = line.args[0]
+            elif line.keyword == 'errorfile' and len(words) > 2:
+                paths.append(words[2])
+            elif line.keyword == 'lua-load' and line.args:
+                paths.append(line.args[0])
+            for index, word in enumerate(words[:-1]):
+                target = words[index + 1]
+                if word in CRT_FILE_KEYWORDS:
+                    paths.append(os.path.join(bases.get('crt-base', ''), target))
+                elif word in CA_FILE_KEYWORDS:
+                    paths.append(os.path.join(bases.get('ca-base', ''), target))
+                elif word == '-f':
+                    pattern_paths.append(target)
+            for word in words:
+                pattern_paths.extend(re.findall(r'map(?:_\w+)?\(([^,)\s]+)', word))
+    paths.extend(pattern_paths)
+
+    files = []
+    for path in dict.fromkeys(paths):
+        if os.path.isdir(path): # e.g. 'crt /etc/haproxy/certs/' loads every file in it
+            try:
+                with os.scandir(path) as entries:
+                    files.extend(sorted(entry.path for entry in entries if entry.is_file()))
+            except OSError:
+                files.append(path)
+        else:
+            files.append(path)
+    pattern_files = list(dict.fromkeys(pattern_paths))
+    _referenced_files_cache[config_path] = (signature, files, pattern_files)
+    return files, pattern_files
+
+def config_set_fingerprint():
+    """Return (sha256 hex, file count) over everything 'haproxy -c' reads for the config set."""
+    config_paths = [HAPROXY_CFG_PATH] + [os.path.join(CONFIG_D_DIR, name) for name in get_config_files()]
+    paths = list(config_paths)
+    for config_path in config_paths:
+        paths.extend(referenced_files(config_path))
+    digest = hashlib.sha256(" ".join(validate_config_command()).encode())
+    for path in sorted(set(paths)):
+        digest.update(f"\n{path}\0{file_digest(path)}".encode())
+    return digest.hexdigest(), len(set(paths))
+
+def _definitive_result(success, output):
+    # Timeouts, missing binaries and busy locks say nothing about the config itself
+    return success or output.startswith("Command failed:")
+
+def validate_config_set(source='test', on_output=None, force=False):
+    """Validate the full config set, reusing the result for an unchanged set of files.
+
+    Returns (success, output, record), where record is the history entry for this
+    check. Results are cached in shared state per config_set_fingerprint(); any
+    change to a config, certificate, map or other referenced file changes the
+    fingerprint and forces a real 'haproxy -c' run.
+    """
+    started = time.monotonic()
+    fingerprint, file_count = config_set_fingerprint()
+    cached = None if force else read_shared_state('validation').get('results', {}).get(fingerprint)
+    if cached:
+        success, output = cached['success'], cached['output']
+        if on_output:
+            for line in output.splitlines():
+                on_output(line)
+    elif source == 'test':
+        # Overlapping Test clicks share one run
+        success, output = run_shared_command('validate', validate_config_command(), on_output)
+    else:
+        success, output = run_command(validate_config_command(), on_output=on_output)
+
+    now = time.time()
+    record = {
+        'fingerprint': fingerprint[:16],
+        'source': source,
+        'success': success,
+        'cached': bool(cached),
+        'duration_ms': round((time.monotonic() - started) * 1000),
+        'checked_at': now,
+        'validated_at': cached['validated_at'] if cached else now,
+        'files': file_count,
+        'summary': output.splitlines()[0] if output else ""
+    }
+    # Only cache a definitive result for a set of files that didn't change during the run
+    cacheable = not cached and _definitive_result(success, output) and config_set_fingerprint()[0] == fingerprint
+
+    def update(doc):
+        results = doc.get('results', {})
+        if cacheable:
+            results[fingerprint] = {'success': success, 'output': output, 'validated_at': now}
+            for stale in sorted(results, key=lambda key: results[key]['validated_at'])[:-VALIDATION_CACHE_SIZE]:
+                del results[stale]
+        history = doc.get('history', [])
+        history.append(record)
+        return {'results': results, 'history': history[-VALIDATION_HISTORY:]}
+
+    update_shared_state('validation', update)
+    return success, output, record
+
+def get_validation_history():
+    """Recent validation runs, newest first."""
+    return list(reversed(read_shared_state('validation').get('history', [])))
+
+# --- HAProxy Runtime API ---
+
+# Replies that mean success for commands which answer with a message instead of nothing
+RUNTIME_API_SUCCESS_REPLIES = ("New server registered.", "Server deleted.", "Done.")
+# 'set server ... addr' always answers, with what changed or that nothing needed to
+RUNTIME_ADDR_SUCCESS_REPLIES = ("IP changed from", "port changed from", "no need to change the addr")
+# Backend, server and address arguments; values (map keys and values, options) may not
+# contain whitespace, ';' or newlines, which would start another Runtime API command
+RUNTIME_IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]+$')
+RUNTIME_VALUE_PATTERN = re.compile(r'^[^\s;]+$')
+
+def _runtime_socket(address=None):
+    """Open a connection to the Runtime API: a Unix socket path, or host:port for a TCP stats socket."""
+    address = address or HAPROXY_RUNTIME_SOCKET
+    if address.startswith('/'):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        host, port = address.rsplit(':', 1)
+        sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+        address = (host.strip('[]'), int(port))
+    sock.settimeout(RUNTIME_API_TIMEOUT)
+    sock.connect(address)
+    return sock
+
+def runtime_api_query(command, address=None):
+    """Send one command to the HAProxy Runtime API (HAPROXY_RUNTIME_SOCKET unless address is given) and return its raw reply."""
+    with _runtime_socket(address) as sock:
+        sock.sendall(command.encode() + b"\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks).decode(errors='replace')
+
+def runtime_api_command(command, success_replies=RUNTIME_API_SUCCESS_REPLIES):
+    """Run a Runtime API command that either prints nothing or a reply starting with one of success_replies.
+
+    Returns (success, message) like run_command().
+    """
+    if re.search(r'[;\r\n]', command):
+        return False, "Refusing a Runtime API command containing ';' or a line break."
+    try:
+        reply = runtime_api_query(command).strip()
+    except OSError as e:
+        logging.error(f"Runtime API command failed: {command}: {e}")
+        return False, f"Runtime API unavailable ({HAPROXY_RUNTIME_SOCKET}): {e}"
+    if reply and not reply.startswith(success_replies):
+        logging.error(f"Runtime API command rejected: {command}: {reply}")
+        return False, reply
+    return True, reply or "Command executed successfully."
+
+def runtime_list_servers(backend):
+    """Return the set of server names HAProxy currently has in a backend, or None if the backend isn't loaded."""
+    try:
+        reply = runtime_api_query(f"show servers state {backend}")
+    except OSError as e:
+        logging.error(f"Runtime API unavailable: {e}")
+        return None
+    servers = set()
+    for line in reply.splitlines():
+        parts = line.split()
+        # Data lines: "<be_id> <be_name> <srv_id> <srv_name> <srv_addr> ..."
+        if len(parts) > 3 and parts[0].isdigit() and parts[1] == backend:
+            servers.add(parts[3])
+    if not servers and "Can't find backend" in reply:
+        return None
+    return servers
+
+def runtime_add_server(backend, server, address, port, options=""):
+    """Add a server to a running backend and bring it into rotation."""
+    success, message = runtime_api_command(f"add server {backend}/{server} {address}:{port} {options}".strip())
+    if not success:
+        return success, message
+    # Dynamic servers start in maintenance; health checks must be enabled explicitly.
+    if re.search(r'(^|\s)check(\s|$)', options):
+        success, message = runtime_api_command(f"enable health {backend}/{server}")
+        if not success:
+            return success, message
+    return runtime_api_command(f"set server {backend}/{server} state ready")
+
+def runtime_set_server_address(backend, server, address, port):
+    return runtime_api_command(f"set server {backend}/{server} addr {address} port {port}",
+                               RUNTIME_ADDR_SUCCESS_REPLIES)
+
+def runtime_set_server_state(backend, server, state):
+    """Set a live server to 'ready', 'drain' or 'maint'."""
+    if state not in ('ready', 'drain', 'maint'):
+        return False, f"Invalid server state '{state}'."
+    return runtime_api_command(f"set server {backend}/{server} state {state}")
+
+def runtime_set_server_weight(backend, server, weight):
+    return runtime_api_command(f"set server {backend}/{server} weight {int(weight)}")
+
+def runtime_del_server(backend, server):
+    """Remove a live server; HAProxy only deletes servers that are in maintenance."""
+    success, message = runtime_set_server_state(backend, server, 'maint')
+    if not success:
+        return success, message
+    return runtime_api_command(f"del server {backend}/{server}")
+
+def runtime_set_map_entry(map_path, key, value):
+    """Set key -> value in a loaded map, adding the entry if it doesn't exist yet."""
+    try:
+        if not runtime_api_query(f"set map {map_path} {key} {value}").strip():
+            return True, "Command executed successfully."
+    except OSError as e:
+        logging.error(f"Runtime API unavailable: {e}")
+        return False, f"Runtime API unavailable ({HAPROXY_RUNTIME_SOCKET}): {e}"
+    # "entry not found" - the key is new
+    return runtime_api_command(f"add map {map_path} {key} {value}")
+
+def runtime_del_map_entry(map_path, key):
+    return runtime_api_command(f"del map {map_path} {key}")
+
+def runtime_argument_error(identifiers=(), values=(), options=None, port=None):
+    """Why request arguments can't go into a Runtime API command, or None if they can.
+
+    identifiers and values are (field name, value) pairs; options is a server
+    options string, whose words are checked like values.
+    """
+    for name, value in identifiers:
+        if not RUNTIME_IDENTIFIER_PATTERN.match(str(value)):
+            return f"Invalid {name} '{value}' (letters, digits, '_', '.', ':' and '-' only)."
+    for name, value in values:
+        if not RUNTIME_VALUE_PATTERN.match(str(value)):
+            return f"Invalid {name}: whitespace and ';' are not allowed."
+    if options is not None and (not isinstance(options, str) or re.search(r'[;\r\n]', options)):
+        return "Invalid options: ';' and line breaks are not allowed."
+    if port is not None:
+        try:
+            if not 0 < int(port) < 65536:
+                raise ValueError
+        except (TypeError, ValueError):
+            return f"Invalid port '{port}'."
+    return None
+
+def apply_service_runtime(backend, server, address, port, options):
+    """Apply a wizard-generated server to the running HAProxy without a reload, if possible.
+
+    Returns {'applied', 'reload_required', 'message'}. New backends (and new frontend
+    routing rules) can't be created through the Runtime API, so those still need a reload.
+    """
+    live_servers = runtime_list_servers(backend)
+    if live_servers is None:
+        return {'applied': False, 'reload_required': True,
+                'message': f"Backend '{backend}' is not loaded yet; a reload is required."}
+    if server in live_servers:
+        success, message = runtime_set_server_address(backend, server, address, port)
+    else:
+        success, message = runtime_add_server(backend, server, address, port, options)
+    return {'applied': success, 'reload_required': not success, 'message': message}
+
+# --- Live Traffic Stats ---
+
+# 'show stat' columns the collector reads (the map series plus the counters /metrics exports)
+STAT_FIELDS = (
+    'scur', 'qcur', 'rate', 'req_rate', 'req_tot', 'hrsp_5xx', 'status', 'check_status',
+    'stot', 'bin', 'bout', 'ereq', 'econ', 'eresp', 'chkfail', 'hrsp_1xx', 'hrsp_2xx', 'hrsp_3xx', 'hrsp_4xx'
+)
+# Order of the values stored per node in each sample
+STAT_SERIES = ('req_rate', 'scur', 'qcur', 'error_rate', 'status', 'check_status')
+
+_stats_collector_lock = threading.Lock()
+_stats_collector_started = False
+
+def stats_node_id(pxname, svname):
+    """The topology node id for a 'show stat' row (see finalize_section and topology_graph)."""
+    if svname == 'FRONTEND':
+        return f"frontend_{pxname}"
+    if svname == 'BACKEND':
+        return f"backend_{pxname}"
+    return f"server_{pxname}_{svname}"
+
+def parse_stat_csv(text):
+    """Parse 'show stat' CSV output into {node_id: {field: value}} for STAT_FIELDS.
+
+    Column positions are looked up once from the header, so each row costs one
+    csv split plus a handful of index lookups. Numeric fields become ints and
+    empty fields None.
+    """
+    lines = text.splitlines()
+    if not lines or not lines[0].startswith('# '):
+        return {}
+    header = lines[0][2:].split(',')
+    columns = [(name, header.index(name)) for name in STAT_FIELDS if name in header]
+    rows = {}
+    for row in csv.reader(lines[1:]):
+        if len(row) < 2:
+            continue
+        record = {'pxname': row[0], 'svname': row[1]}
+        for name, index in columns:
+            value = row[index] if index < len(row) else ''
+            record[name] = int(value) if value.isdigit() else (value or None)
+        rows[stats_node_id(row[0], row[1])] = record
+    return rows
+
+def _counter_rate(current, previous, elapsed):
+    """Per-second rate between two counter readings, or None if it can't be computed."""
+    if current is None or previous is None or not elapsed or current < previous:
+        return None # First sample, missing counter, or counters reset by a reload
+    return round((current - previous) / elapsed, 2)
+
+def build_traffic_sample(rows, counters, elapsed):
+    """Turn parsed stat rows into {node_id: [values in STAT_SERIES order]}.
+
+    counters holds the previous poll's {node_id: [req_tot, hrsp_5xx]} so the
+    request and 5xx rates can be derived from HAProxy's cumulative counters.
+    """
+    values = {}
+    for node_id, row in rows.items():
+        previous = counters.get(node_id) or [None, None]
+        req_rate = row.get('req_rate') # Frontends report it directly
+        if req_rate is None:
+            req_rate = _counter_rate(row.get('req_tot'), previous[0], elapsed)
+        if req_rate is None:
+            req_rate = row.get('rate') or 0 # Sessions per second
+        error_rate = _counter_rate(row.get('hrsp_5xx'), previous[1], elapsed) or 0
+        values[node_id] = [
+            req_rate,
+            row.get('scur') or 0,
+            row.get('qcur') or 0,
+            error_rate,
+            row.get('status'),
+            row.get('check_status')
+        ]
+    return values
+
+def _traffic_slot(seq):
+    """Shared state name of the ring slot that holds sample number seq."""
+    return f"traffic_sample_{seq % STATS_HISTORY}"
+
+def collect_traffic_stats():
+    """Poll 'show stat' once and publish the sample.
+
+    The 'traffic_stats' document only holds the latest sample and the counters the
+    next poll needs. History is a fixed ring of STATS_HISTORY slot documents, one
+    per sample, so each poll writes one sample instead of rewriting the whole
+    history.
+    """
+    now = time.time()
+    try:
+        rows = parse_stat_csv(runtime_api_query("show stat"))
+        error = None if rows else "Empty or unrecognised 'show stat' reply."
+    except OSError as e:
+        rows, error = {}, f"Runtime API unavailable ({HAPROXY_RUNTIME_SOCKET}): {e}"
+
+    def update(doc):
+        if rows:
+            elapsed = now - doc['counters_at'] if doc.get('counters_at') else None
+            sample = {'seq': doc.get('seq', -1) + 1, 't': now,
+                      'values': build_traffic_sample(rows, doc.get('counters', {}), elapsed)}
+            write_file_atomic(_state_file(_traffic_slot(sample['seq'])), json.dumps(sample))
+            doc['seq'] = sample['seq']
+            doc['sample'] = sample
+            doc['counters'] = {node_id: [row.get('req_tot'), row.get('hrsp_5xx')] for node_id, row in rows.items()}
+            doc['counters_at'] = now
+            doc['latest'] = rows # Raw counters for /metrics
+        doc.pop('samples', None) # History kept inline by older versions
+        doc.update(updated_at=now, error=error, interval=STATS_POLL_INTERVAL)
+        return doc
+
+    update_shared_state('traffic_stats', update)
+
+def get_traffic_stats():
+    """The latest value of every series per node, plus collector status."""
+    start_stats_collector()
+    doc = read_shared_state('traffic_stats')
+    latest = doc.get('sample') or {'t': None, 'values': {}}
+    return {
+        'series': STAT_SERIES,
+        'sampled_at': latest['t'],
+        'updated_at': doc.get('updated_at'),
+        'interval': STATS_POLL_INTERVAL,
+        'error': doc.get('error'),
+        'nodes': {node_id: dict(zip(STAT_SERIES, values)) for node_id, values in latest['values'].items()}
+    }
+
+def get_traffic_history(node_id):
+    """Every stored sample for one node as {'timestamps': [...], <series>: [...]}."""
+    start_stats_collector()
+    history = {'timestamps': []}
+    history.update((name, []) for name in STAT_SERIES)
+    last = read_shared_state('traffic_stats').get('seq')
+    if last is None:
+        return history
+    for seq in range(max(0, last - STATS_HISTORY + 1), last + 1):
+        sample = read_shared_state(_traffic_slot(seq))
+        if sample.get('seq') != seq:
+            continue # Slot not written yet, or left over from an earlier run
+        values = sample['values'].get(node_id)
+        if values is None:
+            continue
+        history['timestamps'].append(sample['t'])
+        for name, value in zip(STAT_SERIES, values):
+            history[name].append(value)
+    return history
+
+def _stats_collector_loop():
+    leader = None
+    while True:
+        try:
+            if leader is None:
+                leader = try_acquire_leadership('stats_collector')
+            if leader:
+                collect_traffic_stats()
+        except Exception as e:
+            logging.error(f"Stats collector error: {e}")
+        time.sleep(STATS_POLL_INTERVAL)
+
+def start_stats_collector():
+    """Start the background 'show stat' poller in this worker (once).
+
+    As with the health refresher, only the worker holding the leader lock polls,
+    and every worker serves the shared history.
+    """
+    global _stats_collector_started
+    if STATS_POLL_INTERVAL <= 0:
+        return
+    with _stats_collector_lock:
+        if _stats_collector_started:
+            return
+        _stats_collector_started = True
+    threading.Thread(target=_stats_collector_loop, name='stats-collector', daemon=True).start()
+
+# --- Access Log Analytics ---
+
+# One match per 'option httplog' line:
+#   ... client:port [accept_date] frontend[~] backend/server Tq/Tw/Tc/Tr/Tt status bytes ...
+# HAProxy 1.9+ calls the timers TR/Tw/Tc/Tr/Ta; they sit in the same place.
+HTTP_LOG_PATTERN = re.compile(
+    rb' \[(\d\d/[A-Za-z]{3}/\d{4}:\d\d:\d\d):\d\d[.\d]*\] (\S+?)~? ([^\s/]+)/\S+ '
+    rb'(-?\d+)/(-?\d+)/(-?\d+)/(-?\d+)/\+?(-?\d+) (-?\d+) '
+)
+LOG_TIMERS = ('Tq', 'Tw', 'Tc', 'Tr', 'Tt')
+LOG_STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx', 'other')
+LOG_QUANTILES = (0.5, 0.95, 0.99)
+
+# Timer histograms use log-spaced buckets 4% wide, like an HDR histogram: every
+# percentile is within ~2% of the exact value, memory is one dict entry per
+# occupied bucket (a few hundred at most), and two histograms merge by adding
+# counts. Bucket indexes for timings under ~4s are precomputed.
+LATENCY_BUCKET_SCALE = 1 / math.log(1.04)
+_LATENCY_BUCKETS = [int(math.log1p(ms) * LATENCY_BUCKET_SCALE) for ms in range(4096)]
+
+_access_log_lock = threading.Lock()
+_access_log_started = False
+
+def latency_bucket(ms):
+    """The histogram bucket index for a timing in milliseconds."""
+    return _LATENCY_BUCKETS[ms] if ms < 4096 else int(math.log1p(ms) * LATENCY_BUCKET_SCALE)
+
+def bucket_value(index):
+    """The timing (ms) a bucket stands for - the geometric middle of its range."""
+    return round(math.expm1((index + 0.5) / LATENCY_BUCKET_SCALE), 1)
+
+def merge_histogram(into, histogram):
+    """Add histogram's counts into `into` (bucket keys may be JSON strings)."""
+    for index, count in histogram.items():
+        index = int(index)
+        into[index] = into.get(index, 0) + count
+
+def histogram_quantiles(histogram, quantiles=LOG_QUANTILES):
+    """{'count', 'p50', 'p95', ..., 'max'} for a merged histogram, or None if it is empty."""
+    ordered = sorted(histogram.items())
+    cumulative = list(itertools.accumulate(count for _, count in ordered))
+    if not cumulative:
+        return None
+    total = cumulative[-1]
+    result = {'count': total}
+    for quantile in quantiles:
+        index = bisect.bisect_left(cumulative, quantile * total)
+        result[f"p{round(quantile * 100)}"] = bucket_value(ordered[index][0])
+    result['max'] = bucket_value(ordered[-1][0])
+    return result
+
+def _log_minute(text):
+    """Epoch seconds of a log line's accept minute (b'06/Feb/2009:12:14', host local time), 0 if invalid."""
+    try:
+        return int(time.mktime(time.strptime(text.decode('ascii'), '%d/%b/%Y:%H:%M')))
+    except ValueError:
+        return 0
+
+class AccessLogAggregator:
+    """Streaming per-frontend and per-backend aggregates of HAProxy HTTP log lines.
+
+    slots maps a topology node id to {minute: [requests, counts per
+    LOG_STATUS_CLASSES, histogram per LOG_TIMERS]}, minute being the epoch of
+    the lines' accept minute. Minutes more than ACCESS_LOG_HISTORY_MINUTES
+    behind the newest line are dropped, so memory is bounded by proxies x
+    minutes x buckets however much log is read.
+    """
+    __slots__ = ('slots', 'bytes', 'parsed', 'newest', '_minutes', '_frontends', '_backends')
+
+    def __init__(self, doc=None):
+        """Start empty, or resume from a document written by to_doc()."""
+        doc = doc or {}
+        self.slots = {
+            node_id: {int(minute): [slot[0], list(slot[1]), [{int(index): count for index, count in histogram.items()}
+                                                            for histogram in slot[2]]]
+                      for minute, slot in per_minute.items()}
+            for node_id, per_minute in doc.get('slots', {}).items()
+        }
+        self.bytes = doc.get('bytes', 0)
+        self.parsed = doc.get('parsed', 0)
+        self.newest = doc.get('newest', 0)
+        self._minutes = {} # Accept-minute text -> epoch, one strptime per minute of log
+        self._frontends = {} # Proxy name bytes -> node id
+        self._backends = {}
+
+    def feed(self, buffer, start=0, end=None):
+        """Aggregate the log lines in buffer[start:end] (bytes or an mmap, matched in place)."""
+        end = len(buffer) if end is None else end
+        slots, minutes, buckets = self.slots, self._minutes, _LATENCY_BUCKETS
+        frontends, backends = self._frontends, self._backends
+        parsed = 0
+        for match in HTTP_LOG_PATTERN.finditer(buffer, start, end):
+            minute_text, frontend, backend, tq, tw, tc, tr, tt, status = match.groups()
+            minute = minutes.get(minute_text)
+            if minute is None:
+                minute = minutes[minute_text] = _log_minute(minute_text)
+                self.newest = max(self.newest, minute)
+            if not minute:
+                continue
+            status_class = status[0] - 49 # b'1'..b'5' -> 0..4
+            if not 0 <= status_class <= 4:
+                status_class = 5
+            timings = (int(tq), int(tw), int(tc), int(tr), int(tt))
+            frontend_id = frontends.get(frontend)
+            if frontend_id is None:
+                frontend_id = frontends[frontend] = f"frontend_{frontend.decode('utf-8', 'replace')}"
+            backend_id = backends.get(backend)
+            if backend_id is None:
+                backend_id = backends[backend] = f"backend_{backend.decode('utf-8', 'replace')}"
+            for node_id in (frontend_id, backend_id):
+                per_minute = slots.get(node_id)
+                if per_minute is None:
+                    per_minute = slots[node_id] = {}
+                slot = per_minute.get(minute)
+                if slot is None:
+                    slot = per_minute[minute] = [0, [0] * len(LOG_STATUS_CLASSES), [{} for _ in LOG_TIMERS]]
+                slot[0] += 1
+                slot[1][status_class] += 1
+                for histogram, ms in zip(slot[2], timings):
+                    if ms >= 0: # -1: the request never got that far
+                        index = buckets[ms] if ms < 4096 else latency_bucket(ms)
+                        histogram[index] = histogram.get(index, 0) + 1
+            parsed += 1
+        self.bytes += end - start
+        self.parsed += parsed
+        self.prune()
+        return parsed
+
+    def prune(self):
+        """Drop minutes that fell out of the ACCESS_LOG_HISTORY_MINUTES window."""
+        cutoff = self.newest - ACCESS_LOG_HISTORY_MINUTES * 60
+        for node_id in list(self.slots):
+            per_minute = self.slots[node_id]
+            for minute in [minute for minute in per_minute if minute <= cutoff]:
+                del per_minute[minute]
+            if not per_minute:
+                del self.slots[node_id]
+        if len(self._minutes) > ACCESS_LOG_HISTORY_MINUTES * 2:
+            self._minutes = {text: minute for text, minute in self._minutes.items() if minute > cutoff}
+
+    def to_doc(self):
+        return {'slots': self.slots, 'bytes': self.bytes, 'parsed': self.parsed, 'newest': self.newest}
+
+def summarize_access_log(slots, window=5, now=None):
+    """Merge the last `window` minutes of aggregator slots into per-node stats.
+
+    Returns {node_id: {'requests', 'req_rate', 'status': {class: count},
+    'timers': {timer: histogram_quantiles()}}}. Works on an aggregator's slots
+    or their JSON form from the shared document.
+    """
+    return summarize_access_log_windows(slots, (window,), now)[window]
+
+def summarize_access_log_windows(slots, windows, now=None):
+    """summarize_access_log() for several windows at once: {window: {node_id: stats}}.
+
+    Each node's minutes are merged newest first and the running totals are
+    summarized as each window boundary is passed, so the widest window costs
+    one merge and the narrower ones come almost for free.
+    """
+    now = time.time() if now is None else now
+    current_minute = int(now) // 60
+    windows = sorted(windows)
+    summaries = {window: {} for window in windows}
+    for node_id, per_minute in slots.items():
+        minutes = sorted(((int(minute), slot) for minute, slot in per_minute.items() if int(minute) <= now), reverse=True)
+        requests, position = 0, 0
+        statuses = [0] * len(LOG_STATUS_CLASSES)
+        histograms = [{} for _ in LOG_TIMERS]
+        for window in windows:
+            first_minute = (current_minute - window + 1) * 60
+            while position < len(minutes) and minutes[position][0] >= first_minute:
+                count, status_counts, timer_histograms = minutes[position][1]
+                requests += count
+                for index, value in enumerate(status_counts):
+                    statuses[index] += value
+                for merged, histogram in zip(histograms, timer_histograms):
+                    merge_histogram(merged, histogram)
+                position += 1
+            if not requests:
+                continue
+            summaries[window][node_id] = {
+                'requests': requests,
+                'req_rate': round(requests / max(now - first_minute, 1), 2),
+                'status': dict(zip(LOG_STATUS_CLASSES, statuses)),
+                'timers': {timer: histogram_quantiles(histogram) for timer, histogram in zip(LOG_TIMERS, histograms)}
+            }
+    return summaries
+
+def read_access_log(path, position, aggregator):
+    """Feed the lines appended to path since `position` to aggregator; returns the new position.
+
+    position is the {'inode', 'offset'} returned by the previous call ({} the
+    first time). Another inode or a shorter file means the log was rotated or
+    truncated, so reading restarts at the top; a first read skips to the last
+    ACCESS_LOG_CATCHUP_BYTES. The file is mmapped and matched in place, so a
+    large catch-up costs no read() copies, and only complete lines are consumed -
+    a half-written last line is picked up on the next call.
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        offset = position.get('offset', 0)
+        if position.get('inode') != st.st_ino or offset > st.st_size:
+            offset = 0 if position else max(0, st.st_size - ACCESS_LOG_CATCHUP_BYTES)
+        if st.st_size > offset:
+            with mmap.mmap(f.fileno(), st.st_size, access=mmap.ACCESS_READ) as mm:
+                if offset and mm[offset - 1] != ord('\n'): # Started mid-line: skip to the next one
+                    offset = mm.find(b'\n', offset) + 1 or st.st_size
+                end = mm.rfind(b'\n', offset) + 1
+                if end > offset:
+                    aggregator.feed(mm, offset, end)
+                    offset = end
+    return {'inode': st.st_ino, 'offset': offset}
+
+def collect_access_log(aggregator, position, saved):
+    """Read new access log lines into aggregator and publish them; returns the new position.
+
+    Every poll that read new lines (or crossed into a new minute) replaces the
+    small 'access_log_summary' document with per-node stats for each of
+    ACCESS_LOG_SUMMARY_WINDOWS, which is all the API serves. The full aggregator
+    and its file offset go to 'access_log' at most every ACCESS_LOG_SAVE_INTERVAL
+    seconds; `saved` ({'position', 'at'}) tracks the last save. A new leader
+    resumes from that save and re-reads the lines after it.
+    """
+    error = None
+    try:
+        new_position = read_access_log(HAPROXY_ACCESS_LOG, position, aggregator)
+    except OSError as e:
+        new_position, error = position, f"Cannot read access log {HAPROXY_ACCESS_LOG}: {e}"
+    if error is None and aggregator.bytes and not aggregator.parsed:
+        error = f"No lines in {HAPROXY_ACCESS_LOG} match the HAProxy HTTP log format ('option httplog')."
+    now = time.time()
+
+    def publish(doc):
+        if new_position != position or error != doc.get('error') or doc.get('path') != HAPROXY_ACCESS_LOG \
+                or int(now) // 60 != int(doc.get('summarized_at', 0)) // 60:
+            windows = summarize_access_log_windows(aggregator.slots, ACCESS_LOG_SUMMARY_WINDOWS, now)
+            doc = {'windows': {str(window): nodes for window, nodes in windows.items()}, 'summarized_at': now,
+                   'parsed': aggregator.parsed, 'path': HAPROXY_ACCESS_LOG, 'error': error}
+        doc.update(updated_at=now, interval=ACCESS_LOG_POLL_INTERVAL)
+        return doc
+
+    update_shared_state('access_log_summary', publish)
+
+    if new_position != saved.get('position') and time.monotonic() - saved.get('at', 0) >= ACCESS_LOG_SAVE_INTERVAL:
+        doc = aggregator.to_doc()
+        doc.update(position=new_position, path=HAPROXY_ACCESS_LOG)
+        update_shared_state('access_log', lambda _: doc)
+        saved.update(position=new_position, at=time.monotonic())
+    return new_position
+
+def get_access_log_stats(window=5):
+    """Per-frontend and per-backend log aggregates over the last `window` minutes, plus collector status.
+
+    window is rounded up to the nearest of ACCESS_LOG_SUMMARY_WINDOWS (the one
+    used is returned), since only those are precomputed.
+    """
+    start_access_log_collector()
+    doc = read_shared_state('access_log_summary')
+    window = next((size for size in ACCESS_LOG_SUMMARY_WINDOWS if size >= window), ACCESS_LOG_SUMMARY_WINDOWS[-1])
+    return {
+        'path': HAPROXY_ACCESS_LOG,
+        'window': window,
+        'updated_at': doc.get('updated_at'),
+        'summarized_at': doc.get('summarized_at'),
+        'interval': ACCESS_LOG_POLL_INTERVAL,
+        'error': doc.get('error'),
+        'parsed': doc.get('parsed', 0),
+        'nodes': doc.get('windows', {}).get(str(window), {})
+    }
+
+def _access_log_loop():
+    leader = None
+    aggregator = position = saved = None
+    while True:
+        try:
+            if leader is None:
+                leader = try_acquire_leadership('access_log')
+            if leader:
+                if aggregator is None: # Resume where the previous leader last saved
+                    doc = read_shared_state('access_log')
+                    if doc.get('path') != HAPROXY_ACCESS_LOG:
+                        doc = {}
+                    aggregator = AccessLogAggregator(doc)
+                    position = doc.get('position') or {}
+                    saved = {'position': position, 'at': time.monotonic()}
+                position = collect_access_log(aggregator, position, saved)
+        except Exception as e:
+            logging.error(f"Access log collector error: {e}")
+        time.sleep(ACCESS_LOG_POLL_INTERVAL)
+
+def start_access_log_collector():
+    """Start the background access log tailer in this worker (once).
+
+    Only the worker holding the leader lock reads the log; the aggregates and
+    the file offset are shared, so a new leader carries on where the old one stopped.
+    """
+    global _access_log_started
+    if ACCESS_LOG_POLL_INTERVAL <= 0:
+        return
+    with _access_log_lock:
+        if _access_log_started:
+            return
+        _access_log_started = True
+    threading.Thread(target=_access_log_loop, name='access-log-collector', daemon=True).start()
+
+# --- Prometheus Exporter ---
+
+# (stat field, metric suffix, type, help) exported per frontend/backend/server
+HAPROXY_METRICS = (
+    ('scur', 'current_sessions', 'gauge', "Current number of active sessions."),
+    ('qcur', 'current_queue', 'gauge', "Current number of queued requests."),
+    ('rate', 'current_session_rate', 'gauge', "Sessions per second over the last second."),
+    ('req_rate', 'http_requests_rate', 'gauge', "HTTP requests per second over the last second."),
+    ('stot', 'sessions_total', 'counter', "Total number of sessions."),
+    ('bin', 'bytes_in_total', 'counter', "Total bytes received."),
+    ('bout', 'bytes_out_total', 'counter', "Total bytes sent."),
+    ('req_tot', 'http_requests_total', 'counter', "Total HTTP requests."),
+    ('ereq', 'request_errors_total', 'counter', "Total request errors."),
+    ('econ', 'connection_errors_total', 'counter', "Total connection errors."),
+    ('eresp', 'response_errors_total', 'counter', "Total response errors."),
+    ('chkfail', 'check_failures_total', 'counter', "Total failed health checks."),
+)
+HTTP_RESPONSE_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+INTERNAL_METRICS_HELP = {
+    'topology_build_seconds': "Time to build the network topology.",
+    'health_probe_seconds': "Latency of TCP and HTTP health probes, by result.",
+    'health_probe_connections_total': "HTTP health checks, by whether they reused a pooled connection.",
+    'dns_cache_requests_total': "Server hostname lookups, by DNS cache result.",
+    'subprocess_seconds': "Run time of external commands.",
+    'subprocess_total': "External commands run, by command and result.",
+    'parse_cache_requests_total': "Config parse cache lookups, by result.",
+}
+
+_metrics_snapshot = {'text': None, 'expires_at': 0.0}
+_metrics_snapshot_lock = threading.Lock()
+
+def _metric_sample(name, labels, value):
+    body = _label_key(labels) if isinstance(labels, dict) else labels
+    return f"{name}{{{body}}} {value}" if body else f"{name} {value}"
+
+def _haproxy_metric_lines(doc):
+    lines = []
+    rows = list((doc.get('latest') or {}).values())
+    kinds = (('frontend', lambda row: row['svname'] == 'FRONTEND'),
+             ('backend', lambda row: row['svname'] == 'BACKEND'),
+             ('server', lambda row: row['svname'] not in ('FRONTEND', 'BACKEND')))
+    for kind, selected in kinds:
+        kind_rows = [row for row in rows if selected(row)]
+        if not kind_rows:
+            continue
+        labelled = [(row, {'proxy': row['pxname'], 'server': row['svname']} if kind == 'server' else {'proxy': row['pxname']})
+                    for row in kind_rows]
+
+        lines += [f"# HELP haproxy_{kind}_up 1 if HAProxy reports the {kind} as UP/OPEN.",
+                  f"# TYPE haproxy_{kind}_up gauge"]
+        for row, labels in labelled:
+            status = row.get('status') or ''
+            lines.append(_metric_sample(f"haproxy_{kind}_up", labels, int(status.startswith(('UP', 'OPEN')))))
+
+        for field, suffix, metric_type, help_text in HAPROXY_METRICS:
+            values = [(labels, row.get(field)) for row, labels in labelled if isinstance(row.get(field), int)]
+            if not values:
+                continue
+            name = f"haproxy_{kind}_{suffix}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            lines += [_metric_sample(name, labels, value) for labels, value in values]
+
+        name = f"haproxy_{kind}_http_responses_total"
+        samples = [_metric_sample(name, dict(labels, code=code), row[f"hrsp_{code}"])
+                   for row, labels in labelled for code in HTTP_RESPONSE_CLASSES
+                   if isinstance(row.get(f"hrsp_{code}"), int)]
+        if samples:
+            lines += [f"# HELP {name} Total HTTP responses by status class.", f"# TYPE {name} counter"] + samples
+    return lines
+
+def _internal_metric_lines(merged):
+    lines = []
+    for name, series in sorted(merged['counters'].items()):
+        full_name = f"haproxy_dashboard_{name}"
+        lines += [f"# HELP {full_name} {INTERNAL_METRICS_HELP.get(name, name)}", f"# TYPE {full_name} counter"]
+        lines += [_metric_sample(full_name, key, value) for key, value in sorted(series.items())]
+
+    lookups = merged['counters'].get('parse_cache_requests_total', {})
+    hits = lookups.get(_label_key({'result': 'hit'}), 0)
+    total = hits + lookups.get(_label_key({'result': 'miss'}), 0)
+    lines += ["# HELP haproxy_dashboard_parse_cache_hit_ratio Share of config parse cache lookups served from cache.",
+              "# TYPE haproxy_dashboard_parse_cache_hit_ratio gauge",
+              f"haproxy_dashboard_parse_cache_hit_ratio {round(hits / total, 4) if total else 0}"]
+
+    for name, series in sorted(merged['histograms'].items()):
+        full_name = f"haproxy_dashboard_{name}"
+        lines += [f"# HELP {full_name} {INTERNAL_METRICS_HELP.get(name, name)}", f"# TYPE {full_name} histogram"]
+        for key, entry in sorted(series.items()):
+            for bound, count in zip(METRIC_BUCKETS[name], entry['buckets']):
+                lines.append(_metric_sample(f"{full_name}_bucket", ",".join(filter(None, (key, f'le="{bound}"'))), count))
+            lines.append(_metric_sample(f"{full_name}_bucket", ",".join(filter(None, (key, 'le="+Inf"'))), entry['count']))
+            lines.append(_metric_sample(f"{full_name}_sum", key, round(entry['sum'], 6)))
+            lines.append(_metric_sample(f"{full_name}_count", key, entry['count']))
+    return lines
+
+def render_metrics():
+    """Render HAProxy and dashboard metrics in the Prometheus text exposition format.
+
+    HAProxy counters come from the stats collector's last poll, so scrapes never
+    query the stats socket themselves.
+    """
+    doc = read_shared_state('traffic_stats')
+    lines = ["# HELP haproxy_dashboard_stats_up 1 if the last 'show stat' poll succeeded.",
+             "# TYPE haproxy_dashboard_stats_up gauge",
+             f"haproxy_dashboard_stats_up {int(bool(doc.get('latest')) and not doc.get('error'))}"]
+    if doc.get('counters_at'):
+        lines += ["# HELP haproxy_dashboard_stats_last_poll_timestamp_seconds When the HAProxy counters were sampled.",
+                  "# TYPE haproxy_dashboard_stats_last_poll_timestamp_seconds gauge",
+                  f"haproxy_dashboard_stats_last_poll_timestamp_seconds {doc['counters_at']}"]
+    lines += _haproxy_metric_lines(doc)
+    lines += _internal_metric_lines(merged_worker_metrics())
+    return "\n".join(lines) + "\n"
+
+def metrics_snapshot():
+    """The rendered /metrics text, re-rendered at most once per METRICS_CACHE_TTL.
+
+    The lock is held while rendering, so concurrent scrapers wait for one render
+    instead of each building their own.
+    """
+    start_stats_collector()
+    with _metrics_snapshot_lock:
+        now = time.monotonic()
+        if _metrics_snapshot['text'] is None or now >= _metrics_snapshot['expires_at']:
+            _metrics_snapshot['text'] = render_metrics()
+            _metrics_snapshot['expires_at'] = now + METRICS_CACHE_TTL
+        return _metrics_snapshot['text']
+
+# --- Persisting Runtime Changes ---
+
+def find_backend_file(backend_name):
+    """Return the path of the config file that defines a backend, or None."""
+    for path, filename in config_source_paths():
+        try:
+            sections = parse_config_file(path, filename)
+        except OSError:
+            continue
+        if any(backend['name'] == backend_name for backend in sections['backends']):
+            return path
+    return None
+
+def persist_server_change(backend_name, server_name, change):
+    """Mirror a Runtime API change into the conf.d file that defines the backend.
+
+    `change` is a function taking the existing server line (or None if the server
+    isn't in the file) and returning the new line, or None to delete it.
+    """
+    path = find_backend_file(backend_name)
+    if not path:
+        return False, f"Backend '{backend_name}' not found in any config file."
+    try:
+        with ConfigTransaction() as txn:
+            return _persist_server_change(txn, path, backend_name, server_name, change)
+    except Exception as e:
+        logging.error(f"Error persisting server change to {path}: {e}")
+        return False, f"Error updating {os.path.basename(path)}: {str(e)}"
+
+def _persist_server_change(txn, path, backend_name, server_name, change):
+    config = HAProxyConfig.parse(txn.read(path) or "")
+    section = config.section('backend', backend_name) or config.section('listen', backend_name)
+    if section is None:
+        return False, f"Backend '{backend_name}' not found in {os.path.basename(path)}."
+    servers = section.directives('server')
+    existing = next((line for line in servers if line.args and line.args[0] == server_name), None)
+
+    updated = change(existing.text if existing is not None else None)
+    if existing is not None:
+        if updated is None:
+            section.remove(existing)
+        else:
+            section.replace(existing, updated)
+    elif updated is not None:
+        # New servers go after the last existing one (or at the end of the section)
+        if servers:
+            section.insert_after(servers[-1], [updated])
+        else:
+            section.append([updated])
+    txn.write(path, config.serialize())
+    return True, f"{os.path.basename(path)} updated."
+
+def _set_server_weight(line, weight):
+    return re.sub(r'\s+weight\s+\S+', '', line) + f" weight {int(weight)}"
+
+def _set_server_disabled(line, disabled):
+    line = re.sub(r'\s+disabled(?=\s|$)', '', line)
+    return line + " disabled" if disabled else line
+
+def apply_map_updates(content, updates):
+    """Apply {key: value} updates to map file content (value None removes the key), keeping other lines as-is."""
+    lines = content.splitlines() if content else []
+    remaining = dict(updates)
+    result = []
+    for line in lines:
+        words = line.split(None, 1)
+        if words and not words[0].startswith('#') and words[0] in remaining:
+            value = remaining.pop(words[0])
+            if value is not None:
+                result.append(f"{words[0]} {value}")
+            continue
+        result.append(line)
+    result.extend(f"{key} {value}" for key, value in remaining.items() if value is not None)
+    return "\n".join(result) + "\n" if result else ""
+
+def update_map_file(map_path, updates, txn=None):
+    """Apply {key: value} updates to a map file, in txn if given or in a transaction of its own."""
+    if txn is None:
+        with ConfigTransaction() as txn:
+            return update_map_file(map_path, updates, txn)
+    txn.write(map_path, apply_map_updates(txn.read(map_path), updates))
+
+# --- Config Reference Index ---
+
+# ACLs HAProxy predefines - conditions may use them without an 'acl' line
+PREDEFINED_ACLS = frozenset((
+    'FALSE', 'HTTP', 'HTTP_1.0', 'HTTP_1.1', 'HTTP_2.0', 'HTTP_3.0', 'HTTP_CONTENT', 'HTTP_URL_ABS',
+    'HTTP_URL_SLASH', 'HTTP_URL_STAR', 'LOCALHOST', 'METH_CONNECT', 'METH_DELETE', 'METH_GET', 'METH_HEAD',
+    'METH_OPTIONS', 'METH_POST', 'METH_PUT', 'METH_TRACE', 'RDP_COOKIE', 'REQ_CONTENT', 'TRUE', 'WAIT_END'
+))
+BACKEND_REFERENCE_KEYWORDS = ('use_backend', 'default_backend')
+
+def condition_acls(words):
+    """Names of the ACLs an 'if'/'unless' condition in a directive's words refers to.
+
+    Anonymous '{ ... }' ACLs, operators and predefined ACLs are skipped.
+    """
+    for index, word in enumerate(words):
+        if word in ('if', 'unless'):
+            break
+    else:
+        return []
+    names, depth = [], 0
+    for word in words[index + 1:]:
+        if word in ('{', '!{'):
+            depth += 1
+        elif word == '}':
+            depth = max(0, depth - 1)
+        elif not depth and word not in ('or', '||'):
+            name = word.lstrip('!')
+            if name and name not in PREDEFINED_ACLS:
+                names.append(name)
+    return names
+
+def config_reference_entries(content, path, filename):
+    """Definitions and references in one config file as [(index, key, record)], plus the map files it routes through.
+
+    index is one of the ConfigReferenceIndex maps: backend and ACL definitions,
+    references to a backend (use_backend / default_backend lines) and references
+    to an ACL (any directive whose condition uses it). ACLs are keyed by
+    (proxy, acl name), since HAProxy scopes them to the proxy that declares them.
+    """
+    entries, maps = [], []
+    for section in HAProxyConfig.parse(content).sections:
+        if section.kind == 'defaults':
+            # Inherited by the frontends and listens that follow it
+            for line in section.directives('default_backend'):
+                if line.args and not line.args[0].startswith('%['):
+                    entries.append(('backend_references', line.args[0], {
+                        'kind': line.keyword, 'file': path, 'filename': filename, 'proxy': section.name or 'defaults',
+                        'line': line.lineno, 'text': line.text.strip(), 'acls': []
+                    }))
+            continue
+        if not section.name or section.kind not in ('frontend', 'backend', 'listen'):
+            continue
+        if section.kind in ('backend', 'listen'):
+            entries.append(('backend_definitions', section.name, {
+                'kind': section.kind, 'file': path, 'filename': filename,
+                'line': section.header.lineno, 'text': section.header.text.strip()
+            }))
+        for line in section.directives():
+            record = {'file': path, 'filename': filename, 'proxy': section.name,
+                      'line': line.lineno, 'text': line.text.strip()}
+            if line.keyword == 'acl' and line.args:
+                entries.append(('acl_definitions', (section.name, line.args[0]), dict(record, kind='acl')))
+                continue
+            acls = condition_acls(line.words)
+            for acl in acls:
+                entries.append(('acl_references', (section.name, acl), dict(record, kind=line.keyword, acls=acls)))
+            if section.kind != 'backend' and line.keyword in BACKEND_REFERENCE_KEYWORDS and line.args:
+                target = line.args[0]
+                map_match = re.search(r'map(?:_\w+)?\(([^,)]+)', target) if target.startswith('%[') else None
+                if map_match:
+                    maps.append(map_match.group(1))
+                elif not target.startswith('%['):
+                    entries.append(('backend_references', target, dict(record, kind=line.keyword, acls=acls)))
+    return entries, maps
+
+def map_reference_entries(content, path, filename):
+    """One backend reference per 'key backend' line of an HAProxy map file."""
+    entries = []
+    for lineno, line in enumerate(content.splitlines(), start=1):
+        words = line.split(None, 1)
+        if len(words) == 2 and not words[0].startswith('#'):
+            entries.append(('backend_references', words[1].strip(), {
+                'kind': 'map_entry', 'file': path, 'filename': filename,
+                'line': lineno, 'text': line.strip(), 'host': words[0]
+            }))
+    return entries
+
+class ConfigReferenceIndex:
+    """Reverse index from backends and ACLs to the config lines that define and use them.
+
+    Covers haproxy.cfg, every config.d file and the map files their use_backend
+    rules route through (HOSTS_MAP_PATH always). Each map is {key: {path:
+    [records]}}. refresh() stats every file and re-extracts only those that
+    changed, swapping their records out of and into the maps - so keeping the
+    index current costs a stat() per file plus O(references) per changed file,
+    and lookups never re-parse anything.
+    """
+
+    INDEXES = ('backend_definitions', 'backend_references', 'acl_definitions', 'acl_references')
+
+    def __init__(self):
+        self._files = {} # path -> (signature, entries, map paths)
+        for name in self.INDEXES:
+            setattr(self, name, {})
+        self.lock = threading.RLock()
+
+    def refresh(self):
+        with self.lock:
+            seen = set()
+            maps = {HOSTS_MAP_PATH}
+            for path, filename in config_source_paths():
+                self._update(path, filename, config_reference_entries)
+                seen.add(path)
+                if path in self._files:
+                    maps.update(self._files[path][2])
+            for path in maps:
+                self._update(path, os.path.basename(path), map_reference_entries)
+                seen.add(path)
+            for path in [path for path in self._files if path not in seen]:
+                self._remove(path)
+        return self
+
+    def _update(self, path, filename, extract):
+        try:
+            signature = _file_signature(path)
+        except OSError:
+            self._remove(path)
+            return
+        cached = self._files.get(path)
+        if cached and cached[0] == signature:
+            return
+        try:
+            with open(path, 'r') as f:
+                content = f.read()
+        except OSError as e:
+            logging.error(f"Error indexing references in {filename}: {e}")
+            self._remove(path)
+            return
+        result = extract(content, path, filename)
+        entries, maps = result if extract is config_reference_entries else (result, [])
+        self._remove(path)
+        self._files[path] = (signature, entries, maps)
+        for index, key, record in entries:
+            getattr(self, index).setdefault(key, {}).setdefault(path, []).append(record)
+
+    def _remove(self, path):
+        cached = self._files.pop(path, None)
+        if not cached:
+            return
+        for index, key, _ in cached[1]:
+            by_path = getattr(self, index).get(key)
+            if by_path is not None:
+                by_path.pop(path, None)
+                if not by_path:
+                    del getattr(self, index)[key]
+
+    @staticmethod
+    def _records(index, key):
+        return [record for records in index.get(key, {}).values() for record in records]
+
+    def defined_backends(self, path):
+        """Names of the backends (and listen sections) defined in one file."""
+        with self.lock:
+            cached = self._files.get(path)
+            return [key for index, key, _ in cached[1] if index == 'backend_definitions'] if cached else []
+
+    def backend_dependencies(self, name, ignore_files=()):
+        """What removing backend `name` touches: its definitions, the lines routing to
+        it, and the ACLs those lines use that nothing else uses. Records in
+        ignore_files (being deleted anyway) are left out of references."""
+        with self.lock:
+            references = [record for record in self._records(self.backend_references, name)
+                          if record['file'] not in ignore_files]
+            removed = {(record['file'], record['line']) for record in references}
+            orphaned = []
+            for proxy, acl in {(record['proxy'], acl) for record in references for acl in record.get('acls', [])}:
+                users = self._records(self.acl_references, (proxy, acl))
+                if all((user['file'], user['line']) in removed for user in users):
+                    orphaned.extend(record for record in self._records(self.acl_definitions, (proxy, acl))
+                                    if record['file'] not in ignore_files)
+            return {
+                'backend': name,
+                'definitions': self._records(self.backend_definitions, name),
+                'references': references,
+                'orphaned_acls': orphaned
+            }
+
+    def report(self):
+        """Dangling references (to undefined backends or ACLs) and unused backends and ACLs."""
+        with self.lock:
+            dangling = [dict(record, target=name) for name, by_path in self.backend_references.items()
+                        if name not in self.backend_definitions for records in by_path.values() for record in records]
+            dangling += [dict(record, target=acl) for (proxy, acl), by_path in self.acl_references.items()
+                         if (proxy, acl) not in self.acl_definitions for records in by_path.values() for record in records]
+            unused_backends = [dict(record, name=name) for name, by_path in self.backend_definitions.items()
+                               if name not in self.backend_references
+                               for records in by_path.values() for record in records if record['kind'] == 'backend']
+            unused_acls = [dict(record, name=acl) for (proxy, acl), by_path in self.acl_definitions.items()
+                           if (proxy, acl) not in self.acl_references for records in by_path.values() for record in records]
+        key = lambda record: (record['filename'], record['line'])
+        return {
+            'dangling': sorted(dangling, key=key),
+            'unused_backends': sorted(unused_backends, key=key),
+            'unused_acls': sorted(unused_acls, key=key)
+        }
+
+config_references = ConfigReferenceIndex()
+
+def _public_record(record):
+    return {key: value for key, value in record.items() if key != 'file'}
+
+def apply_line_edits(txn, edits):
+    """Stage {path: [(lineno, expected text, new text or None to delete)]} in txn.
+
+    Every target line is checked against the text the index saw first, so a
+    file edited behind the app's back aborts the change instead of corrupting it.
+    """
+    for path, changes in edits.items():
+        content = txn.read(path)
+        if content is None:
+            raise ConfigTransactionError(f"{os.path.basename(path)} no longer exists.")
+        lines = content.splitlines(keepends=True)
+        for lineno, expected, new_text in sorted(set(changes), reverse=True):
+            if lineno > len(lines) or lines[lineno - 1].strip() != expected:
+                raise ConfigTransactionError(f"{os.path.basename(path)} changed while it was being edited; try again.")
+            if new_text is None:
+                del lines[lineno - 1]
+            else:
+                line = lines[lineno - 1]
+                lines[lineno - 1] = new_text + line[len(line.rstrip('\r\n')):]
+        txn.write(path, "".join(lines))
+
+def plan_file_deletion(path, cascade=True):
+    """Preview of deleting one config file: the backends it defines and, with cascade,
+    every routing line, map entry and orphaned ACL elsewhere that goes with them.
+
+    Backends also defined in another file keep their references.
+    """
+    config_references.refresh()
+    backends = config_references.defined_backends(path)
+    plan = {'backends': backends, 'kept': [], 'references': [], 'orphaned_acls': []}
+    if not cascade:
+        return plan
+    for name in backends:
+        dependencies = config_references.backend_dependencies(name, ignore_files={path})
+        if any(record['file'] != path for record in dependencies['definitions']):
+            plan['kept'].append(name) # Still defined elsewhere
+            continue
+        plan['references'].extend(dependencies['references'])
+        plan['orphaned_acls'].extend(dependencies['orphaned_acls'])
+    return plan
+
+def delete_config_file(path, cascade=True, dry_run=False):
+    """Delete a config.d file and, with cascade, the references to the backends it defined.
+
+    Returns (message, plan) with the plan's records made JSON-friendly. Raises
+    ConfigTransactionError if the files changed underneath it or couldn't be written.
+    """
+    with ConfigTransaction() as txn:
+        plan = plan_file_deletion(path, cascade)
+        if not dry_run:
+            edits = {}
+            for record in plan['references'] + plan['orphaned_acls']:
+                edits.setdefault(record['file'], []).append((record['line'], record['text'], None))
+            apply_line_edits(txn, edits)
+            txn.delete(path)
+
+    removed = len(plan['references']) + len(plan['orphaned_acls'])
+    files = sorted({record['filename'] for record in plan['references'] + plan['orphaned_acls']})
+    for key in ('references', 'orphaned_acls'):
+        plan[key] = [_public_record(record) for record in plan[key]]
+    verb = "would be" if dry_run else "were"
+    message = f"'{os.path.basename(path)}' {'would be ' if dry_run else ''}deleted"
+    if removed:
+        message += f"; {removed} referencing line(s) in {', '.join(files)} {verb} removed"
+    return message + ".", plan
+
+def rename_backend(old_name, new_name, dry_run=False):
+    """Rename a backend and rewrite every use_backend, default_backend and map entry pointing at it.
+
+    Returns (success, message, changes) where changes lists each edited line. Raises
+    ConfigTransactionError if the files changed underneath it or couldn't be written.
+    """
+    if not re.match(r'^[A-Za-z0-9_.:-]+$', new_name or ''):
+        return False, f"Invalid backend name '{new_name}'.", None
+    with ConfigTransaction() as txn:
+        config_references.refresh()
+        dependencies = config_references.backend_dependencies(old_name)
+        definitions = [record for record in dependencies['definitions'] if record['kind'] == 'backend']
+        if not definitions:
+            return False, f"Backend '{old_name}' is not defined.", None
+        if config_references.backend_dependencies(new_name)['definitions']:
+            return False, f"Backend '{new_name}' already exists.", None
+
+        changes, edits = [], {}
+        pattern = re.compile(rf'^(\s*(?:backend|use_backend|default_backend)\s+){re.escape(old_name)}(?=\s|$)')
+        for record in definitions + dependencies['references']:
+            if record['kind'] == 'map_entry':
+                new_text = f"{record['host']} {new_name}"
+            else:
+                new_text = pattern.sub(lambda match: match.group(1) + new_name, _line_text(txn, record))
+            edits.setdefault(record['file'], []).append((record['line'], record['text'], new_text))
+            changes.append(dict(_public_record(record), new_text=new_text.strip()))
+        if not dry_run:
+            apply_line_edits(txn, edits)
+    verb = "would be" if dry_run else "were"
+    return True, f"Backend '{old_name}' renamed to '{new_name}'; {len(changes)} line(s) {verb} rewritten.", changes
+
+def _line_text(txn, record):
+    """A record's line as it is in the transaction, indentation included."""
+    lines = (txn.read(record['file']) or "").splitlines()
+    line = lines[record['line'] - 1] if record['line'] <= len(lines) else ""
+    if line.strip() != record['text']:
+        raise ConfigTransactionError(f"{record['filename']} changed while it was being edited; try again.")
+    return line
+
+# --- Topology Graph & Deltas ---
+
+def topology_graph(topology):
+    """Flatten a topology into ({node_id: node}, {edge_id: edge}), the shape the map draws."""
+    nodes = {}
+    haproxy = topology['haproxy_server']
+    nodes[haproxy['id']] = dict(haproxy, group='haproxy')
+    for client in topology['external_clients']:
+        nodes[client['id']] = dict(client, group='client')
+    for frontend in topology['frontends']:
+        nodes[frontend['id']] = dict(frontend, group='frontend')
+    for backend in topology['backends']:
+        nodes[backend['id']] = dict(backend, group='backend')
+        for server in backend['servers']:
+            server_id = f"server_{backend['name']}_{server['name']}"
+            nodes[server_id] = {
+                'id': server_id,
+                'type': 'server',
+                'name': f"{server['name']} ({format_address(server['ip'], server['port'])})",
+                'group': 'server',
+                'status': server['status'],
+                'ip': server['ip'],
+                'port': server['port'],
+                'ssl': server['ssl'],
+                'backend': backend['name']
+            }
+    edges = {conn['id']: conn for conn in topology['connections']}
+    return nodes, edges
+
+def _diff_records(old, new):
+    return {
+        'added': [record for key, record in new.items() if key not in old],
+        'removed': [key for key in old if key not in new],
+        'changed': [record for key, record in new.items() if key in old and old[key] != record]
+    }
+
+def topology_delta(old_graph, new_graph):
+    """Compute the node/edge changes between two topology_graph() results, or None if identical."""
+    delta = {
+        'nodes': _diff_records(old_graph[0], new_graph[0]),
+        'edges': _diff_records(old_graph[1], new_graph[1])
+    }
+    if not any(delta['nodes'].values()) and not any(delta['edges'].values()):
+        return None
+    return delta
+
+_topology_snapshots = collections.OrderedDict() # version -> topology_graph() result
+_topology_snapshots_lock = threading.Lock()
+
+def topology_version(graph):
+    """Content hash of a topology_graph() result - identical in every worker for the same state."""
+    encoded = json.dumps(graph, sort_keys=True, separators=(',', ':'), default=str).encode()
+    return hashlib.sha1(encoded).hexdigest()[:20]
+
+def remember_topology(graph):
+    """Record a graph under its version so later ?since= requests can be answered with a delta."""
+    version = topology_version(graph)
+    with _topology_snapshots_lock:
+        _topology_snapshots[version] = graph
+        _topology_snapshots.move_to_end(version)
+        while len(_topology_snapshots) > TOPOLOGY_SNAPSHOT_HISTORY:
+            _topology_snapshots.popitem(last=False)
+    return version
+
+_topology_current = {'key': None} # This worker's last snapshot and the inputs it was built from
+_topology_current_lock = threading.Lock()
+
+def topology_input_key():
+    """Cheap fingerprint of everything a topology build reads.
+
+    Covers the signature of every config source and map file, the shared health
+    cache, the service status and a HEALTH_CACHE_TTL clock tick (cached health
+    goes stale with time alone). Costs a stat() per file, so requests can be
+    answered from the last snapshot without parsing anything while it matches.
+    """
+    signatures = []
+    for path in [path for path, _ in config_source_paths()] + sorted(referenced_map_files()) + [_state_file('health_cache')]:
+        try:
+            signatures.append((path, _file_signature(path)))
+        except OSError:
+            signatures.append((path, None))
+    clock = int(time.time() // HEALTH_CACHE_TTL) if HEALTH_CACHE_TTL > 0 else time.time()
+    return hashlib.sha1(json.dumps([signatures, get_haproxy_status(), clock], default=str).encode()).hexdigest()
+
+def topology_snapshot(force=False):
+    """Return (version, topology, graph) for the current config and health state.
+
+    The version covers every node and edge attribute, so it changes with any
+    config file edit and with any health or service status change. While
+    topology_input_key() is unchanged the last snapshot is returned as is;
+    force rebuilds regardless. The results are shared - don't mutate them.
+    """
+    snapshot = current_topology_snapshot(force)
+    return snapshot['version'], snapshot['topology'], snapshot['graph']
+
+def current_topology_snapshot(force=False):
+    """The snapshot dict behind topology_snapshot(): key, version, topology, graph and layout signature."""
+    key = topology_input_key()
+    with _topology_current_lock:
+        if not force and _topology_current['key'] == key:
+            return dict(_topology_current)
+    topology = parse_haproxy_configs()
+    graph = topology_graph(topology)
+    snapshot = {'key': key, 'version': remember_topology(graph), 'topology': topology, 'graph': graph,
+                'structure': topology_structure_signature(graph[0])}
+    with _topology_current_lock:
+        _topology_current.clear()
+        _topology_current.update(snapshot)
+    return snapshot
+
+def topology_delta_since(version, graph):
+    """Delta from a remembered version to graph, an empty delta if unchanged, or None if unknown."""
+    with _topology_snapshots_lock:
+        previous = _topology_snapshots.get(version)
+    if previous is None:
+        return None
+    empty = {'added': [], 'removed': [], 'changed': []}
+    return topology_delta(previous, graph) or {'nodes': dict(empty), 'edges': dict(empty)}
+
+# --- Topology Layout & Views ---
+
+# Layered map layout: one column per node group, left to right; servers sit in a
+# grid to the right of their backend.
+LAYOUT_COLUMNS = ('client', 'haproxy', 'frontend', 'backend')
+LAYOUT_COLUMN_SPACING = 300
+LAYOUT_ROW_SPACING = 60
+LAYOUT_SERVER_SPACING = 70
+LAYOUT_SERVERS_PER_ROW = 8
+TOPOLOGY_VIEW_LEVELS = ('auto', 'backends', 'servers')
+
+_topology_layout = {'signature': None, 'positions': {}, 'bounds': [0, 0, 0, 0]}
+_topology_layout_lock = threading.Lock()
+
+def topology_structure_signature(nodes):
+    """Hash of which nodes exist - the only input the layout depends on (not their status)."""
+    encoded = "\n".join(sorted(nodes)).encode()
+    return hashlib.sha1(encoded).hexdigest()[:20]
+
+def _layout_order(nodes, edges, previous):
+    """Order nodes within each column, keeping the previous layout's order.
+
+    Surviving nodes keep their relative order and new ones are appended, so a
+    config change never reshuffles the map. New backends are sorted by the first
+    frontend routing to them, which keeps routing edges from crossing.
+    """
+    columns = {column: [] for column in LAYOUT_COLUMNS}
+    for node_id, node in nodes.items():
+        if node['group'] in columns:
+            columns[node['group']].append(node_id)
+
+    frontend_rank = {node_id: index for index, node_id in enumerate(
+        _keep_order(columns['frontend'], previous.get('frontend', []), key=lambda node_id: nodes[node_id]['name']))}
+    first_frontend = {}
+    for edge in edges.values():
+        if edge['type'] in ('routing', 'default_routing') and edge['source'] in frontend_rank:
+            rank = frontend_rank[edge['source']]
+            first_frontend[edge['target']] = min(rank, first_frontend.get(edge['target'], rank))
+
+    return {
+        'client': _keep_order(columns['client'], previous.get('client', []), key=lambda node_id: nodes[node_id].get('port', 0)),
+        'haproxy': columns['haproxy'],
+        'frontend': list(frontend_rank),
+        'backend': _keep_order(columns['backend'], previous.get('backend', []),
+                               key=lambda node_id: (first_frontend.get(node_id, len(frontend_rank)), nodes[node_id]['name']))
+    }
+
+def _keep_order(node_ids, previous, key):
+    present = set(node_ids)
+    kept = [node_id for node_id in previous if node_id in present]
+    known = set(kept)
+    return kept + sorted((node_id for node_id in node_ids if node_id not in known), key=key)
+
+def _layout_positions(nodes, order):
+    """{node_id: [x, y]} and the layout's bounds for a column order.
+
+    Each backend's row is as tall as its server grid, so expanding or
+    collapsing a backend never moves anything.
+    """
+    servers = {}
+    for node_id, node in nodes.items():
+        if node['group'] == 'server':
+            servers.setdefault(f"backend_{node['backend']}", []).append(node_id)
+
+    positions = {}
+    bottom = 0
+    for column_index, column in enumerate(LAYOUT_COLUMNS):
+        x = column_index * LAYOUT_COLUMN_SPACING
+        y = 0
+        for node_id in order[column]:
+            positions[node_id] = [x, y]
+            members = servers.get(node_id, []) if column == 'backend' else []
+            for index, server_id in enumerate(members):
+                positions[server_id] = [
+                    x + LAYOUT_COLUMN_SPACING + (index % LAYOUT_SERVERS_PER_ROW) * LAYOUT_SERVER_SPACING,
+                    y + (index // LAYOUT_SERVERS_PER_ROW) * LAYOUT_ROW_SPACING
+                ]
+            y += max(1, -(-len(members) // LAYOUT_SERVERS_PER_ROW)) * LAYOUT_ROW_SPACING
+        bottom = max(bottom, y - LAYOUT_ROW_SPACING)
+    right = len(LAYOUT_COLUMNS) * LAYOUT_COLUMN_SPACING + (LAYOUT_SERVERS_PER_ROW - 1) * LAYOUT_SERVER_SPACING
+    return positions, [0, 0, right, max(bottom, 0)]
+
+def topology_layout(graph):
+    """Cached map coordinates for a topology_graph(): (signature, positions, bounds).
+
+    Recomputed only when nodes are added or removed. The column order is kept
+    in the shared 'topology_layout' document, so every worker (and the next
+    restart) draws the same map and existing nodes stay where they were.
+    """
+    nodes, edges = graph
+    signature = topology_structure_signature(nodes)
+    with _topology_layout_lock:
+        if _topology_layout['signature'] == signature:
+            return signature, _topology_layout['positions'], _topology_layout['bounds']
+
+    def update(doc):
+        if doc.get('signature') != signature:
+            doc = {'signature': signature, 'order': _layout_order(nodes, edges, doc.get('order', {}))}
+        return doc
+
+    shared = read_shared_state('topology_layout')
+    if shared.get('signature') != signature:
+        shared = update_shared_state('topology_layout', update)
+    positions, bounds = _layout_positions(nodes, shared['order'])
+    with _topology_layout_lock:
+        _topology_layout.update(signature=signature, positions=positions, bounds=bounds)
+    return signature, positions, bounds
+
+def topology_view(graph, positions, level='auto', expand=(), bbox=None, zoom=1.0):
+    """The part of a laid-out topology the map needs to draw.
+
+    Servers are folded into their backend (which carries 'server_counts' by
+    status and 'collapsed': True) at level 'backends', and at level 'auto'
+    when there are more than TOPOLOGY_COLLAPSE_THRESHOLD servers and zoom is
+    below TOPOLOGY_DETAIL_ZOOM; backends named in `expand` always show their
+    servers. With a bbox (x0, y0, x1, y1 in layout coordinates) only nodes
+    inside it are returned, plus every edge touching one of them; the far end
+    of an edge that leaves the viewport is returned in 'anchors' as {id: [x, y]}.
+    """
+    nodes, edges = graph
+    server_counts = {}
+    for node in nodes.values():
+        if node['group'] == 'server':
+            counts = server_counts.setdefault(f"backend_{node['backend']}", dict.fromkeys(SERVER_STATUSES, 0))
+            status = node['status'] if node['status'] in counts else 'unknown'
+            counts[status] += 1
+    total_servers = sum(sum(counts.values()) for counts in server_counts.values())
+    collapse = level == 'backends' or (
+        level == 'auto' and total_servers > TOPOLOGY_COLLAPSE_THRESHOLD and zoom < TOPOLOGY_DETAIL_ZOOM)
+    expand = set(expand)
+
+    def inside(node_id):
+        if bbox is None:
+            return True
+        x, y = positions[node_id]
+        return bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]
+
+    shown = {}
+    for node_id, node in nodes.items():
+        if node['group'] == 'server' and collapse and node['backend'] not in expand:
+            continue
+        if not inside(node_id):
+            continue
+        record = dict(node, x=positions[node_id][0], y=positions[node_id][1])
+        if node['group'] == 'backend':
+            record['server_counts'] = server_counts.get(node_id, dict.fromkeys(SERVER_STATUSES, 0))
+            record['collapsed'] = collapse and node['name'] not in expand and bool(node.get('servers'))
+        shown[node_id] = record
+
+    shown_edges, anchors = [], {}
+    for edge in edges.values():
+        source, target = edge['source'], edge['target']
+        if source not in shown and target not in shown:
+            continue
+        hidden = [node_id for node_id in (source, target) if node_id not in shown]
+        if any(nodes.get(node_id, {}).get('group') == 'server' and collapse
+               and nodes[node_id]['backend'] not in expand for node_id in hidden):
+            continue # Edge into a folded server
+        if any(node_id not in positions for node_id in hidden):
+            continue
+        for node_id in hidden:
+            anchors[node_id] = positions[node_id]
+        shown_edges.append(edge)
+
+    return {
+        'level': 'backends' if collapse else 'servers',
+        'nodes': list(shown.values()),
+        'edges': shown_edges,
+        'anchors': anchors,
+        'total': {'nodes': len(nodes), 'edges': len(edges), 'servers': total_servers}
+    }
+
+# --- Config Watcher ---
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify, watching whole directories."""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+
+    def add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.watches[wd] = directory
+
+    def read_events(self, timeout):
+        """Wait up to timeout seconds; return a list of changed paths, or None on queue overflow."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths, offset = [], 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if wd in self.watches and name:
+                paths.append(os.path.join(self.watches[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class ConfigWatcher:
+    """Watches CONFIG_D_DIR, HAPROXY_CFG_PATH and the map files routing goes through
+    (HOSTS_MAP_PATH and any other map the config references) and pushes topology
+    deltas to subscribers.
+
+    Uses inotify when available and falls back to polling file signatures. On a
+    change only the affected files are dropped from the parse cache before the
+    topology is rebuilt and diffed against the previous one.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._graph = None
+        self._thread = None
+        self._inotify = None
+        self._map_directories = set() # Map directories watched so far (inotify only)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+                self._thread.start()
+
+    def subscribe(self):
+        self.start()
+        subscriber = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A slow client missed deltas - tell it to reload the full topology.
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait({'type': 'resync'})
+
+    def _is_relevant(self, path, map_paths):
+        if os.path.dirname(path) == os.path.normpath(CONFIG_D_DIR):
+            name = os.path.basename(path)
+            return name.endswith('.cfg') and not name.startswith('.')
+        return path == os.path.normpath(HAPROXY_CFG_PATH) or path in map_paths
+
+    @staticmethod
+    def _map_paths():
+        return {os.path.normpath(path) for path in referenced_map_files()}
+
+    def _watch_map_directories(self):
+        """Add inotify watches for directories holding map files, e.g. a newly referenced one."""
+        if self._inotify is None:
+            return
+        for directory in {os.path.dirname(path) for path in self._map_paths()} - self._map_directories:
+            try:
+                self._inotify.add_watch(directory)
+                self._map_directories.add(directory)
+            except OSError as e:
+                logging.warning(f"Not watching map directory {directory}: {e}")
+
+    def _rebuild(self, changed_paths):
+        invalidate_parse_cache(changed_paths)
+        version, _, graph = topology_snapshot(force=True)
+        self._watch_map_directories()
+        previous, self._graph = self._graph, graph
+        if previous is None:
+            return
+        delta = topology_delta(previous, graph)
+        if delta:
+            files = sorted({os.path.basename(path) for path in changed_paths or []})
+            self._publish({'type': 'delta', 'files': files, 'delta': delta, 'version': version})
+
+    def _run(self):
+        try:
+            inotify = _Inotify()
+            directories = {os.path.normpath(CONFIG_D_DIR), os.path.dirname(os.path.normpath(HAPROXY_CFG_PATH))}
+            for directory in directories:
+                inotify.add_watch(directory)
+        except OSError as e:
+            logging.info(f"inotify unavailable ({e}), polling config files every {WATCHER_POLL_INTERVAL}s")
+            self._rebuild([])
+            self._run_polling()
+            return
+        self._inotify, self._map_directories = inotify, set(directories)
+        self._rebuild([]) # Also watches the map directories
+        self._run_inotify(inotify)
+
+    def _run_inotify(self, inotify):
+        while True:
+            try:
+                paths = inotify.read_events(timeout=None)
+                # Coalesce a burst of events (editors and atomic renames emit several).
+                while paths is not None:
+                    more = inotify.read_events(timeout=WATCHER_DEBOUNCE)
+                    if not more:
+                        break
+                    paths.extend(more)
+                if paths is None:
+                    self._rebuild(None) # Queue overflow - re-parse everything
+                    continue
+                map_paths = self._map_paths()
+                changed = sorted({path for path in paths if self._is_relevant(path, map_paths)})
+                if changed:
+                    self._rebuild(changed)
+            except Exception as e:
+                logging.error(f"Config watcher error: {e}")
+                time.sleep(WATCHER_POLL_INTERVAL)
+
+    def _snapshot(self):
+        signatures = {}
+        for path in [path for path, _ in config_source_paths()] + sorted(self._map_paths()):
+            try:
+                st = os.stat(path)
+                signatures[path] = (st.st_mtime_ns, st.st_size, st.st_ino)
+            except OSError:
+                pass
+        return signatures
+
+    def _run_polling(self):
+        previous = self._snapshot()
+        while True:
+            time.sleep(WATCHER_POLL_INTERVAL)
+            try:
+                current = self._snapshot()
+                changed = [path for path in set(previous) | set(current) if previous.get(path) != current.get(path)]
+                previous = current
+                if changed:
+                    self._rebuild(changed)
+            except Exception as e:
+                logging.error(f"Config watcher error: {e}")
+
+config_watcher = ConfigWatcher()
+
+# --- Fleet Mode ---
+
+FLEET_NODE_FIELDS = (
+    'name', 'transport', 'host', 'port', 'user', 'identity_file', 'haproxy_cfg', 'config_d_dir', 'hosts_map',
+    'validate_command', 'reload_command', 'status_command', 'stats_url', 'stats_socket'
+)
+FLEET_SUMMED_FIELDS = ('scur', 'qcur', 'req_rate', 'req_tot', 'hrsp_5xx')
+
+_fleet_inventory_cache = {} # path -> ((mtime_ns, size, inode), [node, ...])
+_fleet_pool = ThreadPoolExecutor(max_workers=FLEET_CONCURRENCY, thread_name_prefix='fleet')
+
+def normalize_fleet_node(entry):
+    """Validate one inventory entry and fill in its defaults; raises ValueError."""
+    if not isinstance(entry, dict):
+        raise ValueError("Each fleet node must be a mapping.")
+    name = str(entry.get('name') or '').strip()
+    if not name:
+        raise ValueError("Every fleet node needs a 'name'.")
+    unknown = sorted(set(entry) - set(FLEET_NODE_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown field(s) for fleet node '{name}': {', '.join(unknown)}.")
+    try:
+        port = int(entry.get('port', 22))
+    except (TypeError, ValueError):
+        raise ValueError(f"'port' for fleet node '{name}' must be a number.")
+    node = {
+        'name': name,
+        'transport': entry.get('transport', 'ssh'),
+        'host': entry.get('host'),
+        'port': port,
+        'user': entry.get('user'),
+        'identity_file': entry.get('identity_file'),
+        'haproxy_cfg': os.path.normpath(entry.get('haproxy_cfg', HAPROXY_CFG_PATH)),
+        'config_d_dir': os.path.normpath(entry.get('config_d_dir', CONFIG_D_DIR)),
+        'hosts_map': os.path.normpath(entry.get('hosts_map', HOSTS_MAP_PATH)),
+        'stats_url': entry.get('stats_url'),
+        'stats_socket': entry.get('stats_socket')
+    }
+    if node['transport'] not in FLEET_TRANSPORTS:
+        raise ValueError(f"Unknown transport '{node['transport']}' for fleet node '{name}' (use {' or '.join(FLEET_TRANSPORTS)}).")
+    if node['transport'] == 'ssh' and not node['host']:
+        raise ValueError(f"Fleet node '{name}' uses the ssh transport but has no 'host'.")
+    if node['stats_socket'] and node['transport'] != 'local':
+        raise ValueError(f"'stats_socket' is only supported for local fleet nodes; give '{name}' a 'stats_url' instead.")
+
+    default_commands = {
+        'validate_command': ['sudo', '-n', 'haproxy', '-c', '-f', node['haproxy_cfg'], '-f', node['config_d_dir']],
+        'reload_command': haproxy_service_command('reload'),
+        'status_command': ['systemctl', 'is-active', '--quiet', 'haproxy']
+    }
+    for key, default in default_commands.items():
+        command = entry.get(key, default)
+        if not isinstance(command, list) or not command or not all(isinstance(word, str) for word in command):
+            raise ValueError(f"'{key}' for fleet node '{name}' must be a non-empty list of strings.")
+        node[key] = command
+    return node
+
+def load_fleet_inventory():
+    """The nodes in FLEET_INVENTORY_PATH ([] without an inventory), cached while the file is unchanged.
+
+    The file is YAML (.yaml/.yml) or JSON: {"nodes": [{"name": ..., "transport": ..., ...}]}.
+    Raises ValueError if it can't be used.
+    """
+    try:
+        signature = _file_signature(FLEET_INVENTORY_PATH)
+    except FileNotFoundError:
+        return []
+    cached = _fleet_inventory_cache.get(FLEET_INVENTORY_PATH)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    with open(FLEET_INVENTORY_PATH, 'r') as f:
+        text = f.read()
+    if FLEET_INVENTORY_PATH.lower().endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ValueError("PyYAML is required for a YAML fleet inventory (pip install PyYAML), or use JSON.")
+        try:
+            data = yaml.safe_load(text) or {}
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML in {FLEET_INVENTORY_PATH}: {e}")
+    else:
+        data = json.loads(text or '{}')
+    entries = data.get('nodes') if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError(f"{FLEET_INVENTORY_PATH} must contain a 'nodes' list.")
+
+    nodes = [normalize_fleet_node(entry) for entry in entries]
+    duplicates = sorted(name for name, count in collections.Counter(node['name'] for node in nodes).items() if count > 1)
+    if duplicates:
+        raise ValueError(f"Duplicate fleet node name(s): {', '.join(duplicates)}.")
+    _fleet_inventory_cache[FLEET_INVENTORY_PATH] = (signature, nodes)
+    return nodes
+
+def select_fleet_nodes(names=None):
+    """The inventory nodes with the given names (all of them if names is empty); raises ValueError."""
+    nodes = load_fleet_inventory()
+    if not names:
+        return nodes
+    known = {node['name'] for node in nodes}
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown fleet node(s): {', '.join(unknown)}.")
+    return [node for node in nodes if node['name'] in names]
+
+# A config set is identified by keys that mean the same thing on every node:
+# 'haproxy.cfg', 'hosts.map' and 'conf.d/<file>.cfg'.
+
+def local_config_set_paths():
+    """[(key, path)] of the local files pushed to fleet nodes."""
+    paths = []
+    if os.path.isfile(HAPROXY_CFG_PATH):
+        paths.append(('haproxy.cfg', HAPROXY_CFG_PATH))
+    if os.path.isfile(HOSTS_MAP_PATH):
+        paths.append(('hosts.map', HOSTS_MAP_PATH))
+    paths.extend((f"conf.d/{filename}", os.path.join(CONFIG_D_DIR, filename)) for filename in get_config_files())
+    return paths
+
+def fleet_node_path(node, key):
+    """Where a config set key lives on a node."""
+    if key == 'haproxy.cfg':
+        return node['haproxy_cfg']
+    if key == 'hosts.map':
+        return node['hosts_map']
+    return os.path.join(node['config_d_dir'], key[len('conf.d/'):])
+
+def config_drift(local, remote):
+    """Compare two {key: sha256} manifests from the local side's point of view."""
     return {
-        'ip': ip,
-        'port': int(port),
-        'ssl': ssl_enabled,
-        'protocol': 'HTTPS' if ssl_enabled else 'HTTP'
+        'changed': sorted(key for key in local if key in remote and remote[key] != local[key]),
+        'missing': sorted(key for key in local if key not in remote),
+        'extra': sorted(key for key in remote if key not in local and key.startswith('conf.d/'))
     }
 
-def parse_acl_directive(line):
-    """Parse ACL directive."""
-    parts = line.split()
-    if len(parts) < 4:
-        return None
-    
+def manifest_fingerprint(manifest):
+    return hashlib.sha256(json.dumps(sorted(manifest.items())).encode()).hexdigest()[:16]
+
+def fetch_stats_url(url, timeout):
+    """'show stat'-style CSV from an HAProxy stats page, e.g. http://edge-01:8404/stats;csv."""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode(errors='replace')
+
+class LocalTransport:
+    """A node whose files are on this host, e.g. a second instance or a stand-in in a temp dir."""
+
+    def __init__(self, node):
+        self.node = node
+
+    def manifest(self, timeout):
+        manifest = {}
+        for key in ('haproxy.cfg', 'hosts.map'):
+            path = fleet_node_path(self.node, key)
+            if os.path.isfile(path):
+                manifest[key] = file_digest(path)
+        try:
+            with os.scandir(self.node['config_d_dir']) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.cfg') and entry.is_file():
+                        manifest[f"conf.d/{entry.name}"] = file_digest(entry.path)
+        except FileNotFoundError:
+            pass
+        return manifest
+
+    def apply(self, files, deleted, timeout, validate_command=None):
+        """Write the files in one ConfigTransaction, rolled back if validate_command rejects them."""
+        checked = {}
+
+        def validate():
+            checked['valid'], checked['output'] = self.run(validate_command, timeout)
+            return checked['valid'], checked['output']
+
+        try:
+            with ConfigTransaction(validate=validate if validate_command else False) as txn:
+                for key, content in files.items():
+                    txn.write(fleet_node_path(self.node, key), content)
+                for key in deleted:
+                    txn.delete(fleet_node_path(self.node, key))
+        except ConfigTransactionError as e:
+            if checked.get('valid') is False:
+                return False, False, checked['output']
+            return False, checked.get('valid'), str(e)
+        return True, checked.get('valid'), "Files written."
+
+    def run(self, argv, timeout):
+        return run_command(argv, timeout=timeout)
+
+    def stats(self, timeout):
+        if self.node['stats_socket']:
+            return runtime_api_query("show stat", self.node['stats_socket'])
+        return fetch_stats_url(self.node['stats_url'], timeout)
+
+class SSHTransport:
+    """A remote node reached with the ssh client (key-based, BatchMode - it never prompts)."""
+
+    def __init__(self, node):
+        self.node = node
+
+    def _ssh(self, remote_command, timeout, input=None):
+        node = self.node
+        argv = ['ssh', '-o', 'BatchMode=yes', '-o', f"ConnectTimeout={max(1, int(timeout))}", '-p', str(node['port'])]
+        if node['identity_file']:
+            argv += ['-i', node['identity_file']]
+        argv += [f"{node['user']}@{node['host']}" if node['user'] else node['host'], remote_command]
+        return run_command(argv, timeout=timeout, input=input)
+
+    def manifest(self, timeout):
+        node = self.node
+        candidates = [shlex.quote(node['haproxy_cfg']), shlex.quote(node['hosts_map']), f"{shlex.quote(node['config_d_dir'])}/*.cfg"]
+        script = f'for f in {" ".join(candidates)}; do [ -f "$f" ] && sha256sum -- "$f"; done; true'
+        success, output = self._ssh(script, timeout)
+        if not success:
+            raise OSError(output)
+        keys = {node['haproxy_cfg']: 'haproxy.cfg', node['hosts_map']: 'hosts.map'}
+        manifest = {}
+        for line in output.splitlines():
+            digest, _, path = line.partition('  ')
+            if len(digest) != 64:
+                continue # ssh banners and warnings share the output
+            key = keys.get(path)
+            if key is None and os.path.dirname(path) == node['config_d_dir']:
+                key = f"conf.d/{os.path.basename(path)}"
+            if key:
+                manifest[key] = digest
+        return manifest
+
+    def apply(self, files, deleted, timeout, validate_command=None):
+        """Send the files as one tar stream into a staging dir next to config.d, then rename each into place.
+
+        The files being replaced or deleted are copied into the staging dir first and
+        put back if a rename fails or validate_command rejects the new set, all in
+        the same ssh session. Returns (applied, valid, output); valid is None when
+        the set wasn't validated.
+        """
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            for index, content in enumerate(files.values()):
+                data = content.encode()
+                info = tarfile.TarInfo(str(index))
+                info.size, info.mode, info.mtime = len(data), 0o644, time.time()
+                tar.addfile(info, io.BytesIO(data))
+
+        staging_parent = shlex.quote(os.path.dirname(self.node['config_d_dir']))
+        script = [
+            'set -e',
+            f'd=$(sudo -n mktemp -d {staging_parent}/.haproxy-web-push.XXXXXX)',
+            'trap \'sudo -n rm -rf "$d"\' EXIT',
+            'sudo -n tar -xf - -C "$d" --no-same-owner'
+        ]
+        targets = [shlex.quote(fleet_node_path(self.node, key)) for key in list(files) + list(deleted)]
+        script.append('sudo -n mkdir "$d/backup"')
+        script += [f'if sudo -n test -e {path}; then sudo -n cp -p {path} "$d/backup/{index}"; fi' for index, path in enumerate(targets)]
+        script.append('restore() {')
+        script += [f'  if sudo -n test -e "$d/backup/{index}"; then sudo -n mv -f "$d/backup/{index}" {path}; else sudo -n rm -f -- {path}; fi'
+                   for index, path in enumerate(targets)]
+        script.append('}')
+        swap = [f'sudo -n mv -f "$d/{index}" {targets[index]}' for index in range(len(files))]
+        if deleted:
+            swap.append('sudo -n rm -f -- ' + ' '.join(targets[len(files):]))
+        script.append(f'if ! {{ {" && ".join(swap)}; }}; then restore; echo "Could not replace the files, previous ones restored." >&2; exit 1; fi')
+        if validate_command:
+            script.append(f'if ! {shlex.join(validate_command)} 2>&1; then restore; echo {FLEET_PUSH_INVALID_MARKER}; exit 1; fi')
+
+        success, output = self._ssh("\n".join(script), timeout, input=archive.getvalue())
+        valid = None
+        if FLEET_PUSH_INVALID_MARKER in output:
+            valid, output = False, output.replace(FLEET_PUSH_INVALID_MARKER, "").strip()
+        elif success and validate_command:
+            valid = True
+        return success, valid, output
+
+    def run(self, argv, timeout):
+        return self._ssh(shlex.join(argv), timeout)
+
+    def stats(self, timeout):
+        return fetch_stats_url(self.node['stats_url'], timeout)
+
+FLEET_TRANSPORTS = {'local': LocalTransport, 'ssh': SSHTransport}
+FLEET_PUSH_INVALID_MARKER = "haproxy-web-push: config rejected, previous files restored"
+
+def fleet_transport(node):
+    return FLEET_TRANSPORTS[node['transport']](node)
+
+def _time_left(deadline, step):
+    """Seconds left in a node's FLEET_NODE_TIMEOUT budget; raises TimeoutError once it is spent."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"Timed out after {FLEET_NODE_TIMEOUT:g}s before {step}.")
+    return remaining
+
+def fleet_fan_out(nodes, fn):
+    """Run fn(node) for every node on the fleet pool (at most FLEET_CONCURRENCY at once); results in inventory order.
+
+    fn must bound its own run time (see _time_left) and report errors in its result.
+    """
+    futures = [_fleet_pool.submit(fn, node) for node in nodes]
+    return [future.result() for future in futures]
+
+def summarize_stat_rows(rows):
+    """Headline numbers for one node's 'show stat' rows."""
+    frontends = [row for row in rows.values() if row['svname'] == 'FRONTEND']
+    servers = [row for row in rows.values() if row['svname'] not in ('FRONTEND', 'BACKEND')]
     return {
-        'name': parts[1],
-        'matcher': ' '.join(parts[2:]),
-        'type': 'hostname' if 'hdr(host)' in line else 'other'
+        'sessions': sum(row.get('scur') or 0 for row in frontends),
+        'req_rate': sum(row.get('req_rate') or 0 for row in frontends),
+        'servers': len(servers),
+        'servers_up': sum(1 for row in servers if (row.get('status') or '').startswith('UP'))
     }
 
-def parse_use_backend_directive(line):
-    """Parse use_backend directive."""
-    parts = line.split()
-    if len(parts) < 2:
-        return None
-    
-    backend_name = parts[1]
-    condition = ' '.join(parts[3:]) if len(parts) > 3 else None
-    
-    return {
-        'backend': backend_name,
-        'condition': condition
+def aggregate_fleet_stats(rows_by_node):
+    """Sum per-proxy stats over all nodes, keyed by topology node id, counting the nodes reporting each as up."""
+    merged = {}
+    for rows in rows_by_node.values():
+        for node_id, row in rows.items():
+            entry = merged.get(node_id)
+            if entry is None:
+                entry = merged[node_id] = dict({field: 0 for field in FLEET_SUMMED_FIELDS},
+                                               pxname=row['pxname'], svname=row['svname'], up=0, reporting=0)
+            for field in FLEET_SUMMED_FIELDS:
+                value = row.get(field)
+                if isinstance(value, int):
+                    entry[field] += value
+            entry['reporting'] += 1
+            if (row.get('status') or '').startswith(('UP', 'OPEN')):
+                entry['up'] += 1
+    return merged
+
+def fleet_node_status(node, local_manifest):
+    """Returns (record, stat rows) for one node: service status, config drift and stats."""
+    started = time.monotonic()
+    deadline = started + FLEET_NODE_TIMEOUT
+    transport = fleet_transport(node)
+    record = {
+        'name': node['name'],
+        'transport': node['transport'],
+        'host': node['host'],
+        'status': 'unknown',
+        'fingerprint': None,
+        'in_sync': None,
+        'drift': None,
+        'stats': None,
+        'error': None
     }
+    rows = {}
+    try:
+        remote = transport.manifest(_time_left(deadline, "reading the config manifest"))
+        drift = config_drift(local_manifest, remote)
+        record.update(fingerprint=manifest_fingerprint(remote), drift=drift, in_sync=not any(drift.values()))
+        running, _ = transport.run(node['status_command'], _time_left(deadline, "checking the HAProxy service"))
+        record['status'] = 'running' if running else 'stopped'
+        if node['stats_url'] or node['stats_socket']:
+            rows = parse_stat_csv(transport.stats(_time_left(deadline, "reading stats")))
+            record['stats'] = summarize_stat_rows(rows)
+    except Exception as e:
+        logging.error(f"Fleet status failed for node {node['name']}: {e}")
+        record['error'] = str(e)
+    record['duration_ms'] = round((time.monotonic() - started) * 1000)
+    return record, rows
 
-def parse_server_directive(line):
-    """Parse server directive to extract backend server info."""
-    parts = line.split()
-    if len(parts) < 3:
-        return None
-    
-    server_name = parts[1]
-    server_addr = parts[2]
-    
-    # Parse IP:port
-    if ':' in server_addr:
-        ip, port = server_addr.split(':', 1)
-    else:
-        ip = server_addr
-        port = '80'
-    
-    # Check for SSL
-    ssl_enabled = 'ssl' in line
-    
-    # Check for health checks
-    health_check = 'check' in line
-    
+def fleet_status(names=None):
+    """Status, config drift and stats of every (or the named) node, plus stats summed over the fleet."""
+    nodes = select_fleet_nodes(names)
+    local_manifest = {key: file_digest(path) for key, path in local_config_set_paths()}
+    results = fleet_fan_out(nodes, lambda node: fleet_node_status(node, local_manifest))
+    records = [record for record, _ in results]
     return {
-        'name': server_name,
-        'ip': ip,
-        'port': int(port),
-        'ssl': ssl_enabled,
-        'health_check': health_check,
-        'status': check_server_status(ip, int(port))
+        'fingerprint': manifest_fingerprint(local_manifest),
+        'files': len(local_manifest),
+        'nodes': records,
+        'in_sync': sum(1 for record in records if record['in_sync']),
+        'traffic': aggregate_fleet_stats({record['name']: rows for record, rows in results}),
+        'checked_at': time.time()
     }
 
-def check_server_status(ip, port):
-    """Check if a server is reachable."""
+def push_to_node(node, local_manifest, read_file, validate, reload, dry_run):
+    """Bring one node's config set in line with the local one, sending only the files whose hash differs."""
+    started = time.monotonic()
+    deadline = started + FLEET_NODE_TIMEOUT
+    transport = fleet_transport(node)
+    result = {'name': node['name'], 'success': False, 'changed': [], 'deleted': [], 'bytes': 0,
+              'valid': None, 'reloaded': False, 'message': ''}
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(2)
-        result = sock.connect_ex((ip, port))
-        sock.close()
-        return 'healthy' if result == 0 else 'unreachable'
-    except:
-        return 'unknown'
+        drift = config_drift(local_manifest, transport.manifest(_time_left(deadline, "reading the config manifest")))
+        result['changed'] = drift['changed'] + drift['missing']
+        result['deleted'] = drift['extra']
+        modified = bool(result['changed'] or result['deleted'])
+        if dry_run:
+            result['success'] = True
+            result['message'] = f"Would push {len(result['changed'])} file(s) and delete {len(result['deleted'])}."
+            return result
 
-def finalize_section(section_type, config, topology, filename):
-    """Add completed section to topology."""
-    if section_type == 'frontend':
-        # Generate unique ID
-        config['id'] = f"frontend_{config['name']}"
-        config['type'] = 'frontend'
-        topology['frontends'].append(config)
-        
-    elif section_type == 'backend':
-        # Generate unique ID
-        config['id'] = f"backend_{config['name']}"
-        config['type'] = 'backend'
-        topology['backends'].append(config)
+        if modified:
+            files = {key: read_file(key) for key in result['changed']}
+            result['bytes'] = sum(len(content.encode()) for content in files.values())
+            # The node checks the new set before it's kept; a rejected set is rolled back
+            applied, result['valid'], output = transport.apply(files, result['deleted'], _time_left(deadline, "pushing files"),
+                                                               node['validate_command'] if validate else None)
+            if result['valid'] is False:
+                result['message'] = f"Config is invalid on this node, previous files restored and not reloaded. {output}"
+                return result
+            if not applied:
+                result['message'] = f"Push failed: {output}"
+                return result
+        elif validate:
+            result['valid'], output = transport.run(node['validate_command'], _time_left(deadline, "validating"))
+            if not result['valid']:
+                result['message'] = f"Config is invalid on this node, not reloaded. {output}"
+                return result
+        if reload and modified:
+            reloaded, output = transport.run(node['reload_command'], _time_left(deadline, "reloading"))
+            if not reloaded:
+                result['message'] = f"Reload failed: {output}"
+                return result
+            result['reloaded'] = True
 
-def add_external_clients(topology):
-    """Add external client nodes based on frontend configurations."""
-    client_types = set()
-    
-    for frontend in topology['frontends']:
-        for bind in frontend['binds']:
-            if bind['port'] == 80:
-                client_types.add('http_clients')
-            elif bind['port'] == 443:
-                client_types.add('https_clients')
-            else:
-                client_types.add(f'port_{bind["port"]}_clients')
-    
-    for client_type in client_types:
-        if client_type == 'http_clients':
-            name = 'HTTP Clients'
-            port = 80
-            protocol = 'HTTP'
-        elif client_type == 'https_clients':
-            name = 'HTTPS Clients'
-            port = 443
-            protocol = 'HTTPS'
+        result['success'] = True
+        if modified:
+            result['message'] = f"Pushed {len(result['changed'])} file(s), deleted {len(result['deleted'])}" + \
+                (", reloaded." if result['reloaded'] else ".")
         else:
-            port_num = client_type.split('_')[1]
-            name = f'Port {port_num} Clients'
-            port = int(port_num)
-            protocol = 'TCP'
-        
-        topology['external_clients'].append({
-            'id': client_type,
-            'type': 'external_client',
-            'name': name,
-            'port': port,
-            'protocol': protocol
-        })
+            result['message'] = "Already in sync."
+    except Exception as e:
+        logging.error(f"Fleet push failed for node {node['name']}: {e}")
+        result['message'] = str(e)
+    finally:
+        result['duration_ms'] = round((time.monotonic() - started) * 1000)
+    return result
 
-def generate_connections(topology):
-    """Generate connections between nodes."""
-    connections = []
-    
-    # Connections from external clients to frontends
-    for client in topology['external_clients']:
-        for frontend in topology['frontends']:
-            for bind in frontend['binds']:
-                if bind['port'] == client['port']:
-                    connections.append({
-                        'id': f"conn_{client['id']}_to_{frontend['id']}",
-                        'source': client['id'],
-                        'target': frontend['id'],
-                        'type': 'incoming',
-                        'protocol': client['protocol'],
-                        'port': client['port']
-                    })
-    
-    # Connections from frontends to backends
-    for frontend in topology['frontends']:
-        # Direct use_backend connections
-        for use_backend in frontend['use_backends']:
-            backend_name = use_backend['backend']
-            backend = next((b for b in topology['backends'] if b['name'] == backend_name), None)
-            if backend:
-                connections.append({
-                    'id': f"conn_{frontend['id']}_to_{backend['id']}",
-                    'source': frontend['id'],
-                    'target': backend['id'],
-                    'type': 'routing',
-                    'condition': use_backend.get('condition'),
-                    'protocol': 'HTTP/HTTPS'
-                })
-        
-        # Default backend connection
-        if frontend['default_backend']:
-            backend = next((b for b in topology['backends'] if b['name'] == frontend['default_backend']), None)
-            if backend:
-                connections.append({
-                    'id': f"conn_{frontend['id']}_to_{backend['id']}_default",
-                    'source': frontend['id'],
-                    'target': backend['id'],
-                    'type': 'default_routing',
-                    'protocol': 'HTTP/HTTPS'
-                })
-    
-    # Connections from backends to servers
-    for backend in topology['backends']:
-        for server in backend['servers']:
-            server_id = f"server_{backend['name']}_{server['name']}"
-            connections.append({
-                'id': f"conn_{backend['id']}_to_{server_id}",
-                'source': backend['id'],
-                'target': server_id,
-                'type': 'backend_server',
-                'protocol': 'HTTPS' if server['ssl'] else 'HTTP',
-                'port': server['port'],
-                'server_status': server['status']
-            })
-    
-    topology['connections'] = connections
+def fleet_push(names=None, validate=True, reload=False, dry_run=False):
+    """Push the local config set to every (or the named) node in parallel; returns (success, message, results).
+
+    Each node gets only the files whose sha256 differs from its own copy, plus
+    deletions for config.d files that no longer exist locally. With validate the
+    local set is checked first and each node checks the new files as soon as they
+    are in place; a node that rejects them gets its previous files back and keeps
+    running its previous config.
+    """
+    nodes = select_fleet_nodes(names)
+    if not nodes:
+        return False, f"No fleet nodes configured in {FLEET_INVENTORY_PATH}.", []
+    if validate and not dry_run:
+        valid, output, _ = validate_config_set(source='fleet')
+        if not valid:
+            return False, f"Local configuration is invalid, nothing was pushed. {output}", []
+
+    with action_lock('fleet') as acquired:
+        if not acquired:
+            return False, "Another fleet push or reload is still running, try again shortly.", []
+        local_paths = dict(local_config_set_paths())
+        local_manifest = {key: file_digest(path) for key, path in local_paths.items()}
+        contents, contents_lock = {}, threading.Lock()
+
+        def read_file(key):
+            # Nodes usually need the same files, so each is read once per push
+            with contents_lock:
+                if key not in contents:
+                    with open(local_paths[key], 'r', newline='') as f:
+                        contents[key] = f.read()
+                return contents[key]
+
+        results = fleet_fan_out(nodes, lambda node: push_to_node(node, local_manifest, read_file, validate, reload, dry_run))
+
+    failed = [result['name'] for result in results if not result['success']]
+    if failed:
+        return False, f"{len(results) - len(failed)} of {len(results)} node(s) succeeded; failed: {', '.join(failed)}.", results
+    return True, f"All {len(results)} node(s) {'checked' if dry_run else 'up to date'}.", results
+
+def fleet_command(action, names=None):
+    """Run each node's 'validate' or 'reload' command in parallel; returns (success, message, results)."""
+    nodes = select_fleet_nodes(names)
+    command_key = f"{action}_command"
+
+    def run(node):
+        started = time.monotonic()
+        try:
+            success, output = fleet_transport(node).run(node[command_key], FLEET_NODE_TIMEOUT)
+        except Exception as e:
+            success, output = False, str(e)
+        return {'name': node['name'], 'success': success, 'output': output,
+                'duration_ms': round((time.monotonic() - started) * 1000)}
+
+    with action_lock('fleet') as acquired:
+        if not acquired:
+            return False, "Another fleet push or reload is still running, try again shortly.", []
+        results = fleet_fan_out(nodes, run)
+    failed = [result['name'] for result in results if not result['success']]
+    if failed:
+        return False, f"{action.capitalize()} failed on: {', '.join(failed)}.", results
+    return True, f"{action.capitalize()} succeeded on all {len(results)} node(s).", results
 
 # --- Routes ---
 
@@ -509,24 +4888,182 @@ def api_haproxy_status():
 @app.route('/api/haproxy_action', methods=['POST'])
 def api_haproxy_action():
     action = request.json.get('action')
-    command_map = {
-        'start': 'sudo systemctl start haproxy',
-        'stop': 'sudo systemctl stop haproxy',
-        'restart': 'sudo systemctl restart haproxy',
-        'test': f'sudo haproxy -c -f {HAPROXY_CFG_PATH}'
-    }
+    if action == 'reload':
+        result = reload_haproxy(coalesce=_truthy(request.json.get('coalesce', True)))
+        return jsonify(**result)
 
-    command = command_map.get(action)
-    if not command:
+    if action not in ('start', 'stop', 'restart', 'test'):
         return jsonify(success=False, message="Invalid action"), 400
 
-    success, message = run_command(command, check_output=True)
+    force = bool(request.json.get('force'))
+    if request.json.get('stream'):
+        return stream_haproxy_action(action, force)
+    success, message = run_haproxy_action(action, force=force)
     return jsonify(success=success, message=message)
 
+def stream_haproxy_action(action, force=False):
+    """Run an action in the background and stream its output as Server-Sent Events.
+
+    Emits an 'output' event per line and a final 'result' event.
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            success, message = run_haproxy_action(action, on_output=lambda line: events.put(('output', {'line': line})), force=force)
+        except Exception as e:
+            logging.error(f"Action '{action}' failed: {e}")
+            success, message = False, str(e)
+        events.put(('result', {'success': success, 'message': message}))
+
+    threading.Thread(target=run, name=f'action-{action}', daemon=True).start()
+
+    def stream():
+        while True:
+            try:
+                kind, data = events.get(timeout=SSE_HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ": keep-alive\n\n" # A command can run quietly for a while
+                continue
+            yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+            if kind == 'result':
+                break
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/validation/history')
+def api_validation_history():
+    """Recent config validations (tests, reloads, validated edits) with timings and cache hits."""
+    return jsonify(success=True, history=get_validation_history())
+
+@app.route('/api/runtime/servers', methods=['POST'])
+def api_runtime_add_server():
+    """Add a server to a running backend without a reload, and persist it to conf.d."""
+    data = request.json or {}
+    backend, server = data.get('backend'), data.get('server')
+    address, port = data.get('address'), data.get('port')
+    options = data.get('options', 'check')
+    if not all([backend, server, address, port]):
+        return jsonify(success=False, message="backend, server, address and port are required."), 400
+    error = runtime_argument_error([('backend', backend), ('server', server), ('address', address)],
+                                   options=options, port=port)
+    if error:
+        return jsonify(success=False, message=error), 400
+
+    success, message = runtime_add_server(backend, server, address, port, options)
+    if not success:
+        return jsonify(success=False, message=message), 502
+    if data.get('persist', True):
+        line = f"    server {server} {address}:{port} {options}".rstrip()
+        persisted, persist_message = persist_server_change(backend, server, lambda _: line)
+        if not persisted:
+            return jsonify(success=False, message=f"Server added live, but not persisted: {persist_message}"), 500
+    return jsonify(success=True, message=f"Server '{backend}/{server}' added.")
+
+@app.route('/api/runtime/servers/<backend>/<server>', methods=['POST', 'DELETE'])
+def api_runtime_server(backend, server):
+    """Change (POST: state, weight, address/port) or remove (DELETE) a live server, persisting to conf.d."""
+    data = request.get_json(silent=True) or {}
+    persist = data.get('persist', True)
+    error = runtime_argument_error([('backend', backend), ('server', server)])
+    if error:
+        return jsonify(success=False, message=error), 400
+
+    if request.method == 'DELETE':
+        success, message = runtime_del_server(backend, server)
+        if success and persist:
+            success, message = persist_server_change(backend, server, lambda _: None)
+        return jsonify(success=success, message=message), 200 if success else 502
+
+    changes = []
+    if 'address' in data or 'port' in data:
+        if not data.get('address') or not data.get('port'):
+            return jsonify(success=False, message="address and port must be given together."), 400
+        error = runtime_argument_error([('address', data['address'])], port=data['port'])
+        if error:
+            return jsonify(success=False, message=error), 400
+        success, message = runtime_set_server_address(backend, server, data['address'], data['port'])
+        if not success:
+            return jsonify(success=False, message=message), 502
+        address = f"{data['address']}:{data['port']}"
+        changes.append(lambda line: re.sub(r'^(\s*server\s+\S+\s+)\S+', lambda m: m.group(1) + address, line))
+    if 'weight' in data:
+        try:
+            data['weight'] = int(data['weight'])
+        except (TypeError, ValueError):
+            return jsonify(success=False, message=f"Invalid weight '{data['weight']}'."), 400
+        success, message = runtime_set_server_weight(backend, server, data['weight'])
+        if not success:
+            return jsonify(success=False, message=message), 502
+        changes.append(lambda line: _set_server_weight(line, data['weight']))
+    if 'state' in data:
+        success, message = runtime_set_server_state(backend, server, data['state'])
+        if not success:
+            return jsonify(success=False, message=message), 502
+        # 'drain' only exists at runtime; the file can only express enabled/disabled.
+        if data['state'] != 'drain':
+            changes.append(lambda line: _set_server_disabled(line, data['state'] == 'maint'))
+    if not changes:
+        return jsonify(success=False, message="Nothing to change (expected state, weight or address/port)."), 400
+
+    if persist:
+        def apply_changes(line):
+            if line is None:
+                raise ValueError(f"server '{server}' not found in backend '{backend}'")
+            for change in changes:
+                line = change(line)
+            return line
+        persisted, persist_message = persist_server_change(backend, server, apply_changes)
+        if not persisted:
+            return jsonify(success=False, message=f"Changed live, but not persisted: {persist_message}"), 500
+    return jsonify(success=True, message=f"Server '{backend}/{server}' updated.")
+
+@app.route('/api/runtime/maps', methods=['POST', 'DELETE'])
+def api_runtime_map_entry():
+    """Set (POST) or remove (DELETE) a map entry live and in the map file."""
+    data = request.json or {}
+    map_path, key, value = data.get('map'), data.get('key'), data.get('value')
+    if not map_path or not key or (request.method == 'POST' and not value):
+        return jsonify(success=False, message="map, key and value are required."), 400
+    if map_path not in referenced_map_files():
+        return jsonify(success=False, message=f"'{map_path}' is not a map file the configuration uses."), 400
+    error = runtime_argument_error(values=[('key', key)] + ([('value', value)] if request.method == 'POST' else []))
+    if error:
+        return jsonify(success=False, message=error), 400
+
+    if request.method == 'DELETE':
+        success, message = runtime_del_map_entry(map_path, key)
+    else:
+        success, message = runtime_set_map_entry(map_path, key, value)
+    if not success:
+        return jsonify(success=False, message=message), 502
+    if data.get('persist', True):
+        try:
+            update_map_file(map_path, {key: value if request.method == 'POST' else None})
+        except Exception as e:
+            return jsonify(success=False, message=f"Changed live, but not persisted: {str(e)}"), 500
+    return jsonify(success=True, message=f"Map entry '{key}' updated.")
+
 @app.route('/config_d')
 def config_d_list():
-    files = get_config_files()
-    return render_template('config_d.html', config_files=files)
+    # The file list is loaded page by page from /api/config_d/files
+    return render_template('config_d.html', config_d_dir=CONFIG_D_DIR)
+
+@app.route('/api/config_d/files')
+def api_config_d_files():
+    """Paginated config.d listing: ?offset, limit, sort=name|size|mtime, order=asc|desc, prefix, q."""
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(CONFIG_LIST_MAX_LIMIT, max(1, int(request.args.get('limit', 100))))
+        total, files = list_config_d_files(offset, limit,
+                                           sort=request.args.get('sort', 'name'),
+                                           order=request.args.get('order', 'asc'),
+                                           prefix=request.args.get('prefix', ''),
+                                           search=request.args.get('q', ''))
+    except ValueError as e:
+        return jsonify(success=False, message=str(e)), 400
+    return jsonify(success=True, total=total, offset=offset, limit=limit, files=files)
 
 @app.route('/config_d/add', methods=['GET', 'POST'])
 def add_config_d():
@@ -538,12 +5075,11 @@ def add_config_d():
             return jsonify(success=False, message="Filename and content are required."), 400
 
         file_path = os.path.join(CONFIG_D_DIR, filename)
-        if os.path.exists(file_path):
-            return jsonify(success=False, message=f"File '{filename}' already exists."), 409
-
         try:
-            with open(file_path, 'w') as f:
-                f.write(content)
+            with ConfigTransaction() as txn:
+                if txn.read(file_path) is not None:
+                    return jsonify(success=False, message=f"File '{filename}' already exists."), 409
+                txn.write(file_path, content)
             return jsonify(success=True, message=f"File '{filename}' created successfully.")
         except Exception as e:
             return jsonify(success=False, message=f"Error creating file: {str(e)}"), 500
@@ -558,63 +5094,142 @@ def wizard_add_config():
     service_port = data.get('service_port')
     service_url = data.get('service_url')
     is_https = data.get('is_https') # This will be boolean
+    apply_mode = data.get('apply_mode', 'manual') # 'manual' or 'runtime'
+    routing_mode = data.get('routing_mode', FRONTEND_ROUTING_MODE) # 'acl' or 'map'
 
     if not all([service_name, service_ip, service_port, service_url]):
         return jsonify(success=False, message="All wizard fields are required."), 400
 
-    # Sanitize service_name for filename and internal use
-    # Replace non-alphanumeric with underscore, ensure it starts with a letter or underscore
-    sanitized_service_name = re.sub(r'[^a-zA-Z0-9_]', '_', service_name)
-    if not sanitized_service_name or not sanitized_service_name[0].isalpha() and not sanitized_service_name[0] == '_':
-        sanitized_service_name = "service_" + sanitized_service_name.lstrip('_')
-    
-    # Generate backend config
-    backend_filename = f"10-{sanitized_service_name}_backend.cfg"
-    backend_content = f"""backend {sanitized_service_name}_backend
-    mode http
-    balance roundrobin
-    option forwardfor
-    http-reuse safe
-    server {sanitized_service_name}_server {service_ip}:{service_port} check inter 5s fall 3 rise 2"""
-
-    if is_https:
-        backend_content += " ssl verify none"
-    
-    backend_content += """
-    timeout connect 10s
-    timeout server 30s
-    retries 4
-"""
+    sanitized_service_name = sanitize_service_name(service_name)
+    backend_filename, backend_content, server_options = build_backend_config(
+        sanitized_service_name, service_ip, service_port, is_https
+    )
 
     backend_file_path = os.path.join(CONFIG_D_DIR, backend_filename)
 
-    # Write backend file
+    # Write the backend file and update 00-frontend.cfg as one all-or-nothing change
     try:
-        with open(backend_file_path, 'w') as f:
-            f.write(backend_content)
-    except Exception as e:
+        with ConfigTransaction() as txn:
+            txn.write(backend_file_path, backend_content)
+            success, message = update_frontend_cfg(sanitized_service_name, service_url, routing_mode, txn)
+            if not success:
+                txn.abort()
+    except ConfigTransactionError as e:
         return jsonify(success=False, message=f"Error creating backend file '{backend_filename}': {str(e)}"), 500
-
-    # Update 00-frontend.cfg
-    success, message = update_frontend_cfg(sanitized_service_name, service_url)
     if not success:
-        # Consider rolling back backend file creation if frontend update fails, or just log
-        logging.warning(f"Frontend update failed after backend file creation: {message}")
-        return jsonify(success=False, message=f"Backend created, but frontend update failed: {message}"), 500
+        logging.warning(f"Frontend update failed, backend file not created: {message}")
+        return jsonify(success=False, message=f"Frontend update failed, nothing was written: {message}"), 500
 
     # Get the updated frontend content to display
     frontend_cfg_success, frontend_cfg_display_content = get_config_file_content("00-frontend.cfg")
     if not frontend_cfg_success:
         frontend_cfg_display_content = "Could not retrieve updated 00-frontend.cfg content."
 
+    runtime_result = None
+    if apply_mode == 'runtime':
+        runtime_result = apply_service_runtime(
+            f"{sanitized_service_name}_backend", f"{sanitized_service_name}_server",
+            service_ip, service_port, server_options
+        )
+        if routing_mode == 'map' and runtime_result['applied']:
+            # With map routing the hostname can go live too
+            mapped, map_message = runtime_set_map_entry(HOSTS_MAP_PATH, service_url.lower(), f"{sanitized_service_name}_backend")
+            if not mapped:
+                runtime_result = {'applied': False, 'reload_required': True, 'message': map_message}
 
     return jsonify(
         success=True,
         message=f"Backend '{backend_filename}' and 00-frontend.cfg updated successfully.",
         frontend_cfg_path=FRONTEND_CFG_PATH, # Pass path for display on frontend
-        frontend_cfg_content=frontend_cfg_display_content # Pass content for display
+        frontend_cfg_content=frontend_cfg_display_content, # Pass content for display
+        runtime=runtime_result
+    )
+
+
+@app.route('/api/config_d/wizard/bulk', methods=['POST'])
+def wizard_bulk_add_config():
+    """Onboard many services at once from JSON or an uploaded CSV/YAML file.
+
+    JSON body: {"services": [{service_name, service_ip, service_port, service_url, is_https}, ...],
+                "routing_mode", "overwrite", "validate", "reload", "dry_run"}
+    Multipart: a 'file' field (.csv/.yaml/.yml) plus the same options as form fields.
+    """
+    if request.files.get('file'):
+        upload = request.files['file']
+        options = request.form
+        try:
+            services = parse_services_file(upload.filename or '', upload.read())
+        except ValueError as e:
+            return jsonify(success=False, message=str(e)), 400
+    else:
+        options = request.get_json(silent=True) or {}
+        services = options.get('services')
+        if not isinstance(services, list):
+            return jsonify(success=False, message="'services' must be a list."), 400
+        try:
+            check_services_list(services)
+        except ValueError as e:
+            return jsonify(success=False, message=str(e)), 400
+
+    dry_run = _truthy(options.get('dry_run', False))
+    success, results, message = onboard_services(
+        services,
+        routing_mode=options.get('routing_mode') or None,
+        overwrite=_truthy(options.get('overwrite', False)),
+        validate=_truthy(options.get('validate', False)),
+        dry_run=dry_run
+    )
+    reload_result = None
+    if _truthy(options.get('reload', False)) and not dry_run and any(r['status'] in ('created', 'updated') for r in results):
+        reload_result = reload_haproxy()
+    status_code = 200 if success else (207 if results else 422)
+    return jsonify(success=success, message=message, results=results, reload=reload_result), status_code
+
+@app.route('/api/config_d/batch', methods=['POST'])
+def api_config_d_batch():
+    """Apply several config.d writes/deletes as one transaction, optionally validated and reloaded.
+
+    Body: {"files": {"<filename>": "<content>" or null to delete}, "validate": true, "reload": false}
+    """
+    data = request.json or {}
+    files = data.get('files') or {}
+    if not isinstance(files, dict) or not files:
+        return jsonify(success=False, message="'files' must map filenames to content (or null)."), 400
+    for filename in files:
+        if not filename or os.path.basename(filename) != filename or filename.startswith('.'):
+            return jsonify(success=False, message=f"Invalid filename '{filename}'."), 400
+
+    try:
+        with ConfigTransaction(validate=_truthy(data.get('validate', True))) as txn:
+            for filename, content in files.items():
+                path = os.path.join(CONFIG_D_DIR, filename)
+                if content is None:
+                    txn.delete(path)
+                else:
+                    txn.write(path, content)
+    except ConfigTransactionError as e:
+        return jsonify(success=False, message=str(e)), 422
+
+    written = sorted(name for name, content in files.items() if content is not None)
+    deleted = sorted(name for name, content in files.items() if content is None)
+    reload_result = reload_haproxy() if _truthy(data.get('reload')) else None
+    return jsonify(
+        success=True,
+        message=f"{len(written)} file(s) written, {len(deleted)} deleted.",
+        written=written,
+        deleted=deleted,
+        reload=reload_result
     )
 
+@app.route('/api/config_d/migrate_to_map', methods=['POST'])
+def api_migrate_to_map():
+    """Convert host ACL/use_backend pairs in 00-frontend.cfg into hosts.map entries (dry run by default)."""
+    data = request.get_json(silent=True) or {}
+    dry_run = _truthy(data.get('dry_run', True))
+    success, result = migrate_frontend_to_map(dry_run=dry_run)
+    if not success:
+        return jsonify(success=False, message=result), 500
+    return jsonify(success=True, dry_run=dry_run, map_path=HOSTS_MAP_PATH, **result)
 
 @app.route('/config_d/edit/<filename>', methods=['GET', 'POST'])
 def edit_config_d(filename):
@@ -627,8 +5242,8 @@ def edit_config_d(filename):
         if content is None:
             return jsonify(success=False, message="Content is required."), 400
         try:
-            with open(file_path, 'w') as f:
-                f.write(content)
+            with ConfigTransaction() as txn:
+                txn.write(file_path, content)
             return jsonify(success=True, message=f"File '{filename}' updated successfully.")
         except Exception as e:
             return jsonify(success=False, message=f"Error updating file: {str(e)}"), 500
@@ -642,24 +5257,91 @@ def edit_config_d(filename):
 
 @app.route('/api/config_d/delete/<filename>', methods=['DELETE'])
 def delete_config_d(filename):
+    """Delete a config.d file together with the routing lines, map entries and now-unused
+    ACLs that point at the backends it defines (?cascade=0 deletes only the file)."""
     file_path = os.path.join(CONFIG_D_DIR, filename)
     if not os.path.exists(file_path):
         return jsonify(success=False, message="File not found."), 404
     try:
-        os.remove(file_path)
-        # TODO: Potentially remove associated ACL/use_backend lines from 00-frontend.cfg
-        return jsonify(success=True, message=f"File '{filename}' deleted successfully.")
-    except Exception as e:
-        return jsonify(success=False, message=f"Error deleting file: {str(e)}"), 500
+        message, plan = delete_config_file(file_path, cascade=_truthy(request.args.get('cascade', '1')))
+    except ConfigTransactionError as e:
+        return jsonify(success=False, message=f"Error deleting file: {e}"), 409
+    return jsonify(success=True, message=message, **plan)
+
+@app.route('/api/config_d/dependencies/<filename>')
+def api_config_d_dependencies(filename):
+    """Dependency preview for deleting a config.d file: what the cascade would remove."""
+    file_path = os.path.join(CONFIG_D_DIR, filename)
+    if not os.path.exists(file_path):
+        return jsonify(success=False, message="File not found."), 404
+    try:
+        message, plan = delete_config_file(file_path, dry_run=True)
+    except ConfigTransactionError as e:
+        return jsonify(success=False, message=str(e)), 409
+    return jsonify(success=True, message=message, **plan)
+
+@app.route('/api/backends/<name>/dependencies')
+def api_backend_dependencies(name):
+    """Where a backend is defined and every line, map entry and ACL that routes to it."""
+    dependencies = config_references.refresh().backend_dependencies(name)
+    if not dependencies['definitions'] and not dependencies['references']:
+        return jsonify(success=False, message=f"Backend '{name}' is neither defined nor referenced."), 404
+    for key in ('definitions', 'references', 'orphaned_acls'):
+        dependencies[key] = [_public_record(record) for record in dependencies[key]]
+    return jsonify(success=True, **dependencies)
+
+@app.route('/api/backends/<name>/rename', methods=['POST'])
+def api_rename_backend(name):
+    """Rename a backend everywhere it is referenced. Body: {"new_name": "...", "dry_run": false}"""
+    data = request.get_json(silent=True) or {}
+    dry_run = _truthy(data.get('dry_run', False))
+    try:
+        success, message, changes = rename_backend(name, data.get('new_name'), dry_run=dry_run)
+    except ConfigTransactionError as e:
+        return jsonify(success=False, message=str(e)), 409
+    if not success:
+        return jsonify(success=False, message=message), 400
+    return jsonify(success=True, message=message, dry_run=dry_run, changes=changes)
+
+@app.route('/api/config_d/references')
+def api_config_references():
+    """Dangling backend/ACL references and unused backends and ACLs across the config set."""
+    report = config_references.refresh().report()
+    for key, records in report.items():
+        report[key] = [_public_record(record) for record in records]
+    return jsonify(success=True, **report)
 
 @app.route('/api/config_d/content/<filename>')
 def api_config_d_content(filename):
+    path = config_d_file_path(filename)
+    etag = file_etag(path) if path else None
+    if etag and etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'}) # Unchanged - skip reading it
     success, content = get_config_file_content(filename)
     if success:
-        return jsonify(success=True, content=content)
+        response = jsonify(success=True, content=content)
+        if etag:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
     else:
         return jsonify(success=False, message=content), 404 # Use 404 if file not found
 
+@app.route('/api/config_d/raw/<filename>')
+def api_config_d_raw(filename):
+    """Stream a config.d file, or a map/ACL file the config references, as text/plain,
+    with ETag/If-None-Match and Range support."""
+    path = raw_file_path(filename)
+    etag = file_etag(path) if path else None
+    if etag is None:
+        return jsonify(success=False, message="File not found."), 404
+    try:
+        response = send_file(path, mimetype='text/plain', conditional=True, etag=etag)
+    except FileNotFoundError: # Deleted since the stat
+        return jsonify(success=False, message="File not found."), 404
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate, but a 304 costs no body
+    return response
+
 
 @app.route('/map')
 def network_map():
@@ -668,20 +5350,128 @@ def network_map():
 
 @app.route('/api/network_topology')
 def api_network_topology():
-    """API endpoint to get network topology data."""
-    topology = parse_haproxy_configs()
-    return jsonify(topology)
+    """API endpoint to get network topology data.
+
+    The response carries a strong ETag (the snapshot version) and answers
+    If-None-Match with 304. With ?since=<version> only the added, removed and
+    changed nodes and edges are returned; the full topology is returned
+    instead when that version is no longer known to this worker.
+    """
+    version, topology, graph = topology_snapshot() # Only parses when a file or health/status changed
+    since = request.args.get('since')
+    if since == version or version in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{version}"', 'Cache-Control': 'no-cache'})
+
+    delta = topology_delta_since(since, graph) if since else None
+    if delta is not None:
+        response = jsonify(version=version, since=since, delta=delta)
+    else:
+        response = jsonify(dict(topology, version=version))
+    response.set_etag(version)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/network_topology/view')
+def api_network_topology_view():
+    """Laid-out slice of the topology for the map.
+
+    Query: level=auto|backends|servers, expand=<backend>,... (backends whose
+    servers are shown anyway), bbox=x0,y0,x1,y1 (layout coordinates of the
+    viewport) and zoom=<scale>. Node coordinates come from the cached
+    server-side layout, so the browser only draws. The ETag covers the
+    snapshot version, the layout and the query, so an unchanged view is a 304.
+    """
+    level = request.args.get('level', 'auto')
+    if level not in TOPOLOGY_VIEW_LEVELS:
+        return jsonify(success=False, message=f"Unknown level '{level}' (use one of {', '.join(TOPOLOGY_VIEW_LEVELS)})."), 400
+    expand = sorted({name for name in request.args.get('expand', '').split(',') if name})
+    bbox = None
+    if request.args.get('bbox'):
+        try:
+            bbox = [float(value) for value in request.args['bbox'].split(',')]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            return jsonify(success=False, message="bbox must be four numbers: x0,y0,x1,y1."), 400
+    zoom = request.args.get('zoom', 1.0, type=float)
+
+    snapshot = current_topology_snapshot()
+    version, topology, graph = snapshot['version'], snapshot['topology'], snapshot['graph']
+    # The layout signature is the structure signature, so the ETag needs no layout work
+    etag = hashlib.sha1(json.dumps([version, snapshot['structure'], level, expand, bbox, zoom]).encode()).hexdigest()[:20]
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+
+    signature, positions, bounds = topology_layout(graph)
+    view = topology_view(graph, positions, level, expand, bbox, zoom)
+    response = jsonify(version=version, layout=signature, bounds=bounds, error=topology.get('error'), **view)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/network_topology/events')
+def api_network_topology_events():
+    """Server-Sent Events stream of topology deltas, pushed whenever a config file changes."""
+    subscriber = config_watcher.subscribe()
+
+    def stream():
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            config_watcher.unsubscribe(subscriber)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/traffic_stats')
+def api_traffic_stats():
+    """Latest live traffic per frontend, backend and server, keyed by topology node id."""
+    stats = get_traffic_stats()
+    return jsonify(success=stats['error'] is None, **stats)
+
+@app.route('/api/traffic_stats/<path:node_id>')
+def api_traffic_history(node_id):
+    """Stored time series (up to STATS_HISTORY samples) for one topology node."""
+    history = get_traffic_history(node_id)
+    if not history['timestamps']:
+        return jsonify(success=False, message=f"No traffic stats recorded for '{node_id}'."), 404
+    return jsonify(success=True, node_id=node_id, **history)
+
+@app.route('/api/access_log/stats')
+def api_access_log_stats():
+    """Request rate, status classes and timer percentiles per frontend and backend, from the access log."""
+    window = min(max(request.args.get('window', 5, type=int), 1), ACCESS_LOG_HISTORY_MINUTES)
+    stats = get_access_log_stats(window)
+    return jsonify(success=stats['error'] is None, **stats)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint for HAProxy counters and the dashboard's own internals."""
+    return Response(metrics_snapshot(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/api/server_status/<server_ip>/<int:server_port>')
 def api_server_status(server_ip, server_port):
-    """Check individual server status."""
-    status = check_server_status(server_ip, server_port)
+    """Check individual server status (a TCP probe; hostnames and IPv6 addresses work too)."""
+    health = get_server_status(server_ip, server_port)
     return jsonify({
         'ip': server_ip,
         'port': server_port,
-        'status': status
+        'status': health['status'],
+        'latency_ms': health.get('latency_ms'),
+        'detail': health.get('detail')
     })
 
+@app.route('/api/server_health')
+def api_server_health():
+    """Last health check per server - status, probe latency, HTTP response and check - keyed by topology node id."""
+    return jsonify(success=True, interval=HEALTH_REFRESH_INTERVAL, nodes=server_health_report())
+
 @app.route('/haproxy_cfg', methods=['GET', 'POST'])
 def haproxy_cfg():
     if request.method == 'POST':
@@ -689,8 +5479,8 @@ def haproxy_cfg():
         if content is None:
             return jsonify(success=False, message="Content is required."), 400
         try:
-            with open(HAPROXY_CFG_PATH, 'w') as f:
-                f.write(content)
+            with ConfigTransaction() as txn:
+                txn.write(HAPROXY_CFG_PATH, content)
             return jsonify(success=True, message="haproxy.cfg updated successfully.")
         except Exception as e:
             return jsonify(success=False, message=f"Error updating haproxy.cfg: {str(e)}"), 500
@@ -702,6 +5492,102 @@ def haproxy_cfg():
         except Exception as e:
             return f"Error reading haproxy.cfg: {str(e)}", 500
 
+@app.route('/fleet')
+def fleet():
+    """Fleet overview: every inventory node's status, config drift and stats."""
+    return render_template('fleet.html', inventory_path=FLEET_INVENTORY_PATH)
+
+@app.route('/api/fleet/nodes')
+def api_fleet_nodes():
+    try:
+        nodes = load_fleet_inventory()
+    except (OSError, ValueError) as e:
+        return jsonify(success=False, message=f"Invalid fleet inventory {FLEET_INVENTORY_PATH}: {e}"), 500
+    fields = ('name', 'transport', 'host', 'config_d_dir', 'stats_url')
+    return jsonify(success=True, inventory=FLEET_INVENTORY_PATH, nodes=[{key: node[key] for key in fields} for node in nodes])
+
+@app.route('/api/fleet/status')
+def api_fleet_status():
+    """Per-node status, config drift and stats, plus stats summed per frontend/backend/server. ?node= limits the nodes."""
+    try:
+        status = fleet_status(request.args.getlist('node'))
+    except (OSError, ValueError) as e:
+        return jsonify(success=False, message=str(e)), 400
+    return jsonify(success=True, **status)
+
+@app.route('/api/fleet/push', methods=['POST'])
+def api_fleet_push():
+    """Push the local config set to the fleet.
+
+    Body: {"nodes": [names] (default all), "validate": true, "reload": false, "dry_run": false}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        success, message, results = fleet_push(
+            data.get('nodes') or None,
+            validate=_truthy(data.get('validate', True)),
+            reload=_truthy(data.get('reload', False)),
+            dry_run=_truthy(data.get('dry_run', False))
+        )
+    except (OSError, ValueError) as e:
+        return jsonify(success=False, message=str(e)), 400
+    status_code = 200 if success else (207 if results else 409)
+    return jsonify(success=success, message=message, results=results), status_code
+
+@app.route('/api/fleet/action', methods=['POST'])
+def api_fleet_action():
+    """Run 'validate' or 'reload' on every (or the named) node. Body: {"action": ..., "nodes": [names]}"""
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in ('validate', 'reload'):
+        return jsonify(success=False, message="Invalid action, expected 'validate' or 'reload'."), 400
+    try:
+        success, message, results = fleet_command(action, data.get('nodes') or None)
+    except (OSError, ValueError) as e:
+        return jsonify(success=False, message=str(e)), 400
+    status_code = 200 if success else (207 if results else 409)
+    return jsonify(success=success, message=message, results=results), status_code
+
+# --- CLI ---
+
+@app.cli.command('bulk-import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--routing-mode', type=click.Choice(['acl', 'map']), default=None, help="Defaults to FRONTEND_ROUTING_MODE.")
+@click.option('--overwrite', is_flag=True, help="Replace backend files that already exist.")
+@click.option('--validate', is_flag=True, help="Run haproxy -c and roll back if it fails.")
+@click.option('--reload', 'do_reload', is_flag=True, help="Reload HAProxy once afterwards.")
+@click.option('--dry-run', is_flag=True, help="Report what would happen without writing anything.")
+def bulk_import_command(path, routing_mode, overwrite, validate, do_reload, dry_run):
+    """Onboard every service listed in a CSV or YAML file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        services = parse_services_file(path, data)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    success, results, message = onboard_services(services, routing_mode, overwrite, validate, dry_run)
+    for result in results:
+        click.echo(f"{result['index']:>5}  {result['status']:<8} {result['service_name']:<30} {result.get('message', result.get('file', ''))}")
+    click.echo(message)
+    if do_reload and not dry_run and any(r['status'] in ('created', 'updated') for r in results):
+        click.echo(reload_haproxy()['message'])
+    if not success:
+        raise SystemExit(1)
+
+@app.cli.command('fleet-push')
+@click.option('--node', 'nodes', multiple=True, help="Only push to this node (repeatable). Defaults to every node.")
+@click.option('--no-validate', is_flag=True, help="Skip the local and per-node haproxy -c checks.")
+@click.option('--reload', 'do_reload', is_flag=True, help="Reload HAProxy on the nodes that changed.")
+@click.option('--dry-run', is_flag=True, help="Only report which files each node would receive.")
+def fleet_push_command(nodes, no_validate, do_reload, dry_run):
+    """Push the local config set to the fleet inventory nodes."""
+    success, message, results = fleet_push(list(nodes), validate=not no_validate, reload=do_reload, dry_run=dry_run)
+    for result in results:
+        click.echo(f"{result['name']:<20} {'ok' if result['success'] else 'FAILED':<7} {result['message']}")
+    click.echo(message)
+    if not success:
+        raise SystemExit(1)
+
 # --- Error Handling ---
 @app.errorhandler(404)
 def page_not_found(e):
@@ -709,4 +5595,4 @@ def page_not_found(e):
 
 if __name__ == '__main__':
     # This part runs only when app.py is executed directly, not via gunicorn
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
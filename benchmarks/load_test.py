@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Concurrent load test for the dashboard's API endpoints.
+
+Fires the same request serially and then from N concurrent clients against a
+running instance, and reports latency percentiles and throughput for both. With
+sync workers, concurrent /api/network_topology calls queue behind each other once
+every worker is busy; with gthread workers the concurrent wall time should
+stay close to the slowest single request.
+
+    ./run_gunicorn.sh   # or GUNICORN_WORKER_CLASS=sync ./run_gunicorn.sh to compare
+    python benchmarks/load_test.py --url http://127.0.0.1:5000/api/network_topology -c 20 -n 100
+"""
+import argparse
+import json
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def timed_request(url, timeout):
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except Exception:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(url, requests, concurrency, timeout):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: timed_request(url, timeout), range(requests)))
+    wall = time.perf_counter() - started
+    latencies = [latency for latency, _ in results]
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': sum(1 for _, ok in results if not ok),
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(requests / wall, 1) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/network_topology')
+    parser.add_argument('-c', '--concurrency', type=int, default=20, help="Concurrent clients")
+    parser.add_argument('-n', '--requests', type=int, default=100, help="Requests per run")
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    timed_request(args.url, args.timeout) # Warm the parse and health caches
+    serial = run(args.url, max(1, args.requests // args.concurrency), 1, args.timeout)
+    concurrent = run(args.url, args.requests, args.concurrency, args.timeout)
+    # How much of the ideal concurrency was achieved: 1.0 means fully serialized
+    speedup = round(concurrent['throughput_rps'] / serial['throughput_rps'], 2) if serial['throughput_rps'] else 0.0
+    result = {'url': args.url, 'serial': serial, 'concurrent': concurrent, 'speedup': speedup}
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for name in ('serial', 'concurrent'):
+            stats = result[name]
+            print(f"{name:>10}: {stats['requests']} requests x{stats['concurrency']} in {stats['wall_seconds']}s "
+                  f"({stats['throughput_rps']} req/s) p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+                  f"max={stats['max_ms']}ms errors={stats['errors']}")
+        print(f"   speedup: {speedup}x over serial")
+    return 1 if concurrent['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Access log ingestion benchmark.
+
+Writes a synthetic HAProxy HTTP log ('option httplog' format, syslog prefix
+included) spread over the last few minutes, then times a cold catch-up
+through read_access_log() - the mmap tailer and AccessLogAggregator the
+collector uses - the per-node summary for one window, and the summaries for
+every ACCESS_LOG_SUMMARY_WINDOWS window that the leader publishes after a poll.
+
+The collector has to keep up with ~20,000 lines/s on one core; the exit
+status is 1 if ingestion is slower than --min-rate.
+
+    python benchmarks/log_ingest.py                      # 500,000 lines
+    python benchmarks/log_ingest.py --lines 2000000 --backends 500 --json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as haproxy_app # noqa: E402
+
+STATUSES = (200,) * 80 + (301, 304, 404, 404, 500, 502, 503, -1)
+
+
+def generate_log(path, lines, frontends, backends, minutes, seed=1):
+    """Write `lines` log lines with accept times over the last `minutes` minutes."""
+    rng = random.Random(seed)
+    now = time.time()
+    started = now - minutes * 60
+    with open(path, 'w') as f:
+        for index in range(lines):
+            accepted = time.localtime(started + index * minutes * 60 / lines)
+            date = time.strftime('%d/%b/%Y:%H:%M:%S', accepted)
+            frontend = f"front{index % frontends}" + ('~' if index % 3 == 0 else '')
+            backend = f"svc{rng.randrange(backends)}_backend"
+            status = rng.choice(STATUSES)
+            tr = int(rng.lognormvariate(3, 1))
+            timers = f"{rng.randrange(5)}/0/{rng.randrange(3)}/{tr if status != -1 else -1}/{tr + rng.randrange(10)}"
+            f.write(f"{time.strftime('%b %d %H:%M:%S', accepted)} lb1 haproxy[1234]: "
+                    f"10.0.{index % 256}.{index % 250 + 1}:{40000 + index % 20000} [{date}.{index % 1000:03d}] "
+                    f"{frontend} {backend}/web{index % 3} {timers} {status} {rng.randrange(200, 20000)} - - ---- "
+                    f"12/10/3/1/0 0/0 \"GET /item/{index} HTTP/1.1\"\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=500000, help="Log lines to generate")
+    parser.add_argument('--frontends', type=int, default=4, help="Distinct frontends in the log")
+    parser.add_argument('--backends', type=int, default=100, help="Distinct backends in the log")
+    parser.add_argument('--minutes', type=int, default=10, help="Minutes of traffic the log spans")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs (the best is reported)")
+    parser.add_argument('--min-rate', type=float, default=20000, help="Fail below this many lines/s")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='access-log-bench-')
+    try:
+        path = os.path.join(directory, 'haproxy.log')
+        generate_log(path, args.lines, args.frontends, args.backends, args.minutes)
+        size = os.path.getsize(path)
+        haproxy_app.ACCESS_LOG_CATCHUP_BYTES = size # Read the whole file on the first pass
+
+        ingest_seconds = None
+        for _ in range(args.repeat):
+            aggregator = haproxy_app.AccessLogAggregator()
+            started = time.perf_counter()
+            position = haproxy_app.read_access_log(path, {}, aggregator)
+            elapsed = time.perf_counter() - started
+            ingest_seconds = elapsed if ingest_seconds is None else min(ingest_seconds, elapsed)
+
+        started = time.perf_counter()
+        nodes = haproxy_app.summarize_access_log(aggregator.slots, args.minutes)
+        summary_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        haproxy_app.summarize_access_log_windows(aggregator.slots, haproxy_app.ACCESS_LOG_SUMMARY_WINDOWS)
+        windows_seconds = time.perf_counter() - started
+        memory_buckets = sum(len(histogram) for per_minute in aggregator.slots.values()
+                             for slot in per_minute.values() for histogram in slot[2])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    result = {
+        'lines': args.lines,
+        'parsed': aggregator.parsed,
+        'megabytes': round(size / 1e6, 1),
+        'offset': position['offset'],
+        'ingest_ms': round(ingest_seconds * 1000, 1),
+        'lines_per_second': round(args.lines / ingest_seconds),
+        'summary_ms': round(summary_seconds * 1000, 1),
+        'windows_summary_ms': round(windows_seconds * 1000, 1),
+        'nodes': len(nodes),
+        'histogram_buckets': memory_buckets,
+        'min_rate': args.min_rate,
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['lines']} lines ({result['megabytes']} MB), {result['parsed']} parsed in "
+              f"{result['ingest_ms']} ms: {result['lines_per_second']} lines/s (target {args.min_rate:.0f})")
+        print(f"summary of {result['nodes']} nodes over {args.minutes} minutes: {result['summary_ms']} ms, "
+              f"{result['histogram_buckets']} histogram buckets held")
+        print(f"published summaries for windows {haproxy_app.ACCESS_LOG_SUMMARY_WINDOWS}: {result['windows_summary_ms']} ms")
+    return 1 if result['lines_per_second'] < args.min_rate or aggregator.parsed != args.lines else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Benchmark suite for the parser, wizard and topology paths.
+
+For each backend count, generates a synthetic config tree (see synthetic.py) in
+a temp dir, points the app at it, and times:
+
+  parse_config_content        cold parse of every file's content
+  load_config_sections_cold   assembly with an empty parse cache
+  load_config_sections_warm   assembly when nothing changed
+  health_probe_all            probing every server through the fake server pool (HTTP checks, pooled)
+  generate_connections        connection assembly on the loaded topology
+  add_frontend_route          adding one acl/use_backend pair to 00-frontend.cfg
+  GET /api/network_topology   end to end with a rebuild, health cached
+  GET /api/network_topology (cached)   unchanged inputs, served from the last snapshot
+  GET /api/network_topology (304)
+  GET /api/network_topology/view   one viewport of the laid-out map
+  GET /api/config_d/files
+  POST /api/config_d/wizard   end to end, one new service per run
+
+Each stage reports the best of --repeat runs in milliseconds. Runs are compared
+against benchmarks/baseline.json (recorded with the default sizes; the file
+notes the machine it came from) whenever it exists, or against --baseline.
+Re-record it on a reference machine after an intended change:
+
+    python benchmarks/run_benchmarks.py                       # compare with baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --no-baseline
+
+A stage is a regression when it is more than --tolerance times its baseline
+and at least --min-delta-ms slower; the exit status is 1 if any stage regressed.
+Only runs with the same frontend, backend and server counts are compared, and
+timings from another machine are only a rough guide.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+# Keep the benchmark's health cache and locks away from a running instance's state
+os.environ.setdefault('HAPROXY_WEB_STATE_DIR', tempfile.mkdtemp(prefix='haproxy-bench-state-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as haproxy_app # noqa: E402
+from synthetic import ACL_STYLES, FakeServerPool, generate_config_tree, point_app_at # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 3)
+
+
+def expect_status(response, status):
+    if response.status_code != status:
+        raise RuntimeError(f"{response.request.method} {response.request.path} returned "
+                           f"{response.status_code}, expected {status}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def empty_topology():
+    return {'frontends': [], 'backends': [], 'defaults': None}
+
+
+def run_stages(args, backends):
+    """Generate a tree with `backends` backends and time every stage against it."""
+    directory = tempfile.mkdtemp(prefix='haproxy-bench-')
+    try:
+        tree = generate_config_tree(directory, args.frontends, backends, args.servers, args.acl_styles)
+        point_app_at(haproxy_app, tree)
+        contents = []
+        for path, filename in haproxy_app.config_source_paths():
+            with open(path) as f:
+                contents.append((filename, f.read()))
+
+        stages = {}
+        stages['parse_config_content'] = best_of(
+            lambda: [haproxy_app.parse_config_content(content, empty_topology(), filename) for filename, content in contents],
+            args.repeat)
+
+        def cold_load():
+            haproxy_app.invalidate_parse_cache()
+            haproxy_app.load_config_sections(empty_topology())
+        stages['load_config_sections_cold'] = best_of(cold_load, args.repeat)
+        stages['load_config_sections_warm'] = best_of(lambda: haproxy_app.load_config_sections(empty_topology()), args.repeat)
+
+        topology = haproxy_app.load_config_sections({'frontends': [], 'backends': [], 'external_clients': []})
+        targets = haproxy_app.probe_targets(topology['backends'])
+        stages['health_probe_all'] = best_of(lambda: haproxy_app.probe_servers(targets), args.repeat)
+        haproxy_app.refresh_configured_servers() # Fill the shared health cache for the endpoint stages
+
+        haproxy_app.probe_backend_servers(topology['backends'])
+        haproxy_app.add_external_clients(topology)
+        stages['generate_connections'] = best_of(lambda: haproxy_app.generate_connections(topology), args.repeat)
+
+        with open(tree['frontend_cfg']) as f:
+            frontend_content = f.read()
+        stages['add_frontend_route'] = best_of(
+            lambda: haproxy_app.add_frontend_routes(frontend_content, [('bench_new', 'bench-new.example.com')], 'acl', None),
+            args.repeat)
+
+        client = haproxy_app.app.test_client()
+
+        def full_topology():
+            haproxy_app._topology_current['key'] = None # Rebuild rather than serve the last snapshot
+            expect_status(client.get('/api/network_topology'), 200)
+
+        stages['GET /api/network_topology'] = best_of(full_topology, args.repeat)
+        stages['GET /api/network_topology (cached)'] = best_of(
+            lambda: expect_status(client.get('/api/network_topology'), 200), args.repeat)
+        etag = client.get('/api/network_topology').headers['ETag']
+        stages['GET /api/network_topology (304)'] = best_of(
+            lambda: expect_status(client.get('/api/network_topology', headers={'If-None-Match': etag}), 304), args.repeat)
+        stages['GET /api/network_topology/view'] = best_of(
+            lambda: expect_status(client.get('/api/network_topology/view?bbox=-600,-300,1800,900&zoom=1'), 200),
+            args.repeat)
+        stages['GET /api/config_d/files'] = best_of(
+            lambda: expect_status(client.get('/api/config_d/files?limit=100'), 200), args.repeat)
+
+        added = iter(range(args.repeat))
+        def wizard():
+            index = next(added)
+            expect_status(client.post('/api/config_d/wizard', json={
+                'service_name': f'bench_{index}',
+                'service_ip': '10.255.0.1',
+                'service_port': 8080,
+                'service_url': f'bench-{index}.example.com',
+                'is_https': False,
+                'routing_mode': 'acl'
+            }), 200)
+        stages['POST /api/config_d/wizard'] = best_of(wizard, args.repeat)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'frontends': args.frontends,
+        'backends': backends,
+        'servers': args.servers,
+        'stages': stages
+    }
+
+
+def compare(runs, baseline, tolerance, min_delta_ms):
+    """Annotate each stage with its baseline time; return the list of regressions."""
+    baseline_runs = {(run['frontends'], run['backends'], run['servers']): run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in runs:
+        base = baseline_runs.get((run['frontends'], run['backends'], run['servers']))
+        if not base:
+            continue
+        run['baseline'] = {}
+        for stage, ms in run['stages'].items():
+            base_ms = base['stages'].get(stage)
+            if base_ms is None:
+                continue
+            run['baseline'][stage] = base_ms
+            if ms > base_ms * tolerance and ms - base_ms >= min_delta_ms:
+                regressions.append({'backends': run['backends'], 'stage': stage, 'ms': ms, 'baseline_ms': base_ms})
+    return regressions
+
+
+def machine_notes():
+    """What the timings depend on besides the code, stored with a baseline."""
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor() or None,
+        'cpus': os.cpu_count(),
+        'python': platform.python_version()
+    }
+
+
+def scaling_exponents(runs):
+    """Slope of log(time) against log(backends) between the two largest runs, per stage."""
+    if len(runs) < 2:
+        return {}
+    small, large = runs[-2], runs[-1]
+    exponents = {}
+    for stage, ms in large['stages'].items():
+        base = small['stages'].get(stage)
+        if base and ms > 0:
+            exponents[stage] = round(math.log(ms / base) / math.log(large['backends'] / small['backends']), 2)
+    return exponents
+
+
+def print_report(runs, exponents, regressions, baseline=None):
+    if baseline:
+        notes = baseline.get('machine') or {}
+        print(f"baseline {baseline['path']}: recorded {baseline.get('recorded_at', 'at an unknown time')} on "
+              f"{notes.get('platform', 'an unknown machine')}, {notes.get('cpus', '?')} CPUs, Python {notes.get('python', '?')}")
+        if notes and notes != machine_notes():
+            print("  (this machine differs, so compare the ratios loosely)")
+    for run in runs:
+        print(f"\n{run['frontends']} frontends, {run['backends']} backends, {run['servers']} servers each")
+        for stage, ms in run['stages'].items():
+            line = f"  {stage:<34} {ms:>10.3f} ms"
+            base_ms = run.get('baseline', {}).get(stage)
+            if base_ms:
+                line += f"   baseline {base_ms:>10.3f} ms ({ms / base_ms:.2f}x)"
+            print(line)
+    if exponents:
+        print("\nscaling exponent between the two largest runs (1.0 = linear):")
+        for stage, exponent in exponents.items():
+            print(f"  {stage:<34} {exponent:>5}")
+    for regression in regressions:
+        print(f"REGRESSION: {regression['stage']} at {regression['backends']} backends: "
+              f"{regression['ms']} ms vs baseline {regression['baseline_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frontends', type=int, default=2, help="Frontends per tree")
+    parser.add_argument('--backends', type=int, nargs='+', default=[100, 1000], help="Backend counts to test")
+    parser.add_argument('--servers', type=int, default=3, help="Servers per backend")
+    parser.add_argument('--acl-styles', nargs='+', default=list(ACL_STYLES), choices=ACL_STYLES,
+                        help="Routing styles to mix in the frontends")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per stage (the best is reported)")
+    parser.add_argument('--pool-size', type=int, default=8, help="Loopback listeners in the fake server pool")
+    parser.add_argument('--down-ratio', type=float, default=0.1, help="Share of servers that refuse connections")
+    parser.add_argument('--baseline', help="Compare against this baseline JSON file (default: benchmarks/baseline.json if it exists)")
+    parser.add_argument('--no-baseline', action='store_true', help="Don't compare against any baseline")
+    parser.add_argument('--save-baseline', help="Write the results to this file as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=1.5, help="Allowed slowdown factor against the baseline")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    pool = FakeServerPool(args.pool_size, args.down_ratio)
+    pool.install(haproxy_app)
+    try:
+        runs = [run_stages(args, backends) for backends in sorted(args.backends)]
+    finally:
+        pool.close()
+
+    regressions, baseline = [], None
+    baseline_path = args.baseline or (DEFAULT_BASELINE if os.path.exists(DEFAULT_BASELINE) else None)
+    if baseline_path and not args.no_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        baseline['path'] = os.path.relpath(baseline_path)
+        regressions = compare(runs, baseline, args.tolerance, args.min_delta_ms)
+    exponents = scaling_exponents(runs)
+    result = {'runs': runs, 'scaling_exponents': exponents, 'regressions': regressions,
+              'baseline': baseline and {key: baseline.get(key) for key in ('path', 'recorded_at', 'machine')}}
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'recorded_at': time.strftime('%Y-%m-%d'),
+                'machine': machine_notes(),
+                'settings': {'repeat': args.repeat, 'pool_size': args.pool_size, 'down_ratio': args.down_ratio,
+                             'acl_styles': args.acl_styles},
+                'runs': [{key: run[key] for key in ('frontends', 'backends', 'servers', 'stages')} for run in runs]
+            }, f, indent=2)
+            f.write("\n")
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(runs, exponents, regressions, baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
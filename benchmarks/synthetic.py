@@ -0,0 +1,241 @@
+"""Synthetic HAProxy config trees and a fake backend server pool for the benchmarks.
+
+generate_config_tree() writes a haproxy.cfg, a config.d directory and a hosts
+map shaped like a real deployment: N frontends, M backends with K servers
+each, host routing spread over several ACL styles, and backend files that are
+mostly one per service (as the wizard writes them) with some grouped files.
+
+FakeServerPool stands in for the backend servers: every configured address is
+probed against one of a few loopback listeners, so health probes cost a real
+connect() (and HTTP checks a real request) without touching the network.
+"""
+import os
+import selectors
+import socket
+import threading
+import zlib
+
+# hdr       acl host_x hdr(host) -i x.example.com          + use_backend ... if host_x
+# hdr_multi acl host_x hdr(host) -i x.example.com www...    + use_backend ... if host_x
+# hdr_beg   acl host_x hdr_beg(host) -i x.                 + use_backend ... if host_x
+# path_beg  acl path_x path_beg /x/                        + use_backend ... if path_x
+# inline    use_backend ... if { hdr(host) -i x.example.com }
+# map       x.example.com in hosts.map, routed by one map-based use_backend rule
+ACL_STYLES = ('hdr', 'hdr_multi', 'hdr_beg', 'path_beg', 'inline', 'map')
+GROUPED_EVERY = 5 # Every 5th backend goes into a shared multi-backend file
+GROUP_SIZE = 50
+
+
+def service_name(index):
+    return f"svc{index}"
+
+
+def server_address(backend_index, server_index):
+    """A unique-looking private address for a synthetic server."""
+    return f"10.{(backend_index >> 8) & 255}.{backend_index & 255}.{server_index + 1}", 8080
+
+
+def routing_lines(index, style):
+    """(acl lines, use_backend lines, map entries) routing one service in the given style."""
+    name = service_name(index)
+    backend = f"{name}_backend"
+    host = f"{name}.example.com"
+    if style == 'hdr':
+        return [f"    acl host_{name} hdr(host) -i {host}"], [f"    use_backend {backend} if host_{name}"], []
+    if style == 'hdr_multi':
+        return [f"    acl host_{name} hdr(host) -i {host} www.{host}"], [f"    use_backend {backend} if host_{name}"], []
+    if style == 'hdr_beg':
+        return [f"    acl host_{name} hdr_beg(host) -i {name}."], [f"    use_backend {backend} if host_{name}"], []
+    if style == 'path_beg':
+        return [f"    acl path_{name} path_beg /{name}/"], [f"    use_backend {backend} if path_{name}"], []
+    if style == 'inline':
+        return [], [f"    use_backend {backend} if {{ hdr(host) -i {host} }}"], []
+    if style == 'map':
+        return [], [], [f"{host} {backend}"]
+    raise ValueError(f"Unknown ACL style '{style}' (use one of {', '.join(ACL_STYLES)})")
+
+
+def backend_section(index, servers):
+    name = service_name(index)
+    lines = [f"backend {name}_backend", "    mode http", "    balance roundrobin", "    option httpchk GET /health"]
+    for server_index in range(servers):
+        ip, port = server_address(index, server_index)
+        # Checks stay plain HTTP so the loopback pool needs no certificates
+        options = "check inter 5s fall 3 rise 2" + (" ssl verify none no-check-ssl" if index % 2 else "")
+        lines.append(f"    server web{server_index} {ip}:{port} {options}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_config_tree(directory, frontends=1, backends=100, servers=2, acl_styles=ACL_STYLES):
+    """Write a synthetic config set under directory and return its paths and services.
+
+    Backends are assigned to frontends round-robin, and each is routed with the
+    next style from acl_styles. Frontend 0 is the shared HTTP/HTTPS frontend
+    (00-frontend.cfg); the others bind ports 8001, 8002, ...
+    """
+    config_d = os.path.join(directory, 'conf.d')
+    os.makedirs(config_d, exist_ok=True)
+    haproxy_cfg = os.path.join(directory, 'haproxy.cfg')
+    hosts_map = os.path.join(directory, 'hosts.map')
+
+    with open(haproxy_cfg, 'w') as f:
+        f.write("global\n    maxconn 50000\n\n"
+                "defaults\n    mode http\n    balance roundrobin\n"
+                "    timeout connect 5s\n    timeout client 30s\n    timeout server 30s\n\n"
+                "listen stats\n    bind *:8404\n    stats enable\n    stats uri /stats\n")
+
+    routes = [([], [], []) for _ in range(frontends)]
+    services = []
+    for index in range(backends):
+        style = acl_styles[index % len(acl_styles)]
+        acls, use_backends, map_entries = routes[index % frontends]
+        new_acls, new_use_backends, new_entries = routing_lines(index, style)
+        acls.extend(new_acls)
+        use_backends.extend(new_use_backends)
+        map_entries.extend(new_entries)
+        services.append((service_name(index), f"{service_name(index)}.example.com"))
+
+    all_map_entries = []
+    sections = []
+    for frontend_index, (acls, use_backends, map_entries) in enumerate(routes):
+        if frontend_index == 0:
+            binds = ["    bind *:80", "    bind *:443 ssl crt /etc/haproxy/certs/"]
+            name = "http_front"
+        else:
+            binds = [f"    bind *:{8000 + frontend_index}"]
+            name = f"front{frontend_index}"
+        lines = [f"frontend {name}"] + binds + ["    mode http", "", "    # ACLs to match hostnames"] + acls
+        lines += ["", "    # Use backends based on hostname"] + use_backends
+        if map_entries:
+            lines.append(f"    use_backend %[req.hdr(host),lower,map({hosts_map})]")
+            all_map_entries.extend(map_entries)
+        if backends > frontend_index:
+            lines.append(f"    default_backend {service_name(frontend_index)}_backend")
+        sections.append("\n".join(lines) + "\n")
+    with open(os.path.join(config_d, '00-frontend.cfg'), 'w') as f:
+        f.write("\n".join(sections))
+    with open(hosts_map, 'w') as f:
+        f.write("".join(f"{entry}\n" for entry in all_map_entries))
+
+    grouped = {}
+    for index in range(backends):
+        if index % GROUPED_EVERY == GROUPED_EVERY - 1:
+            grouped.setdefault(index // (GROUPED_EVERY * GROUP_SIZE), []).append(backend_section(index, servers))
+            continue
+        with open(os.path.join(config_d, f'10-{service_name(index)}_backend.cfg'), 'w') as f:
+            f.write(backend_section(index, servers))
+    for group, group_sections in grouped.items():
+        with open(os.path.join(config_d, f'20-shared_{group}.cfg'), 'w') as f:
+            f.write("\n".join(group_sections))
+
+    return {
+        'haproxy_cfg': haproxy_cfg,
+        'config_d': config_d,
+        'frontend_cfg': os.path.join(config_d, '00-frontend.cfg'),
+        'hosts_map': hosts_map,
+        'services': services,
+    }
+
+
+def point_app_at(app_module, tree):
+    """Point the app's config paths at a generated tree and drop anything cached for the old one."""
+    app_module.HAPROXY_CFG_PATH = tree['haproxy_cfg']
+    app_module.CONFIG_D_DIR = tree['config_d']
+    app_module.FRONTEND_CFG_PATH = tree['frontend_cfg']
+    app_module.HOSTS_MAP_PATH = tree['hosts_map']
+    app_module.invalidate_parse_cache()
+
+
+class FakeServerPool:
+    """Loopback listeners that answer health probes for every synthetic server.
+
+    Each configured (host, port) maps to one listener by hash; a down_ratio
+    share maps to a bound but non-listening port instead, so it is refused and
+    reported unreachable. The listeners answer every HTTP request with a 200 on
+    a keep-alive connection. install() swaps the app's resolve_address for one
+    that returns the mapped loopback port, so TCP and HTTP probes both land here.
+    """
+
+    RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+    def __init__(self, size=8, down_ratio=0.1):
+        self.down_ratio = down_ratio
+        self.selector = selectors.DefaultSelector()
+        self.listeners = []
+        for _ in range(size):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1024)
+            listener.setblocking(False)
+            self.selector.register(listener, selectors.EVENT_READ, None)
+            self.listeners.append(listener)
+        self.ports = [listener.getsockname()[1] for listener in self.listeners]
+        # Bound but never listening: connections to it are refused
+        self._refusing = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._refusing.bind(('127.0.0.1', 0))
+        self.down_port = self._refusing.getsockname()[1]
+        self._stopped = False
+        self._thread = threading.Thread(target=self._serve, name='fake-server-pool', daemon=True)
+        self._thread.start()
+        self._restore = None
+
+    def _serve(self):
+        while not self._stopped:
+            for key, _ in self.selector.select(0.2):
+                if key.data is None:
+                    try:
+                        connection, _ = key.fileobj.accept()
+                    except BlockingIOError:
+                        continue
+                    connection.setblocking(False)
+                    self.selector.register(connection, selectors.EVENT_READ, bytearray())
+                    continue
+                self._read(key.fileobj, key.data)
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                key.fileobj.close()
+        self.selector.close()
+
+    def _read(self, connection, buffer):
+        try:
+            data = connection.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.selector.unregister(connection)
+            connection.close()
+            return
+        buffer += data
+        requests = buffer.count(b"\r\n\r\n")
+        if requests:
+            del buffer[:buffer.rindex(b"\r\n\r\n") + 4]
+            connection.sendall(self.RESPONSE * requests)
+
+    def target(self, host, port):
+        """The loopback port standing in for a configured server address."""
+        digest = zlib.crc32(f"{host}:{port}".encode())
+        if digest % 1000 < self.down_ratio * 1000:
+            return self.down_port
+        return self.ports[digest % len(self.ports)]
+
+    def install(self, app_module):
+        original = app_module.resolve_address
+
+        def resolve_address(host, port):
+            return [(socket.AF_INET, ('127.0.0.1', self.target(host, port)))]
+
+        app_module.resolve_address = resolve_address
+        self._restore = (app_module, original)
+
+    def close(self):
+        if self._restore:
+            app_module, original = self._restore
+            app_module.resolve_address = original
+            app_module.probe_connections.clear()
+            self._restore = None
+        self._stopped = True
+        self._thread.join()
+        for sock in self.listeners + [self._refusing]:
+            sock.close()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Topology assembly scaling benchmark.
+
+Writes a synthetic config set (see synthetic.py) - one shared frontend with
+an acl/use_backend pair per service - for each size, then times
+generate_connections() and a warm parse_haproxy_configs() (parse cache
+populated, health probes skipped).
+
+Per-service cost should stay flat as the service count grows; the scaling
+exponent between the two largest sizes is ~1.0 for linear assembly and ~2.0
+for the old list-scan lookups.
+
+    python benchmarks/topology_scaling.py                 # 10, 1000 and 10000 services
+    python benchmarks/topology_scaling.py --sizes 100 5000 --json
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as haproxy_app # noqa: E402
+from synthetic import generate_config_tree, point_app_at # noqa: E402
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def measure(services, repeat):
+    directory = tempfile.mkdtemp(prefix='topology-bench-')
+    try:
+        point_app_at(haproxy_app, generate_config_tree(directory, frontends=1, backends=services, acl_styles=('hdr',)))
+        topology = haproxy_app.parse_haproxy_configs() # Populates the parse cache
+        connections = len(topology['connections'])
+
+        assembled = {key: topology[key] for key in ('frontends', 'backends', 'external_clients')}
+        connections_seconds = best_of(lambda: haproxy_app.generate_connections(dict(assembled)), repeat)
+        build_seconds = best_of(haproxy_app.parse_haproxy_configs, repeat)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {
+        'services': services,
+        'connections': connections,
+        'generate_connections_ms': round(connections_seconds * 1000, 2),
+        'build_ms': round(build_seconds * 1000, 2),
+        'build_us_per_service': round(build_seconds * 1e6 / services, 2),
+    }
+
+
+def scaling_exponent(small, large, key):
+    """Slope of log(time) against log(services) between two results."""
+    if small[key] <= 0 or large[key] <= 0 or small['services'] == large['services']:
+        return 0.0
+    return math.log(large[key] / small[key]) / math.log(large['services'] / small['services'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000], help="Service counts to test")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per size (the best is reported)")
+    parser.add_argument('--max-exponent', type=float, default=1.3,
+                        help="Fail if generate_connections scales worse than services^N")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    haproxy_app.get_server_statuses = lambda addresses: {} # Time assembly, not health probes
+    results = [measure(services, args.repeat) for services in sorted(args.sizes)]
+    exponents = {}
+    if len(results) >= 2:
+        for key in ('generate_connections_ms', 'build_ms'):
+            exponents[key] = round(scaling_exponent(results[-2], results[-1], key), 2)
+
+    if args.json:
+        print(json.dumps({'results': results, 'scaling_exponents': exponents}, indent=2))
+    else:
+        for result in results:
+            print(f"{result['services']:>7} services: {result['connections']:>7} connections, "
+                  f"generate_connections {result['generate_connections_ms']:>9} ms, "
+                  f"build {result['build_ms']:>9} ms ({result['build_us_per_service']} us/service)")
+        for key, exponent in exponents.items():
+            print(f"scaling exponent ({key}): {exponent}")
+    return 1 if exponents.get('generate_connections_ms', 0) > args.max_exponent else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
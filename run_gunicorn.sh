@@ -7,10 +7,27 @@ APP_DIR="/home/david/code/haproxy_web_app"
 # Virtual environment path (if you're using one)
 # VENV_PATH="/path/to/your/venv" # Uncomment and set if you are using a venv
 
-# Gunicorn configuration
-NUM_WORKERS=3
-BIND_ADDRESS="0.0.0.0:5000"
-LOG_LEVEL="info"
+# Gunicorn configuration (override any of these from the environment)
+#   gthread - each worker serves GUNICORN_THREADS requests at once (default, no extra packages)
+#   sync    - one request per worker; a slow probe or systemctl call blocks the whole worker,
+#             and live map streams are cut off after GUNICORN_TIMEOUT
+# The app waits on file locks, sockets and subprocesses with plain blocking calls, so
+# greenlet workers (gevent/eventlet) would stall every request in the worker on them.
+WORKER_CLASS="${GUNICORN_WORKER_CLASS:-gthread}"
+NUM_WORKERS="${GUNICORN_WORKERS:-3}"
+NUM_THREADS="${GUNICORN_THREADS:-8}"
+# Seconds before a silent worker is restarted. gthread workers check in while their threads
+# serve long-lived Server-Sent Events streams, and the streams send a heartbeat every
+# SSE_HEARTBEAT_INTERVAL seconds, so this can stay finite
+TIMEOUT="${GUNICORN_TIMEOUT:-30}"
+BIND_ADDRESS="${GUNICORN_BIND:-0.0.0.0:5000}"
+LOG_LEVEL="${GUNICORN_LOG_LEVEL:-info}"
+
+case "$WORKER_CLASS" in
+    gthread) WORKER_ARGS=(--worker-class gthread --threads "$NUM_THREADS") ;;
+    sync) WORKER_ARGS=(--worker-class sync) ;;
+    *) echo "Unsupported GUNICORN_WORKER_CLASS '$WORKER_CLASS' (use gthread or sync)" >&2; exit 1 ;;
+esac
 
 cd "$APP_DIR" # Quoting for safety
 
@@ -20,4 +37,5 @@ cd "$APP_DIR" # Quoting for safety
 # OR, better yet, use the full path to gunicorn directly from the venv if you don't need other venv commands
 
 # Start Gunicorn using its full path
-exec /home/david/.local/bin/gunicorn --workers "$NUM_WORKERS" --bind "$BIND_ADDRESS" --log-level "$LOG_LEVEL" app:app
+exec /home/david/.local/bin/gunicorn --workers "$NUM_WORKERS" "${WORKER_ARGS[@]}" --timeout "$TIMEOUT" \
+    --bind "$BIND_ADDRESS" --log-level "$LOG_LEVEL" app:app